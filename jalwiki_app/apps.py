@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class JalwikiAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'jalwiki_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,240 @@
+"""
+Async versions of the busiest API endpoints, served under /api/async/.
+
+They reuse the DRF viewsets' querysets, filters, pagination, permissions and
+serializers, so responses are identical to the synchronous routes, but do
+their database work through Django's async ORM: authentication, counting,
+fetching (with prefetches) and the viewer's like/upvote flags all happen
+before serializing, which then runs without touching the database. Under an
+ASGI server (``uvicorn jalwiki_pro.asgi:application``) a request waiting on
+PostgreSQL no longer holds a worker thread.
+
+Responses are always rendered as JSON (no browsable API).
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import PermissionDenied, ValidationError as DjangoValidationError
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from jalwiki_pro.authentication import USER_CLAIMS, ClaimsJWTAuthentication
+from jalwiki_pro.pagination import KeysetPagination
+
+from . import votes
+from .comments import build_comment_tree, tree_options
+from .fieldsets import trim_queryset
+from .models import ForumComment
+from .serializers import ForumCommentSerializer
+from .views import ForumCommentViewSet, ForumThreadViewSet, TechniqueViewSet
+
+
+class AsyncJWTAuthentication(ClaimsJWTAuthentication):
+    """ClaimsJWTAuthentication with the fallback user lookup done through the async ORM."""
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if all(claim in validated_token for claim in USER_CLAIMS):
+            return self.get_user(validated_token), validated_token
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+        try:
+            user = await self.user_model.objects.aget(**{jwt_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise exceptions.AuthenticationFailed("User not found", code="user_not_found")
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise exceptions.AuthenticationFailed("User is inactive", code="user_inactive")
+        if jwt_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise exceptions.AuthenticationFailed("The user's password has been changed.", code="password_changed")
+        return user
+
+
+def render(response):
+    """Render a DRF Response the way the JSON renderer of the sync routes does."""
+    content = b'' if response.data is None else JSONRenderer().render(response.data)
+    rendered = HttpResponse(content, status=response.status_code,
+                            content_type=None if response.data is None else 'application/json')
+    for header, value in response.items():
+        rendered[header] = value
+    rendered['Vary'] = 'Accept'
+    return rendered
+
+
+def handle_exception(exc, view, request):
+    """Mirror APIView.handle_exception + the default exception handler."""
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        authenticate_header = view.get_authenticate_header(request)
+        if authenticate_header:
+            exc.auth_header = authenticate_header
+        else:
+            exc.status_code = status.HTTP_403_FORBIDDEN
+    response = exception_handler(exc, {'view': view, 'request': request, 'args': (), 'kwargs': view.kwargs})
+    if response is None:
+        raise exc
+    return response
+
+
+def async_endpoint(viewset_class, action, methods=('GET',)):
+    """
+    Turn ``handler(view, request, **kwargs)`` into an async Django view that
+    runs with a DRF viewset instance set up like the router would for ``action``.
+    """
+    def decorator(handler):
+        initkwargs = getattr(getattr(viewset_class, action, None), 'kwargs', {})
+
+        @csrf_exempt
+        @wraps(handler)
+        async def endpoint(django_request, **kwargs):
+            authenticator = AsyncJWTAuthentication()
+            request = Request(django_request, authenticators=[authenticator])
+            view = viewset_class(**initkwargs)
+            view.action, view.request, view.args, view.kwargs = action, request, (), kwargs
+            view.format_kwarg, view.headers = None, {}
+            try:
+                if django_request.method not in methods:
+                    raise exceptions.MethodNotAllowed(django_request.method)
+                result = await authenticator.aauthenticate(request)
+                request._authenticator = authenticator if result else None
+                request.user, request.auth = result or (AnonymousUser(), None)
+                view.check_permissions(request)
+                response = await handler(view, request, **kwargs)
+            except (exceptions.APIException, Http404, PermissionDenied) as exc:
+                response = handle_exception(exc, view, request)
+            return render(response)
+        return endpoint
+    return decorator
+
+
+async def aget_object(view):
+    """GenericAPIView.get_object() through the async ORM."""
+    queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+    lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+    try:
+        obj = await queryset.aget(**{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+    except (queryset.model.DoesNotExist, TypeError, ValueError, DjangoValidationError):
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+    view.check_object_permissions(view.request, obj)
+    return obj
+
+
+async def apaginate(view, queryset):
+    """Page number (or keyset) pagination as DefaultPagination does it, fetching asynchronously."""
+    paginator, request = view.paginator, view.request
+    if paginator is None:
+        return None
+    if getattr(view, 'keyset_ordering', None) and KeysetPagination.requested(request):
+        return await sync_to_async(paginator.paginate_queryset)(queryset, request, view)
+    paginator.keyset = None
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return None
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    django_paginator.count = await queryset.acount()  # Paginator.count is a cached_property
+    page_number = paginator.get_page_number(request, django_paginator)
+    try:
+        page = django_paginator.page(page_number)
+    except InvalidPage as exc:
+        raise exceptions.NotFound(paginator.invalid_page_message.format(page_number=page_number, message=str(exc)))
+    page.object_list = [obj async for obj in page.object_list]
+    paginator.page, paginator.request = page, request
+    return list(page)
+
+
+async def alist(view):
+    """ListModelMixin.list() for viewsets whose serializers use ViewerFlagMixin."""
+    queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+    page = await apaginate(view, queryset)
+    objs = page if page is not None else [obj async for obj in queryset]
+    serializer = view.get_serializer(objs, many=True)
+    await serializer.child.aprime_viewer_flags(objs)
+    if page is None:
+        return Response(serializer.data)
+    if view.paginator.keyset is not None:
+        # ?count=exact|approximate counts synchronously.
+        return await sync_to_async(view.get_paginated_response)(serializer.data)
+    return view.get_paginated_response(serializer.data)
+
+
+async def aretrieve(view):
+    obj = await aget_object(view)
+    serializer = view.get_serializer(obj)
+    await serializer.aprime_viewer_flags([obj])
+    return Response(serializer.data)
+
+
+atoggle_vote = sync_to_async(votes.toggle)
+
+
+@async_endpoint(TechniqueViewSet, 'list')
+async def technique_list(view, request):
+    return await view.acached_response(lambda request: alist(view), request)
+
+
+@async_endpoint(TechniqueViewSet, 'retrieve')
+async def technique_detail(view, request, pk):
+    return await view.acached_response(lambda request: aretrieve(view), request)
+
+
+@async_endpoint(TechniqueViewSet, 'toggle_like', methods=('POST',))
+async def technique_toggle_like(view, request, pk):
+    technique = await aget_object(view)
+    liked, likes_count = await atoggle_vote(technique, 'likes', request.user)
+    return Response({'liked': liked, 'likes_count': likes_count})
+
+
+@async_endpoint(ForumThreadViewSet, 'list')
+async def thread_list(view, request):
+    return await alist(view)
+
+
+@async_endpoint(ForumThreadViewSet, 'list_comments')
+async def thread_comments(view, request, slug):
+    thread = await aget_object(view)
+    comments = [
+        comment async for comment in trim_queryset(
+            votes.with_voters(ForumComment.objects.filter(thread=thread).select_related('author'), 'upvoted_by'),
+            ForumCommentSerializer, request,
+        )
+    ]
+    max_depth, replies_limit = tree_options(request.query_params)
+    roots = build_comment_tree(comments, max_depth=max_depth, replies_limit=replies_limit)
+    serializer = ForumCommentSerializer(roots, many=True, context={'request': request})
+    await serializer.child.aprime_viewer_flags(comments)
+    return Response(serializer.data)
+
+
+@async_endpoint(ForumThreadViewSet, 'upvote', methods=('POST',))
+async def thread_upvote(view, request, slug):
+    thread = await aget_object(view)
+    upvoted, count = await atoggle_vote(thread, 'upvoted_by', request.user)
+    return Response({'status': 'vote processed', 'upvoted': upvoted, 'count': count})
+
+
+@async_endpoint(ForumCommentViewSet, 'upvote', methods=('POST',))
+async def comment_upvote(view, request, pk):
+    comment = await aget_object(view)
+    upvoted, count = await atoggle_vote(comment, 'upvoted_by', request.user)
+    return Response({'status': 'vote processed', 'upvoted': upvoted, 'count': count})
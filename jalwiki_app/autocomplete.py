@@ -0,0 +1,134 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import Q
+
+from .models import Category, Region, Technique, ForumTag
+
+
+class PrefixIndex:
+    """
+    Per-process, sorted copy of a small lookup table (categories, regions, tags).
+
+    Names are matched by prefix with a binary search, then by word prefix with a
+    linear scan, so lookups never touch the database. The copy is reloaded
+    lazily after ``invalidate()`` (called from signals) or once it is older than
+    AUTOCOMPLETE_LOOKUP_TTL, which bounds staleness across worker processes.
+    """
+
+    def __init__(self, queryset, fields):
+        self.queryset = queryset
+        self.fields = fields
+        self._lock = threading.Lock()
+        # (loaded_at, keys, rows), replaced as a whole so readers never see a half-updated copy.
+        self._snapshot = None
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _fresh(self, snapshot):
+        return snapshot is not None and time.monotonic() - snapshot[0] <= settings.AUTOCOMPLETE_LOOKUP_TTL
+
+    def _ensure_loaded(self):
+        snapshot = self._snapshot
+        if not self._fresh(snapshot):
+            with self._lock:
+                snapshot = self._snapshot
+                if not self._fresh(snapshot):
+                    rows = tuple(sorted(self.queryset.all().values(*self.fields), key=lambda row: row['name'].lower()))
+                    snapshot = (time.monotonic(), tuple(row['name'].lower() for row in rows), rows)
+                    self._snapshot = snapshot
+        return snapshot[1], snapshot[2]
+
+    def search(self, term, limit):
+        keys, rows = self._ensure_loaded()
+        term = term.lower()
+        matches = []
+        i = bisect.bisect_left(keys, term)
+        while i < len(keys) and keys[i].startswith(term) and len(matches) < limit:
+            matches.append(i)
+            i += 1
+        if len(matches) < limit:
+            seen = set(matches)
+            for j, key in enumerate(keys):
+                if j not in seen and any(word.startswith(term) for word in key.split()[1:]):
+                    matches.append(j)
+                    if len(matches) == limit:
+                        break
+        return [rows[j] for j in matches]
+
+
+class TechniqueTitleCache:
+    """
+    Small LRU of technique title lookups keyed by the lower-cased query.
+
+    Only the exact query is served from it: trigram matches of a longer query
+    need not be among a shorter prefix's, so results are never narrowed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, term):
+        with self._lock:
+            entry = self._entries.get(term)
+            if entry is None or time.monotonic() - entry[0] > settings.AUTOCOMPLETE_CACHE_TTL:
+                return None
+            self._entries.move_to_end(term)
+            return entry[1]
+
+    def set(self, term, rows):
+        with self._lock:
+            self._entries[term] = (time.monotonic(), rows)
+            self._entries.move_to_end(term)
+            while len(self._entries) > settings.AUTOCOMPLETE_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+
+lookup_indexes = {
+    'categories': PrefixIndex(Category.objects.all(), ['id', 'name']),
+    'regions': PrefixIndex(Region.objects.all(), ['id', 'name']),
+    'tags': PrefixIndex(ForumTag.objects.all(), ['id', 'name', 'slug']),
+}
+technique_titles = TechniqueTitleCache()
+
+
+def _query_technique_titles(term, limit):
+    queryset = Technique.objects.filter(is_published=True)
+    if connections[queryset.db].vendor == 'postgresql':
+        # Both lookups are served by the pg_trgm GIN index on title.
+        return list(
+            queryset.filter(Q(title__icontains=term) | Q(title__trigram_word_similar=term))
+            .annotate(similarity=TrigramWordSimilarity(term, 'title'))
+            .order_by('-similarity', 'title')
+            .values('id', 'title', 'slug')[:limit]
+        )
+    return list(queryset.filter(title__icontains=term).order_by('title').values('id', 'title', 'slug')[:limit])
+
+
+def search_technique_titles(term, limit):
+    term = term.lower()
+    if len(term) < settings.AUTOCOMPLETE_MIN_TECHNIQUE_QUERY_LENGTH:
+        return []
+    rows = technique_titles.get(term)
+    if rows is None:
+        rows = _query_technique_titles(term, settings.AUTOCOMPLETE_MAX_LIMIT)
+        technique_titles.set(term, rows)
+    return rows[:limit]
+
+
+def autocomplete(term, limit):
+    results = {'query': term, 'techniques': search_technique_titles(term, limit)}
+    for name, index in lookup_indexes.items():
+        results[name] = index.search(term, limit)
+    return results
@@ -0,0 +1,104 @@
+"""Fast multi-row inserts shared by the import and benchmark seeding commands."""
+import json
+from datetime import datetime
+from io import StringIO
+
+from django.db import connection
+from django.db.models import JSONField, Max
+
+
+def copy_supported():
+    return connection.vendor == 'postgresql'
+
+
+def reserve_ids(model, count):
+    """
+    Reserve ``count`` primary keys for rows inserted with explicit IDs.
+
+    On PostgreSQL they come from the table's sequence, so concurrent writers
+    are safe. Elsewhere they continue from the current maximum, which is only
+    safe while nothing else inserts into the table.
+    """
+    if count <= 0:
+        return []
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+                [table, model._meta.pk.column, count],
+            )
+            return [pk for (pk,) in cursor.fetchall()]
+    start = (model._default_manager.aggregate(top=Max('pk'))['top'] or 0) + 1
+    return list(range(start, start + count))
+
+
+def copy_value(value):
+    """Render one value in PostgreSQL COPY text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (list, tuple)):
+        value = '{%s}' % ','.join('"%s"' % str(item).replace('\\', '\\\\').replace('"', '\\"') for item in value)
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def insert_rows(model, fields, rows, use_copy=None):
+    """
+    Insert ``rows`` (tuples of Python values for the model ``fields``) without
+    instantiating models: COPY on PostgreSQL, executemany elsewhere. Fields are
+    attribute names, e.g. 'technique_id'. Returns the number of rows written.
+    """
+    if use_copy is None:
+        use_copy = copy_supported()
+    model_fields = [model._meta.get_field(name) for name in fields]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ', '.join(quote(field.column) for field in model_fields)
+
+    def prepared(row):
+        return [field.get_db_prep_save(value, connection) for field, value in zip(model_fields, row)]
+
+    def copy_prepared(row):
+        # get_db_prep_save wraps JSON in a driver adapter, which is not COPY text.
+        return [
+            json.dumps(value, cls=field.encoder) if isinstance(field, JSONField) and value is not None
+            else field.get_db_prep_save(value, connection)
+            for field, value in zip(model_fields, row)
+        ]
+
+    written = 0
+    with connection.cursor() as cursor:
+        if use_copy:
+            buffer = StringIO()
+            for row in rows:
+                buffer.write('\t'.join(copy_value(value) for value in copy_prepared(row)))
+                buffer.write('\n')
+                written += 1
+            buffer.seek(0)
+            cursor.cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN', buffer)
+        else:
+            batch = [prepared(row) for row in rows]
+            placeholders = ', '.join(['%s'] * len(model_fields))
+            cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', batch)
+            written = len(batch)
+    return written
+
+
+def insert_objects(objs, use_copy=None):
+    """
+    Insert model instances whose primary keys were assigned with reserve_ids().
+    Values are written as they are: auto_now fields are not filled in.
+    """
+    if not objs:
+        return 0
+    model = type(objs[0])
+    fields = model._meta.concrete_fields
+    written = insert_rows(model, [field.attname for field in fields],
+                          ([getattr(obj, field.attname) for field in fields] for obj in objs), use_copy)
+    for obj in objs:
+        obj._state.adding = False
+    return written
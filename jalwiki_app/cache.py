@@ -0,0 +1,134 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _version_key(model):
+    return f'model-version:{model._meta.label_lower}'
+
+
+def _bump(model):
+    cache = response_cache()
+    key = _version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Missing or evicted: restart from the clock so old keys are never reused.
+        cache.set(key, time.time_ns(), None)
+
+
+def bump_model_version(model):
+    """
+    Invalidate every cached response that depends on ``model``, once the
+    current transaction commits. Bumping earlier would let a request that
+    still reads the old rows cache them under the new version.
+    """
+    transaction.on_commit(lambda: _bump(model), robust=True)
+
+
+def model_versions(models):
+    cache = response_cache()
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+async def amodel_versions(models):
+    cache = response_cache()
+    keys = [_version_key(model) for model in models]
+    versions = await cache.aget_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        await cache.aset_many(missing, None)
+        versions.update(missing)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def compute_etag(data):
+    payload = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return '"%s"' % hashlib.sha256(payload.encode()).hexdigest()
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match', '')
+    return header.strip() == '*' or etag in [tag.strip() for tag in header.split(',')]
+
+
+class CachedResponseMixin:
+    """
+    Caches anonymous ``list``/``retrieve`` responses of a viewset.
+
+    Cache keys embed a version number per model in ``cache_dependencies``;
+    signals bump those versions on every save, delete or M2M change, so stale
+    entries are simply never read again. Each entry stores the serialized data
+    with a strong ETag, and a matching If-None-Match is answered with 304
+    before anything is serialized. The backend is the RESPONSE_CACHE_ALIAS
+    entry in CACHES.
+    """
+    cache_dependencies = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_response_cache_key(self, request, versions=None):
+        url = hashlib.sha256(request.build_absolute_uri().encode()).hexdigest()
+        if versions is None:
+            versions = model_versions(self.cache_dependencies)
+        return f'response:{self.basename}:{self.action}:{versions}:{url}'
+
+    def cached_response(self, build, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_ENABLED or request.user.is_authenticated:
+            return build(request, *args, **kwargs)
+
+        cache = response_cache()
+        key = self.get_response_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            response = build(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = {'data': response.data, 'etag': compute_etag(response.data)}
+            cache.set(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+
+        headers = {'ETag': entry['etag']}
+        if etag_matches(request, entry['etag']):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(entry['data'], headers=headers)
+
+    async def acached_response(self, build, request, *args, **kwargs):
+        """cached_response() for async views (see async_views.py); ``build`` is a coroutine function."""
+        if not settings.RESPONSE_CACHE_ENABLED or request.user.is_authenticated:
+            return await build(request, *args, **kwargs)
+
+        cache = response_cache()
+        key = self.get_response_cache_key(request, await amodel_versions(self.cache_dependencies))
+        entry = await cache.aget(key)
+        if entry is None:
+            response = await build(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = {'data': response.data, 'etag': compute_etag(response.data)}
+            await cache.aset(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+
+        headers = {'ETag': entry['etag']}
+        if etag_matches(request, entry['etag']):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(entry['data'], headers=headers)
@@ -0,0 +1,108 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+from django.db.models.expressions import RawSQL
+
+
+def tree_options(query_params):
+    """Read ``max_depth`` and ``replies_limit`` from the query string, capped by settings."""
+    max_depth = settings.FORUM_COMMENT_MAX_DEPTH
+    replies_limit = settings.FORUM_COMMENT_REPLIES_LIMIT
+    try:
+        requested = int(query_params.get('max_depth', ''))
+        if requested > 0:
+            max_depth = min(requested, max_depth) if max_depth else requested
+    except ValueError:
+        pass
+    try:
+        requested = int(query_params.get('replies_limit', ''))
+        if requested > 0:
+            replies_limit = min(requested, replies_limit) if replies_limit else requested
+    except ValueError:
+        pass
+    return max_depth, replies_limit
+
+
+def index_replies(comments):
+    """Group comments by parent ID, keeping their order."""
+    children = defaultdict(list)
+    for comment in comments:
+        children[comment.parent_comment_id].append(comment)
+    return children
+
+
+def attach_replies(nodes, children, max_depth=None, replies_limit=None, reply_totals=None):
+    """
+    Attach replies from ``children`` (see index_replies) below each of ``nodes``.
+
+    Every attached node gets ``tree_replies`` (the replies to render, at most
+    ``replies_limit`` of them) and ``reply_total`` (all direct replies). Nodes
+    at ``max_depth`` get no replies attached; clients fetch the rest through
+    the comment's ``replies`` endpoint. ``reply_totals`` counts the replies of
+    those nodes when ``children`` stops above them.
+    """
+    stack = [(node, 1) for node in nodes]
+    while stack:
+        node, depth = stack.pop()
+        replies = children.get(node.pk, [])
+        node.reply_total = len(replies)
+        if max_depth and depth >= max_depth:
+            if reply_totals is not None:
+                node.reply_total = reply_totals.get(node.pk, 0)
+            node.tree_replies = []
+            continue
+        node.tree_replies = replies[:replies_limit] if replies_limit else replies
+        stack.extend((reply, depth + 1) for reply in node.tree_replies)
+    return nodes
+
+
+def build_comment_tree(comments, root_id=None, max_depth=None, replies_limit=None):
+    """
+    Link a flat list of comments into a tree in memory and return the children
+    of ``root_id`` (the thread's top-level comments when ``None``).
+    """
+    children = index_replies(comments)
+    return attach_replies(children.get(root_id, []), children, max_depth, replies_limit)
+
+
+def load_reply_trees(queryset, nodes, max_depth=None, replies_limit=None):
+    """
+    attach_replies() for comments whose replies are not loaded yet. A
+    recursive query collects the IDs of the replies below ``nodes`` down to
+    ``max_depth`` and ``queryset`` loads them, so the cost follows the returned
+    subtrees rather than the size of their threads. Returns the loaded replies.
+    """
+    if not nodes:
+        return []
+    model = queryset.model
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    pk = quote(model._meta.pk.column)
+    parent = quote(model._meta.get_field('parent_comment').column)
+    params = [node.pk for node in nodes]
+    limit = ''
+    if max_depth:
+        limit = ' WHERE tree.depth < %s'
+        params.append(max_depth)
+    replies = list(queryset.filter(pk__in=RawSQL(
+        f'WITH RECURSIVE tree (id, depth) AS ('
+        f'SELECT {pk}, 2 FROM {table} WHERE {parent} IN ({", ".join(["%s"] * len(nodes))})'
+        f' UNION ALL SELECT c.{pk}, tree.depth + 1 FROM {table} c JOIN tree ON c.{parent} = tree.id{limit}'
+        f') SELECT id FROM tree',
+        params,
+    )))
+    children = index_replies(replies)
+    reply_totals = None
+    if max_depth:
+        cut = list(nodes)
+        for _ in range(max_depth - 1):
+            cut = [reply for node in cut for reply in children.get(node.pk, [])]
+        if cut:
+            reply_totals = dict(
+                model._default_manager.filter(parent_comment_id__in=[node.pk for node in cut])
+                .values_list('parent_comment_id').annotate(n=Count('pk'))
+            )
+    attach_replies(nodes, children, max_depth, replies_limit, reply_totals)
+    return replies
@@ -0,0 +1,94 @@
+"""Record format shared by the import_techniques and export_techniques commands."""
+import csv
+import json
+from datetime import date, datetime
+
+SCALAR_FIELDS = ['title', 'slug', 'summary', 'detailed_content', 'impact', 'is_published']
+LIST_FIELDS = ['benefits', 'materials', 'steps']
+NAME_FIELDS = ['categories', 'regions']
+FIELDS = SCALAR_FIELDS + LIST_FIELDS + NAME_FIELDS + ['added_by', 'created_on', 'updated_on']
+
+# Separator for list values inside a single CSV cell.
+CSV_LIST_SEPARATOR = '|'
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+
+
+def guess_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+def read_records(stream, fmt):
+    """
+    Yield one normalized dict per technique without reading the whole stream,
+    or None for a JSONL line that is not valid JSON.
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            record = {key: value for key, value in row.items() if key in FIELDS and value != ''}
+            for field in LIST_FIELDS + NAME_FIELDS:
+                if field in record:
+                    record[field] = [item.strip() for item in record[field].split(CSV_LIST_SEPARATOR) if item.strip()]
+            yield record
+    else:
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def technique_record(technique):
+    return {
+        'title': technique.title,
+        'slug': technique.slug,
+        'summary': technique.summary,
+        'detailed_content': technique.detailed_content,
+        'impact': technique.impact,
+        'is_published': technique.is_published,
+        'benefits': technique.benefits or [],
+        'materials': technique.materials or [],
+        'steps': technique.steps or [],
+        'categories': [category.name for category in technique.categories.all()],
+        'regions': [region.name for region in technique.regions.all()],
+        'added_by': technique.added_by.email if technique.added_by else None,
+        'created_on': technique.created_on,
+        'updated_on': technique.updated_on,
+    }
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+class RecordWriter:
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(stream, fieldnames=FIELDS)
+            self.csv.writeheader()
+
+    def write(self, record):
+        if self.fmt == 'csv':
+            row = dict(record)
+            for field in LIST_FIELDS + NAME_FIELDS:
+                row[field] = CSV_LIST_SEPARATOR.join(row[field])
+            for field in ('created_on', 'updated_on'):
+                row[field] = row[field].isoformat() if row[field] else ''
+            self.csv.writerow(row)
+        else:
+            self.stream.write(json.dumps(record, default=_json_default, ensure_ascii=False))
+            self.stream.write('\n')
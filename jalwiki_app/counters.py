@@ -0,0 +1,60 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Technique, ForumThread, ForumComment
+
+
+# Denormalized counters: (model, counter field, M2M field counted).
+M2M_COUNTERS = [
+    (Technique, 'likes_count', 'likes'),
+    (ForumThread, 'upvote_count', 'upvoted_by'),
+    (ForumComment, 'upvote_count', 'upvoted_by'),
+]
+
+# Counters over a reverse foreign key: (model, counter field, child model, FK name on child).
+FK_COUNTERS = [
+    (ForumThread, 'comment_count', ForumComment, 'thread'),
+]
+
+
+def m2m_columns(model, field_name):
+    """Return (through model, owner FK name, target FK name) for an M2M field."""
+    field = model._meta.get_field(field_name)
+    return field.remote_field.through, field.m2m_field_name(), field.m2m_reverse_field_name()
+
+
+def m2m_counter(model, field_name):
+    """The denormalized counter field kept for an M2M field, or None."""
+    for counted_model, counter, counted_field in M2M_COUNTERS:
+        if counted_model is model and counted_field == field_name:
+            return counter
+    return None
+
+
+def _count_subquery(queryset, fk_name):
+    counts = queryset.filter(**{fk_name: OuterRef('pk')}).order_by().values(fk_name).annotate(n=Count('*')).values('n')
+    return Coalesce(Subquery(counts), 0)
+
+
+def all_counters():
+    """Yield (model, counter field, expression computing the true value) for every counter."""
+    for model, counter, field_name in M2M_COUNTERS:
+        through, owner_fk, _ = m2m_columns(model, field_name)
+        yield model, counter, _count_subquery(through.objects.all(), owner_fk)
+    for model, counter, child_model, fk_name in FK_COUNTERS:
+        yield model, counter, _count_subquery(child_model.objects.all(), fk_name)
+
+
+def adjust(model, counter, delta, **filters):
+    """Atomically add ``delta`` to ``counter`` on the rows matching ``filters``, never going below zero."""
+    if not delta:
+        return 0
+    return model.objects.filter(**filters).update(**{counter: Greatest(F(counter) + delta, 0)})
+
+
+def rebuild(model, counter, actual, dry_run=False):
+    """Fix every row whose stored counter differs from ``actual``; returns the number of drifted rows."""
+    drifted = model.objects.annotate(_actual=actual).exclude(**{counter: F('_actual')})
+    if dry_run:
+        return drifted.count()
+    return model.objects.filter(pk__in=drifted.values('pk')).update(**{counter: actual})
@@ -0,0 +1,199 @@
+"""
+Precomputed JSON documents for published techniques.
+
+A technique's detail response is built from six relations although
+techniques rarely change. TechniqueDocument keeps the TechniqueSerializer and
+TechniqueListSerializer output of every published technique, rebuilt by
+signals whenever the technique, its categories/regions, images or author
+change. TechniqueViewSet then assembles list and detail responses from that
+JSON column without loading the relations.
+
+Two kinds of values are not stored:
+- Media URLs are stored relative and made absolute per request.
+- likes_count, is_liked_by_user (and likes with VOTER_ARRAYS_COMPAT)
+  change with every vote, so they are added when serving rather than
+  forcing a rebuild per like.
+
+``manage.py check_technique_documents`` diffs the stored documents against
+live serializer output.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.http import Http404
+from rest_framework.response import Response
+
+from .counters import m2m_columns
+from .models import Technique, TechniqueDocument
+from .serializers import TechniqueListSerializer, TechniqueSerializer
+
+REBUILD_BATCH_SIZE = 500
+
+
+class TechniqueDocumentSerializer(TechniqueSerializer):
+    likes_count = None
+    is_liked_by_user = None
+
+    class Meta(TechniqueSerializer.Meta):
+        fields = [name for name in TechniqueSerializer.Meta.fields if name not in ('likes', 'likes_count', 'is_liked_by_user')]
+
+
+class TechniqueSummaryDocumentSerializer(TechniqueListSerializer):
+    is_liked_by_user = None
+
+    class Meta(TechniqueListSerializer.Meta):
+        fields = [name for name in TechniqueListSerializer.Meta.fields if name != 'is_liked_by_user']
+
+
+def document_queryset():
+    return (
+        Technique.objects.filter(is_published=True)
+        .select_related('added_by').prefetch_related('categories', 'regions', 'technique_images')
+    )
+
+
+def render(technique):
+    """The stored form of ``technique``: {'detail': ..., 'summary': ...}."""
+    return {
+        'detail': TechniqueDocumentSerializer(technique).data,
+        'summary': TechniqueSummaryDocumentSerializer(technique).data,
+    }
+
+
+def rebuild(pks):
+    """Rebuild the documents of ``pks``, dropping those of unpublished or deleted techniques."""
+    pks = sorted(set(pks))
+    built = 0
+    for start in range(0, len(pks), REBUILD_BATCH_SIZE):
+        chunk = pks[start:start + REBUILD_BATCH_SIZE]
+        documents = [
+            TechniqueDocument(technique=technique, **render(technique))
+            for technique in document_queryset().filter(pk__in=chunk)
+        ]
+        current = {document.technique_id for document in documents}
+        TechniqueDocument.objects.filter(technique_id__in=set(chunk) - current).delete()
+        TechniqueDocument.objects.bulk_create(
+            documents, update_conflicts=True, unique_fields=['technique'], update_fields=['detail', 'summary', 'built_at'],
+        )
+        built += len(documents)
+    return built
+
+
+def discard(pks):
+    """Drop documents that are about to be rebuilt, so nothing stale is served meanwhile."""
+    return TechniqueDocument.objects.filter(technique_id__in=pks).delete()[0]
+
+
+def _absolute(url, request):
+    return request.build_absolute_uri(url) if url else url
+
+
+def _absolute_srcset(srcset, request):
+    return {
+        fmt: ', '.join(
+            f'{_absolute(url, request)} {width}' for url, width in (entry.rsplit(' ', 1) for entry in value.split(', '))
+        ) if value else value
+        for fmt, value in srcset.items()
+    }
+
+
+def with_absolute_urls(document, request):
+    """A copy of a stored document with media URLs made absolute, as the serializers render them."""
+    document = dict(document)
+    if request is None:
+        return document
+    document['main_image'] = _absolute(document.get('main_image'), request)
+    if 'main_image_srcset' in document:
+        document['main_image_srcset'] = _absolute_srcset(document['main_image_srcset'], request)
+    if 'images' in document:
+        document['images'] = [
+            {**image, 'image': _absolute(image['image'], request), 'srcset': _absolute_srcset(image['srcset'], request)}
+            for image in document['images']
+        ]
+    return document
+
+
+def _ordered(document, fields):
+    return {name: document[name] for name in fields if name in document}
+
+
+class TechniqueDocumentMixin:
+    """
+    Serves TechniqueViewSet ``list``/``retrieve`` from TechniqueDocument.
+
+    Requests the documents cannot answer (``?fields=``, ``?q=`` ranking) and
+    rows without a document (unpublished techniques seen by staff, or a
+    rebuild that has not happened yet) go through the serializers as before.
+    """
+
+    def serve_documents(self, request):
+        params = request.query_params
+        return settings.TECHNIQUE_DOCUMENTS_ENABLED and 'fields' not in params and not params.get('q', '').strip()
+
+    def list(self, request, *args, **kwargs):
+        if not self.serve_documents(request):
+            return super().list(request, *args, **kwargs)
+        rows = self.document_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        data = self.summaries(page if page is not None else list(rows))
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def document_rows(self, queryset):
+        """``queryset`` reduced to the keys, with each row's stored summary as ``document_summary``."""
+        key_fields = [name.lstrip('-') for name in self.keyset_ordering]  # read back by KeysetPagination
+        return (
+            queryset.select_related(None).prefetch_related(None)
+            .only('pk', *key_fields).annotate(document_summary=F('document__summary'))
+        )
+
+    def summaries(self, rows):
+        """List representations of ``rows``, from their ``document_summary`` annotation where there is one."""
+        context = self.get_serializer_context()
+        documents = {row.pk: getattr(row, 'document_summary', None) for row in rows}
+        missing = [pk for pk, document in documents.items() if document is None]
+        live = {}
+        if missing:
+            techniques = Technique.objects.select_related('added_by').prefetch_related('categories', 'regions').filter(pk__in=missing)
+            live = {item['id']: item for item in TechniqueListSerializer(techniques, many=True, context=context).data}
+        flags = TechniqueListSerializer(context=context)
+        flags.prime_viewer_flags([row for row in rows if documents[row.pk] is not None])
+        data = []
+        for row in rows:
+            if documents[row.pk] is None:
+                data.append(live[row.pk])
+                continue
+            summary = with_absolute_urls(documents[row.pk], self.request)
+            summary['is_liked_by_user'] = flags.get_is_liked_by_user(row)
+            data.append(_ordered(summary, TechniqueListSerializer.Meta.fields))
+        return data
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.serve_documents(request):
+            return super().retrieve(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            row = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).values_list(
+                'pk', 'likes_count', 'document__detail',
+            ).first()
+        except (TypeError, ValueError, ValidationError):
+            row = None
+        if row is None:
+            raise Http404(f"No {Technique._meta.object_name} matches the given query.")
+        pk, likes_count, detail = row
+        if detail is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        through, owner_fk, target_fk = m2m_columns(Technique, 'likes')
+        likers = through.objects.filter(**{f'{owner_fk}_id': pk})
+        viewer = request.user
+        detail = with_absolute_urls(detail, request)
+        detail['likes_count'] = likes_count
+        if settings.VOTER_ARRAYS_COMPAT:
+            detail['likes'] = list(likers.values_list(f'{target_fk}_id', flat=True))
+            detail['is_liked_by_user'] = viewer.is_authenticated and viewer.pk in detail['likes']
+        else:
+            detail['is_liked_by_user'] = viewer.is_authenticated and likers.filter(**{f'{target_fk}_id': viewer.pk}).exists()
+        return Response(_ordered(detail, TechniqueSerializer.Meta.fields))
@@ -0,0 +1,296 @@
+"""
+Live forum updates: ``GET /api/events/forum-threads/<slug>/`` as Server-Sent Events.
+
+Instead of polling ``thread-comments`` a client keeps one EventSource open
+per thread and receives
+
+- ``comment-created`` and ``comment-edited`` with the comment (id, thread,
+  parent_comment, author, content, created_at, updated_at), sent by signals
+  on ForumComment.save;
+- ``vote-count`` with ``{"object": "thread"|"comment", "id", "count"}``,
+  sent when the ``upvote`` actions change a vote;
+- ``resync`` when the client fell more than FORUM_EVENTS_QUEUE_SIZE events
+  behind (or the backend lost events); it should refetch the thread.
+
+Events are published once the writing transaction commits. The stream is
+served by ``forum_thread_events``, a plain ASGI callable that
+jalwiki_pro.asgi routes to before Django: an idle connection is a coroutine
+waiting on a queue, with no thread, database connection or middleware of its
+own. Each event is encoded once and the frame is shared by every subscriber.
+A ``: keepalive`` comment every FORUM_EVENTS_HEARTBEAT seconds keeps proxies
+from closing quiet streams.
+
+FORUM_EVENTS_BACKEND fans events out. LocalBroker only reaches clients of
+the process that published; PostgresBroker goes through LISTEN/NOTIFY so
+every worker process gets every event.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+from .models import ForumThread
+
+logger = logging.getLogger(__name__)
+
+RETRY_MS = 5000  # EventSource reconnect delay
+KEEPALIVE = b': keepalive\n\n'
+RESYNC = b'event: resync\ndata: {}\n\n'
+
+
+def frame(event, data):
+    """One SSE message."""
+    return f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))}\n\n'.encode()
+
+
+class Subscription:
+    """The queued frames of one connection; lives on that connection's event loop."""
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.maxsize = maxsize
+        self.queue = asyncio.Queue()
+        self.lagging = False
+
+    def put(self, message):
+        if self.lagging:
+            return
+        if message is RESYNC or self.queue.qsize() >= self.maxsize:
+            # Too far behind to catch up event by event: drop the backlog, ask for a refetch.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.lagging = True
+            message = RESYNC
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        message = await self.queue.get()
+        if message is RESYNC:
+            self.lagging = False
+        return message
+
+
+class LocalBroker:
+    """In-process pub/sub; ``publish`` may be called from any thread."""
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event, data):
+        self.dispatch(channel, frame(event, data))
+
+    def dispatch(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        self._deliver(subscriptions, message)
+
+    def dispatch_all(self, message):
+        with self._lock:
+            subscriptions = [subscription for channel in self._channels.values() for subscription in channel]
+        self._deliver(subscriptions, message)
+
+    def _deliver(self, subscriptions, message):
+        # One wake-up per event loop, however many of its connections are subscribed.
+        by_loop = defaultdict(list)
+        for subscription in subscriptions:
+            by_loop[subscription.loop].append(subscription)
+        for loop, batch in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_put_all, batch, message)
+            except RuntimeError:
+                pass  # Loop closed; its subscriptions are going away.
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, channel):
+        subscription = Subscription(asyncio.get_running_loop(), settings.FORUM_EVENTS_QUEUE_SIZE)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                subscriptions = self._channels.get(channel)
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._channels[channel]
+
+
+def _put_all(subscriptions, message):
+    for subscription in subscriptions:
+        subscription.put(message)
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Publishes with NOTIFY; a listener thread per process, started by the first
+    subscriber, dispatches what it hears to the local subscribers.
+    """
+
+    pg_channel = 'jalwiki_forum_events'
+    max_payload = 7999  # NOTIFY payloads must be shorter than 8000 bytes.
+    reconnect_delay = 5
+    poll_timeout = 30
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def publish(self, channel, event, data):
+        payload = json.dumps([channel, event, data], cls=DjangoJSONEncoder, separators=(',', ':'))
+        if len(payload.encode()) > self.max_payload and 'content' in data:
+            # A long comment: send it without its text, the client fetches it.
+            data = {**data, 'content': None, 'content_truncated': True}
+            payload = json.dumps([channel, event, data], cls=DjangoJSONEncoder, separators=(',', ':'))
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.pg_channel, payload])
+
+    def subscribe(self, channel):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='forum-events-listener', daemon=True)
+                self._listener.start()
+        return super().subscribe(channel)
+
+    def _listen(self):
+        reconnected = False
+        while True:
+            try:
+                self._listen_once(reconnected)
+            except Exception:
+                logger.warning("Forum events listener lost its connection", exc_info=True)
+            reconnected = True
+            time.sleep(self.reconnect_delay)
+
+    def _listen_once(self, reconnected):
+        wrapper = connections['default']
+        connection = wrapper.get_new_connection(wrapper.get_connection_params())
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.pg_channel}')
+            if reconnected:
+                # Whatever was sent while disconnected is gone.
+                self.dispatch_all(RESYNC)
+            while True:
+                if select.select([connection], [], [], self.poll_timeout) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    channel, event, data = json.loads(connection.notifies.pop(0).payload)
+                    self.dispatch(channel, frame(event, data))
+        finally:
+            connection.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.FORUM_EVENTS_BACKEND)()
+        return _broker
+
+
+def publish(thread_id, event, data):
+    """Send ``event`` to the subscribers of thread ``thread_id`` once the current transaction commits."""
+    transaction.on_commit(lambda: broker().publish(thread_id, event, data), robust=True)
+
+
+def publish_comment(comment, created):
+    publish(comment.thread_id, 'comment-created' if created else 'comment-edited', {
+        'id': comment.pk,
+        'thread': comment.thread_id,
+        'parent_comment': comment.parent_comment_id,
+        'author': comment.author_id,
+        'content': comment.content,
+        'created_at': comment.created_at,
+        'updated_at': comment.updated_at,
+    })
+
+
+def publish_vote_count(obj, count):
+    thread = isinstance(obj, ForumThread)
+    publish(obj.pk if thread else obj.thread_id, 'vote-count', {
+        'object': 'thread' if thread else 'comment', 'id': obj.pk, 'count': count,
+    })
+
+
+# The ASGI side.
+
+STREAM_HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),  # nginx would otherwise buffer the stream
+]
+
+
+def _cors_headers(scope):
+    # These requests skip Django's middleware; answer like django-cors-headers would.
+    origin = dict(scope['headers']).get(b'origin')
+    if origin is None:
+        return []
+    allowed = getattr(settings, 'CORS_ORIGIN_ALLOW_ALL', False) or origin.decode('latin-1') in getattr(settings, 'CORS_ALLOWED_ORIGINS', ())
+    if not allowed:
+        return []
+    headers = [(b'access-control-allow-origin', origin), (b'vary', b'origin')]
+    if getattr(settings, 'CORS_ALLOW_CREDENTIALS', False):
+        headers.append((b'access-control-allow-credentials', b'true'))
+    return headers
+
+
+async def _respond(send, status, data, headers=()):
+    await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'application/json'), *headers]})
+    await send({'type': 'http.response.body', 'body': json.dumps(data).encode()})
+
+
+async def _disconnected(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def forum_thread_events(scope, receive, send, slug):
+    """ASGI application streaming the events of the forum thread ``slug``."""
+    if scope['method'] != 'GET':
+        await _respond(send, 405, {'detail': f'Method "{scope["method"]}" not allowed.'}, [(b'allow', b'GET')])
+        return
+    thread_id = await ForumThread.objects.filter(slug=slug).values_list('pk', flat=True).afirst()
+    if thread_id is None:
+        await _respond(send, 404, {'detail': 'No ForumThread matches the given query.'})
+        return
+
+    async with broker().subscribe(thread_id) as subscription:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': STREAM_HEADERS + _cors_headers(scope)})
+        await send({'type': 'http.response.body', 'body': f'retry: {RETRY_MS}\n\n'.encode(), 'more_body': True})
+        disconnected = asyncio.ensure_future(_disconnected(receive))
+        message = None
+        try:
+            while True:
+                if message is None:
+                    message = asyncio.ensure_future(subscription.get())
+                done, _ = await asyncio.wait(
+                    {message, disconnected}, timeout=settings.FORUM_EVENTS_HEARTBEAT, return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnected in done:
+                    break
+                if message in done:
+                    body, message = message.result(), None
+                else:
+                    body = KEEPALIVE
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            disconnected.cancel()
+            if message is not None:
+                message.cancel()
@@ -0,0 +1,91 @@
+"""
+Sparse fieldsets: ``?fields=id,title,categories&expand=categories``.
+
+``fields`` limits a read to the listed top-level fields. Nested relations
+among them are rendered as primary keys unless they are also listed in
+``expand``. Without ``fields`` responses are unchanged.
+
+serializers.SparseFieldsetMixin trims the serializer. ``trim_queryset``
+trims the viewset queryset to match:
+- select_related/prefetch_related for relations that are not rendered are
+  dropped;
+- collapsed relations prefetch primary keys only;
+- large columns that are not rendered are deferred.
+"""
+from django.db.models import Prefetch
+from rest_framework import permissions
+from rest_framework.serializers import BaseSerializer
+
+# Columns worth deferring when a response does not need them.
+LARGE_COLUMN_TYPES = {'TextField', 'ArrayField', 'JSONField', 'SearchVectorField'}
+
+
+def _names(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def requested_fieldset(request):
+    """(requested field names or None, expanded field names) for a read request."""
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return None, set()
+    params = getattr(request, 'query_params', request.GET)
+    if 'fields' not in params:
+        return None, set()
+    return _names(params['fields']), _names(params.get('expand', ''))
+
+
+def is_nested(field):
+    return isinstance(field, BaseSerializer)
+
+
+def _select_related_paths(tree, prefix=''):
+    for name, subtree in tree.items():
+        yield f'{prefix}{name}'
+        yield from _select_related_paths(subtree, f'{prefix}{name}__')
+
+
+def trim_queryset(queryset, serializer_class, request):
+    """Drop the joins, prefetches and large columns that the requested fieldset does not render."""
+    requested, expand = requested_fieldset(request)
+    if requested is None:
+        return queryset
+    model = queryset.model
+    needed, collapsed = set(), set()
+    for name, field in serializer_class().get_fields().items():
+        if name not in requested or field.write_only:
+            continue
+        root = (field.source or name).split('.')[0]
+        if root == '*':
+            continue
+        needed.add(root)
+        if is_nested(field) and name not in expand:
+            collapsed.add(root)
+
+    lookups = []
+    for lookup in queryset._prefetch_related_lookups:
+        path = lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+        root = path.split('__')[0]
+        if root not in needed:
+            continue
+        if root in collapsed:
+            if path != root:
+                continue
+            related = model._meta.get_field(root).related_model
+            lookup = Prefetch(root, queryset=related._default_manager.only('pk'))
+        lookups.append(lookup)
+    queryset = queryset.prefetch_related(None).prefetch_related(*lookups)
+
+    if isinstance(queryset.query.select_related, dict):
+        paths = [
+            path for path in _select_related_paths(queryset.query.select_related)
+            if path.split('__')[0] in needed - collapsed
+        ]
+        queryset = queryset.select_related(None)
+        if paths:
+            queryset = queryset.select_related(*paths)
+
+    deferred = [
+        field.name for field in model._meta.concrete_fields
+        if field.get_internal_type() in LARGE_COLUMN_TYPES and field.name not in needed
+    ]
+    return queryset.defer(*deferred) if deferred else queryset
@@ -0,0 +1,64 @@
+"""
+"Hot" ranking for forum threads (``?ordering=hot``).
+
+    hot = (upvotes + FORUM_HOT_COMMENT_WEIGHT * comments + 1) / (age in hours + 2) ** FORUM_HOT_GRAVITY
+
+The Hacker News formula, with comments counted as engagement. Threads
+older than FORUM_HOT_WINDOW_DAYS score 0.
+
+The score is stored in ForumThread.hot_score and indexed together with the
+id, so paging through hot threads is an index range scan. Signals recompute
+a thread's score when its upvotes or comments change. The periodic
+'forum.decay_hot_scores' job lets every thread inside the window age.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .models import ForumThread
+
+DECAY_BATCH_SIZE = 1000
+
+
+def score(upvotes, comments, created_at, now):
+    age_hours = max((now - created_at).total_seconds() / 3600, 0)
+    if age_hours > settings.FORUM_HOT_WINDOW_DAYS * 24:
+        return 0.0
+    engagement = upvotes + settings.FORUM_HOT_COMMENT_WEIGHT * comments + 1
+    return engagement / (age_hours + 2) ** settings.FORUM_HOT_GRAVITY
+
+
+def _recompute(queryset, now):
+    threads = [
+        ForumThread(pk=pk, hot_score=score(upvotes, comments, created_at, now))
+        for pk, upvotes, comments, created_at in queryset.values_list('pk', 'upvote_count', 'comment_count', 'created_at')
+    ]
+    ForumThread.objects.bulk_update(threads, ['hot_score'], batch_size=DECAY_BATCH_SIZE)
+    return len(threads)
+
+
+def update(pks, now=None):
+    """Recompute the hot score of the threads ``pks`` (after a vote or comment)."""
+    return _recompute(ForumThread.objects.filter(pk__in=pks), now or timezone.now())
+
+
+def decay(now=None):
+    """Recompute every score inside the window and zero the ones that just left it."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=settings.FORUM_HOT_WINDOW_DAYS)
+    expired = ForumThread.objects.filter(created_at__lt=cutoff).exclude(hot_score=0).update(hot_score=0)
+    recent = ForumThread.objects.filter(created_at__gte=cutoff)
+    if connection.vendor == 'postgresql':
+        return expired + recent.update(hot_score=RawSQL(
+            '(upvote_count + %s * comment_count + 1)'
+            ' / power(greatest(extract(epoch from (%s - created_at)) / 3600, 0) + 2, %s)',
+            (settings.FORUM_HOT_COMMENT_WEIGHT, now, settings.FORUM_HOT_GRAVITY),
+        ))
+    pks = list(recent.values_list('pk', flat=True))
+    return expired + sum(
+        _recompute(recent.filter(pk__in=pks[start:start + DECAY_BATCH_SIZE]), now)
+        for start in range(0, len(pks), DECAY_BATCH_SIZE)
+    )
@@ -0,0 +1,136 @@
+"""
+Responsive image variants.
+
+Uploaded images are resized to the widths in IMAGE_VARIANT_WIDTHS and stored
+next to the original in every format of IMAGE_VARIANT_FORMATS. The stored
+names are kept in a JSON field on the model::
+
+    {"source": "profiles/me.png", "webp": {"320": "profiles/variants/me-320.webp", ...}, "jpeg": {...}}
+
+``source`` records which upload the variants were made from, so they are only
+rebuilt when the image changes. Generation runs as a background job
+(``images.build_variants``) so requests do not wait for Pillow.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.dispatch import Signal
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import jobs
+from .cache import bump_model_version
+from .models import Technique, TechniqueImage, User
+
+logger = logging.getLogger(__name__)
+
+# model -> (image field, variants field)
+IMAGE_FIELDS = {
+    Technique: ('main_image', 'main_image_variants'),
+    TechniqueImage: ('image', 'variants'),
+    User: ('profile_pic', 'profile_pic_variants'),
+}
+
+# Sent after process_image stored new variants (a queryset update, so no
+# post_save). Arguments: sender (the model class) and pk.
+variants_changed = Signal()
+
+PIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+def variants_current(obj):
+    image_field, variants_field = IMAGE_FIELDS[type(obj)]
+    image = getattr(obj, image_field)
+    variants = getattr(obj, variants_field)
+    if not variants:
+        return not image
+    return bool(image) and variants.get('source') == image.name
+
+
+def _target_widths(width):
+    widths = sorted(w for w in settings.IMAGE_VARIANT_WIDTHS if w < width)
+    # Never upscale; an image narrower than every variant still gets re-encoded once.
+    return widths or [width]
+
+
+def render_variants(field_file):
+    """Resize and encode ``field_file``; returns the variants map (without saving the model)."""
+    storage = field_file.storage
+    root, filename = os.path.split(field_file.name)
+    stem = os.path.splitext(filename)[0]
+    with field_file.open('rb') as handle, Image.open(handle) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    variants = {'source': field_file.name}
+    for fmt in settings.IMAGE_VARIANT_FORMATS:
+        names = {}
+        for width in _target_widths(image.width):
+            resized = image.copy()
+            resized.thumbnail((width, image.height), Image.Resampling.LANCZOS)
+            if fmt == 'jpeg' and resized.mode != 'RGB':
+                resized = resized.convert('RGB')
+            elif resized.mode not in ('RGB', 'RGBA'):
+                resized = resized.convert('RGBA' if 'A' in resized.getbands() else 'RGB')
+            buffer = BytesIO()
+            resized.save(buffer, PIL_FORMATS[fmt], quality=settings.IMAGE_VARIANT_QUALITY, optimize=True)
+            name = os.path.join(root, 'variants', f'{stem}-{width}.{EXTENSIONS[fmt]}')
+            names[str(width)] = storage.save(name, ContentFile(buffer.getvalue()))
+        variants[fmt] = names
+    return variants
+
+
+def variant_names(variants):
+    return {name for fmt, names in (variants or {}).items() if fmt != 'source' for name in names.values()}
+
+
+def process_image(model, pk, force=False):
+    """Build (or clear) the variants of one object. Returns True when they changed."""
+    image_field, variants_field = IMAGE_FIELDS[model]
+    obj = model._default_manager.filter(pk=pk).only('pk', image_field, variants_field).first()
+    if obj is None or (variants_current(obj) and not force):
+        return False
+    image = getattr(obj, image_field)
+    old = getattr(obj, variants_field)
+    try:
+        variants = render_variants(image) if image else {}
+    except (OSError, UnidentifiedImageError):
+        logger.warning("Could not build variants for %s %s (%s)", model._meta.label, pk, image.name, exc_info=True)
+        variants = {'source': image.name}
+    # Only store them if the image was not replaced meanwhile.
+    unchanged = Q(**{image_field: image.name}) if image else Q(**{image_field: ''}) | Q(**{f'{image_field}__isnull': True})
+    changes = {variants_field: variants}
+    # Queryset updates skip auto_now; set it so the sync feed sees the new variants.
+    changes.update({field.name: timezone.now() for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)})
+    updated = model._default_manager.filter(unchanged, pk=pk).update(**changes)
+    stale = variant_names(variants) if not updated else variant_names(old) - variant_names(variants)
+    for name in stale:
+        image.storage.delete(name)
+    if updated:
+        bump_model_version(model)
+        variants_changed.send(sender=model, pk=pk)
+    return bool(updated)
+
+
+def schedule_variants(obj):
+    """Queue a job building the variants of ``obj``."""
+    label = obj._meta.label
+    jobs.enqueue('images.build_variants', {'model': label, 'pk': obj.pk}, dedupe_key=f'variants:{label}:{obj.pk}')
+
+
+def srcset(variants, request=None):
+    """``{'webp': 'url 320w, url 640w', ...}`` for a variants map; empty until they are built."""
+    result = {}
+    for fmt, names in (variants or {}).items():
+        if fmt == 'source':
+            continue
+        entries = []
+        for width, name in sorted(names.items(), key=lambda item: int(item[0])):
+            url = default_storage.url(name)
+            entries.append(f'{request.build_absolute_uri(url) if request else url} {width}w')
+        result[fmt] = ', '.join(entries)
+    return result
@@ -0,0 +1,259 @@
+"""
+A small database-backed job queue.
+
+Jobs are rows in the Job table, so enqueueing is part of the caller's
+transaction and no broker is needed. Workers (``manage.py run_workers``)
+claim due jobs with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the database
+supports it, and with a conditional UPDATE per job elsewhere. Failed jobs are
+retried with exponential backoff until ``max_attempts``.
+
+While a job runs its worker refreshes ``heartbeat_at``; jobs whose heartbeat
+stopped for JOB_STALE_AFTER seconds are requeued. A worker only records the
+outcome of its own claim (same ``locked_by`` and ``attempts``), so a run that
+was requeued meanwhile cannot overwrite the status of the next one.
+
+Job functions are registered by name and called with the payload as keyword
+arguments::
+
+    @jobs.register('search.refresh_vectors')
+    def refresh_vectors(pks):
+        ...
+
+    jobs.enqueue('search.refresh_vectors', {'pks': [1, 2]}, dedupe_key='search:1,2')
+
+With JOB_QUEUE_EAGER the job runs inline instead, which is what tests use.
+"""
+import contextlib
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Count, F, Max, Min, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger('jalwiki.jobs')
+
+_registry = {}
+
+
+def register(name):
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def registered():
+    return dict(_registry)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def enqueue(name, payload=None, dedupe_key=None, delay=0, max_attempts=None):
+    """
+    Queue ``name`` to run after ``delay`` seconds. While a queued job with the
+    same ``dedupe_key`` exists, that job is returned instead of a new one.
+    """
+    if name not in _registry:
+        raise KeyError(f"Unknown job {name!r}")
+    payload = payload or {}
+    if settings.JOB_QUEUE_EAGER:
+        try:
+            _registry[name](**payload)
+        except Exception:
+            logger.exception("Eager job %s failed", name)
+        return None
+    job = Job(
+        name=name, payload=payload, dedupe_key=dedupe_key,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+    if dedupe_key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+        return job
+    except IntegrityError:
+        return Job.objects.filter(dedupe_key=dedupe_key, status=Job.Status.QUEUED).first()
+
+
+def claim(worker, limit):
+    """Mark up to ``limit`` due jobs as running for ``worker`` and return them."""
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.Status.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+    claimed = {
+        'status': Job.Status.RUNNING, 'started_at': now, 'heartbeat_at': now, 'locked_by': worker,
+        'attempts': F('attempts') + 1,
+    }
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(due.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            Job.objects.filter(id__in=ids).update(**claimed)
+    else:
+        # Without SKIP LOCKED: whoever flips the status first owns the job.
+        ids = [
+            pk for pk in due.values_list('id', flat=True)[:limit]
+            if Job.objects.filter(pk=pk, status=Job.Status.QUEUED).update(**claimed)
+        ]
+    return list(Job.objects.filter(id__in=ids).order_by('run_at', 'id'))
+
+
+def backoff(attempts):
+    """Seconds before retry number ``attempts``: doubling from JOB_RETRY_BACKOFF, with jitter."""
+    delay = min(settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOB_RETRY_BACKOFF_MAX)
+    return delay * random.uniform(1, 1.1)
+
+
+def _claimed(job):
+    """The row of ``job`` while the claim it was returned with still holds."""
+    return Job.objects.filter(pk=job.pk, status=Job.Status.RUNNING, locked_by=job.locked_by, attempts=job.attempts)
+
+
+@contextlib.contextmanager
+def heartbeat(job):
+    """Refresh the heartbeat of ``job`` every JOB_HEARTBEAT_INTERVAL seconds while the block runs."""
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.JOB_HEARTBEAT_INTERVAL):
+                try:
+                    _claimed(job).update(heartbeat_at=timezone.now())
+                except DatabaseError:
+                    logger.warning("Heartbeat of job %s #%s failed", job.name, job.pk, exc_info=True)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'job-{job.pk}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run(job):
+    """Run a claimed job and record the outcome. Returns True on success."""
+    func = _registry.get(job.name)
+    try:
+        if func is None:
+            raise KeyError(f"Unknown job {job.name!r}")
+        with heartbeat(job):
+            func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts < job.max_attempts and func is not None:
+            if _requeue(_claimed(job), run_at=now + timedelta(seconds=backoff(job.attempts)), last_error=error):
+                logger.warning("Job %s #%s failed (attempt %s), retrying", job.name, job.pk, job.attempts)
+            else:
+                logger.warning("Job %s #%s failed (attempt %s); a queued duplicate or newer claim will retry it",
+                               job.name, job.pk, job.attempts)
+        elif _claimed(job).update(status=Job.Status.FAILED, finished_at=now, last_error=error):
+            logger.error("Job %s #%s failed permanently:\n%s", job.name, job.pk, error)
+        else:
+            logger.warning("Job %s #%s failed after it was requeued as stale:\n%s", job.name, job.pk, error)
+        return False
+    if not _claimed(job).update(status=Job.Status.DONE, finished_at=timezone.now()):
+        logger.warning("Job %s #%s finished after it was requeued as stale", job.name, job.pk)
+    return True
+
+
+def _requeue(job, **fields):
+    """
+    Put the job selected by the queryset ``job`` back in the queue. If a job
+    with the same dedupe_key was queued meanwhile (the unique constraint
+    allows one), that one does the work and this one is marked done instead.
+    Returns whether the job was requeued.
+    """
+    try:
+        with transaction.atomic():
+            return bool(job.update(status=Job.Status.QUEUED, locked_by='', **fields))
+    except IntegrityError:
+        job.update(status=Job.Status.DONE, finished_at=timezone.now(), **fields)
+        return False
+
+
+def requeue_stale(older_than):
+    """Put back jobs whose worker died mid-run (no heartbeat for ``older_than`` seconds)."""
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    stale = Job.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff), status=Job.Status.RUNNING,
+    )
+    return sum(
+        _requeue(stale.filter(pk=pk), run_at=timezone.now())
+        for pk in stale.values_list('pk', flat=True)
+    )
+
+
+def purge_finished(older_than):
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    deleted, _ = Job.objects.filter(status=Job.Status.DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def schedule_periodic(periodic):
+    """
+    Make sure every ``{name: interval seconds}`` job is queued, due one
+    interval after it last finished.
+    """
+    now = timezone.now()
+    for name, interval in periodic.items():
+        key = f'periodic:{name}'
+        if Job.objects.filter(dedupe_key=key, status__in=[Job.Status.QUEUED, Job.Status.RUNNING]).exists():
+            continue
+        last = Job.objects.filter(dedupe_key=key, status=Job.Status.DONE).aggregate(last=Max('finished_at'))['last']
+        delay = max(0, interval - (now - last).total_seconds()) if last else 0
+        enqueue(name, dedupe_key=key, delay=delay)
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(pct / 100 * len(values)))]
+
+
+def metrics(sample=1000):
+    """
+    Queue depth per status and job name, the age of the oldest due job, and
+    wait (due -> started) and run (started -> finished) latencies in ms over the
+    last ``sample`` finished jobs of each name.
+    """
+    now = timezone.now()
+    depth = {}
+    for row in Job.objects.values('status', 'name').annotate(n=Count('id')).order_by():
+        depth.setdefault(row['status'], {})[row['name']] = row['n']
+    oldest = Job.objects.filter(status=Job.Status.QUEUED, run_at__lte=now).aggregate(oldest=Min('run_at'))['oldest']
+
+    latency = {}
+    for name in Job.objects.filter(status=Job.Status.DONE).values_list('name', flat=True).distinct().order_by():
+        rows = list(
+            Job.objects.filter(name=name, status=Job.Status.DONE).order_by('-finished_at')
+            .values_list('run_at', 'started_at', 'finished_at')[:sample]
+        )
+        waits = [max((started - run_at).total_seconds(), 0) * 1000 for run_at, started, _ in rows]
+        runs = [(finished - started).total_seconds() * 1000 for _, started, finished in rows]
+        latency[name] = {
+            'count': len(rows),
+            'wait_p50_ms': round(_percentile(waits, 50), 1), 'wait_p95_ms': round(_percentile(waits, 95), 1),
+            'run_p50_ms': round(_percentile(runs, 50), 1), 'run_p95_ms': round(_percentile(runs, 95), 1),
+        }
+    return {
+        'depth': depth,
+        'oldest_due_seconds': round((now - oldest).total_seconds(), 1) if oldest else 0,
+        'latency': latency,
+    }
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from jalwiki_app import images
+
+
+class Command(BaseCommand):
+    help = "Build responsive variants for existing technique, gallery and profile images that lack current ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=[model._meta.model_name for model in images.IMAGE_FIELDS],
+                            action='append', dest='models', help="Limit to these models (repeatable).")
+        parser.add_argument('--force', action='store_true', help="Rebuild variants even when they are up to date.")
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, (image_field, variants_field) in images.IMAGE_FIELDS.items():
+            if options['models'] and model._meta.model_name not in options['models']:
+                continue
+            queryset = (
+                model._default_manager.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+                .only('pk', image_field, variants_field).order_by('pk')
+            )
+            built = 0
+            for obj in queryset.iterator(chunk_size=options['chunk_size']):
+                if not options['force'] and images.variants_current(obj):
+                    continue
+                if images.process_image(model, obj.pk, force=options['force']):
+                    built += 1
+            total += built
+            self.stdout.write(f"{model._meta.label}: {built} built")
+        self.stdout.write(self.style.SUCCESS(f"Built variants for {total} image(s)."))
@@ -0,0 +1,217 @@
+import json
+import math
+import subprocess
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from jalwiki_app.models import ForumThread, Technique, User
+from jalwiki_app.urls import router
+from jalwiki_app.views import ForumThreadViewSet, TechniqueViewSet
+from jalwiki_pro.authentication import ClaimsRefreshToken
+
+API_PREFIX = '/api/'
+# Which row to benchmark detail routes against: the busiest one, not an empty one.
+SAMPLE_ORDERING = {
+    Technique: ('-likes_count', 'id'),
+    ForumThread: ('-comment_count', 'id'),
+}
+# Routes outside the router, or router routes with interesting query strings. {technique} and {thread}
+# are filled in with the sample rows; paths whose sample is missing are skipped.
+EXTRA_PATHS = [
+    'autocomplete/?q=wa',
+    'techniques/?search=water',
+    'techniques/?q=rain water',
+    'techniques/?pagination=cursor',
+    'forum-threads/?pagination=cursor',
+    'sync/',
+    f'sync/?limit={settings.SYNC_MAX_PAGE_SIZE}',
+    'async/techniques/',
+    'async/techniques/{technique}/',
+    'async/forum-threads/',
+    'async/forum-threads/{thread}/thread-comments/',
+]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def sample_lookup(viewset):
+    model = viewset.queryset.model
+    lookup_field = getattr(viewset, 'lookup_field', 'pk')
+    queryset = model._default_manager.order_by(*SAMPLE_ORDERING.get(model, ('id',)))
+    if any(field.name == 'is_published' for field in model._meta.fields):
+        queryset = queryset.filter(is_published=True)
+    return queryset.values_list(lookup_field, flat=True).first()
+
+
+def router_paths():
+    """GET paths for every router list, detail and extra GET action."""
+    paths = []
+    for prefix, viewset, _ in router.registry:
+        base = f'{prefix}/'
+        paths.append(base)
+        lookup = sample_lookup(viewset)
+        if lookup is not None:
+            paths.append(f'{base}{lookup}/')
+        for action in viewset.get_extra_actions():
+            if 'get' not in action.mapping:
+                continue
+            if action.detail and lookup is not None:
+                paths.append(f'{base}{lookup}/{action.url_path}/')
+            elif not action.detail:
+                paths.append(f'{base}{action.url_path}/')
+    return paths
+
+
+def extra_paths():
+    lookups = {'technique': sample_lookup(TechniqueViewSet), 'thread': sample_lookup(ForumThreadViewSet)}
+    if None in lookups.values():
+        return [path for path in EXTRA_PATHS if '{' not in path]
+    return [path.format(**lookups) for path in EXTRA_PATHS]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every API GET route in-process and report p50/p95/p99 latency, query counts and peak "
+        "memory as JSON, so runs can be compared across commits (see seed_benchmark for test data). Routes that "
+        "refuse anonymous requests are measured as the first active user unless --user is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help="Timed requests per route.")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests per route first.")
+        parser.add_argument('--path', action='append', dest='paths',
+                            help="Benchmark only this path below /api/ (repeatable), e.g. 'techniques/?page=2'.")
+        parser.add_argument('--user', help="Email of the user to authenticate as; anonymous by default.")
+        parser.add_argument('--jwt', choices=['claims', 'plain'],
+                            help="Authenticate --user with a real Bearer token instead of forcing the user: 'claims' "
+                                 "as issued by login, 'plain' without claims (one user lookup per request).")
+        parser.add_argument('--no-response-cache', action='store_true', help="Disable the anonymous response cache.")
+        parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+        parser.add_argument('--compare', help="Earlier JSON report to print p50/p95 changes against.")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be positive.")
+        client = APIClient(raise_request_exception=False, SERVER_NAME='localhost')
+        # Stands in for anonymous runs on routes that need a login, e.g. users/get_user_details/.
+        login_client = None
+        if options['user']:
+            try:
+                user = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {options['user']}.")
+            if options['jwt']:
+                token_class = ClaimsRefreshToken if options['jwt'] == 'claims' else RefreshToken
+                client.credentials(HTTP_AUTHORIZATION=f'Bearer {token_class.for_user(user).access_token}')
+            else:
+                client.force_authenticate(user=user)
+        elif options['jwt']:
+            raise CommandError("--jwt needs --user.")
+        else:
+            sample_user = User.objects.filter(is_active=True).order_by('id').first()
+            if sample_user is not None:
+                login_client = APIClient(raise_request_exception=False, SERVER_NAME='localhost')
+                login_client.force_authenticate(user=sample_user)
+        paths = options['paths'] or list(dict.fromkeys(router_paths() + extra_paths()))
+
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'localhost'], 'SQL_INSTRUMENTATION': False}
+        if options['no_response_cache']:
+            overrides['RESPONSE_CACHE_ENABLED'] = False
+        with override_settings(**overrides):
+            results = [self.measure(client, login_client, API_PREFIX + path.lstrip('/'), options) for path in paths]
+
+        report = {
+            'revision': git_revision(),
+            'database': connection.vendor,
+            'authenticated': bool(options['user']),
+            'jwt': options['jwt'],
+            'response_cache': not options['no_response_cache'] and settings.RESPONSE_CACHE_ENABLED,
+            'iterations': options['iterations'],
+            'routes': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.compare(json.load(f), report)
+
+    def measure(self, client, login_client, path, options):
+        authenticated = bool(options['user'])
+        sent, timings, queries = 0, [], []
+        while len(timings) < options['iterations']:
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(path)
+                elapsed = (time.perf_counter() - start) * 1000
+            if sent == 0 and login_client is not None and response.status_code in (401, 403):
+                # Needs a login: start over as the sample user.
+                client, authenticated = login_client, True
+                login_client = None
+                continue
+            sent += 1
+            if sent > options['warmup']:
+                timings.append(elapsed)
+                queries.append(len(captured))
+
+        # Measured separately: tracemalloc slows every allocation down.
+        tracemalloc.start()
+        try:
+            client.get(path)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'path': path,
+            'status': response.status_code,
+            'authenticated': authenticated,
+            'bytes': len(response.content),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'max_queries': max(queries),
+            'min_queries': min(queries),
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+    def compare(self, baseline, report):
+        before = {route['path']: route for route in baseline.get('routes', [])}
+        self.stderr.write(f"Compared with {baseline.get('revision') or 'baseline'}:")
+        for route in report['routes']:
+            old = before.get(route['path'])
+            if old is None:
+                self.stderr.write(f"  {route['path']}: new route")
+                continue
+            changes = []
+            for key in ('p50_ms', 'p95_ms'):
+                if old[key]:
+                    changes.append(f"{key[:3]} {(route[key] - old[key]) / old[key] * 100:+.0f}%")
+            changes.append(f"queries {old['max_queries']} -> {route['max_queries']}")
+            self.stderr.write(f"  {route['path']}: {', '.join(changes)}")
@@ -0,0 +1,93 @@
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jalwiki_app.management.commands.bench_api import percentile
+from jalwiki_app.models import ForumThread, Technique
+
+DEFAULT_BASE_URL = 'http://127.0.0.1:8000'
+
+
+def route_pairs():
+    """(name, sync path, async path) for the endpoints served under /api/async/."""
+    pairs = [
+        ('technique_list', 'techniques/'),
+        ('thread_list', 'forum-threads/'),
+    ]
+    technique = Technique.objects.filter(is_published=True).order_by('-likes_count', 'id').values_list('pk', flat=True).first()
+    if technique is not None:
+        pairs.append(('technique_detail', f'techniques/{technique}/'))
+    thread = ForumThread.objects.order_by('-comment_count', 'id').values_list('slug', flat=True).first()
+    if thread is not None:
+        pairs.append(('thread_comments', f'forum-threads/{thread}/thread-comments/'))
+    return [(name, f'/api/{path}', f'/api/async/{path}') for name, path in pairs]
+
+
+def fetch(url, headers):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=30) as response:
+            response.read()
+            ok = response.status < 400
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a running server (e.g. `uvicorn jalwiki_pro.asgi:application --workers 1`) with concurrent "
+        "requests against the sync routes and their /api/async/ twins, and report req/s and p50/p95 as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default=DEFAULT_BASE_URL)
+        parser.add_argument('--concurrency', type=int, action='append', dest='levels',
+                            help="Concurrent clients (repeatable; default 1, 8, 32).")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per route and concurrency level.")
+        parser.add_argument('--route', action='append', dest='routes', help="Only benchmark these route names.")
+        parser.add_argument('--token', help="JWT access token sent as a Bearer Authorization header.")
+        parser.add_argument('--output', help="Also write the report to this file.")
+
+    def handle(self, *args, **options):
+        levels = options['levels'] or [1, 8, 32]
+        if min(levels) < 1 or options['requests'] < 1:
+            raise CommandError("--concurrency and --requests must be positive.")
+        headers = {'Accept': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = f"Bearer {options['token']}"
+        base_url = options['base_url'].rstrip('/')
+
+        results = {}
+        for name, sync_path, async_path in route_pairs():
+            if options['routes'] and name not in options['routes']:
+                continue
+            for concurrency in levels:
+                for mode, path in (('sync', sync_path), ('async', async_path)):
+                    result = self.measure(f'{base_url}{path}', headers, concurrency, options['requests'])
+                    results.setdefault(name, {}).setdefault(str(concurrency), {})[mode] = result
+                    self.stderr.write(f"{name} x{concurrency} {mode}: {result['req_per_s']} req/s")
+        report = {'base_url': base_url, 'requests': options['requests'], 'results': results}
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output)
+        self.stdout.write(output)
+
+    def measure(self, url, headers, concurrency, requests):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            fetch(url, headers)  # warm up
+            started = time.perf_counter()
+            outcomes = list(pool.map(lambda _: fetch(url, headers), range(requests)))
+            elapsed = time.perf_counter() - started
+        timings = sorted(duration * 1000 for duration, _ in outcomes)
+        return {
+            'req_per_s': round(requests / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'errors': sum(not ok for _, ok in outcomes),
+        }
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from jalwiki_app import related
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the related-techniques index (jalwiki_app.related) from scratch. Saves refresh it incrementally; "
+        "run this after deploying, after bulk imports, or to pick up new co-likes sooner than the periodic job."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--technique', type=int, action='append', dest='pks',
+                            help="Only refresh these techniques and the lists they affect (repeatable).")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['pks']:
+            indexed = related.refresh(options['pks'])
+        else:
+            indexed = related.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed neighbours of {indexed} technique(s) in {time.perf_counter() - started:.1f}s."
+        ))
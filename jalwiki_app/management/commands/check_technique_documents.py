@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from jalwiki_app import documents
+from jalwiki_app.cache import bump_model_version
+from jalwiki_app.models import Technique, TechniqueDocument
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare stored technique documents with live TechniqueSerializer/TechniqueListSerializer output and "
+        "report missing, stale and orphaned ones. --fix rebuilds them (also use it to build the initial documents)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Rebuild every document that is not current.")
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        missing, stale = [], []
+        pks = list(documents.document_queryset().order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(pks), options['chunk_size']):
+            chunk = pks[start:start + options['chunk_size']]
+            stored = {
+                row['technique_id']: row
+                for row in TechniqueDocument.objects.filter(technique_id__in=chunk).values('technique_id', 'detail', 'summary')
+            }
+            for technique in documents.document_queryset().filter(pk__in=chunk).order_by('pk'):
+                if technique.pk not in stored:
+                    missing.append(technique.pk)
+                    continue
+                live = documents.render(technique)
+                changed = sorted(
+                    f'{part}.{key}' for part in ('detail', 'summary')
+                    for key in set(live[part]) | set(stored[technique.pk][part])
+                    if live[part].get(key) != stored[technique.pk][part].get(key)
+                )
+                if changed:
+                    stale.append(technique.pk)
+                    self.stdout.write(f"Technique {technique.pk}: stale {', '.join(changed)}")
+        orphaned = list(
+            TechniqueDocument.objects.exclude(technique__is_published=True).values_list('technique_id', flat=True)
+        )
+        for pk in missing:
+            self.stdout.write(f"Technique {pk}: missing")
+        for pk in orphaned:
+            self.stdout.write(f"Technique {pk}: unpublished but has a document")
+
+        problems = len(missing) + len(stale) + len(orphaned)
+        summary = f"{len(pks)} checked, {len(missing)} missing, {len(stale)} stale, {len(orphaned)} orphaned."
+        if not problems:
+            self.stdout.write(self.style.SUCCESS(summary))
+        elif options['fix']:
+            documents.rebuild(missing + stale + orphaned)
+            bump_model_version(Technique)
+            self.stdout.write(self.style.SUCCESS(f"{summary} Rebuilt {problems} document(s)."))
+        else:
+            raise CommandError(f"{summary} Run with --fix to rebuild them.")
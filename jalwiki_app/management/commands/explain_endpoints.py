@@ -0,0 +1,161 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from jalwiki_app.models import Category, ForumThread, Region, User
+
+from .bench_api import API_PREFIX, EXTRA_PATHS, git_revision, router_paths
+
+# Plan nodes that read a whole table; index scans are what we want on big ones.
+SCAN_NODES = {'Seq Scan', 'Parallel Seq Scan'}
+SORT_NODES = {'Sort', 'Incremental Sort'}
+
+
+def filter_paths():
+    """The hot filters, parameterised with real ids from the seeded data."""
+    paths = []
+    category = Category.objects.order_by('id').values_list('id', flat=True).first()
+    region = Region.objects.order_by('id').values_list('id', flat=True).first()
+    thread = ForumThread.objects.order_by('-comment_count', 'id').values_list('id', flat=True).first()
+    if category is not None:
+        paths.append(f'techniques/?categories__id={category}')
+    if region is not None:
+        paths.append(f'techniques/?regions__id={region}')
+    if thread is not None:
+        paths.append(f'forum-comments/?thread_id={thread}')
+    paths.append('forum-threads/?ordering=hot&pagination=cursor')
+    return paths
+
+
+def table_sizes():
+    """Planner row estimates of every table, from pg_class."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace")
+        return {name: max(int(rows), 0) for name, rows in cursor.fetchall()}
+
+
+def plan_issues(plan, sizes, min_rows):
+    """
+    Sequential scans of tables with at least ``min_rows`` rows, and sorts of at
+    least ``min_rows`` input rows (or any sort that spilled to disk), found
+    anywhere in the EXPLAIN (FORMAT JSON) node ``plan``.
+    """
+    issues = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        children = node.get('Plans', [])
+        stack.extend(children)
+        node_type = node['Node Type']
+        if node_type in SCAN_NODES:
+            relation = node.get('Relation Name')
+            if sizes.get(relation, 0) >= min_rows:
+                issues.append({'type': 'seq_scan', 'relation': relation, 'table_rows': sizes[relation]})
+        elif node_type in SORT_NODES:
+            rows = sum(child.get('Actual Rows', child.get('Plan Rows', 0)) * child.get('Actual Loops', 1) for child in children)
+            if rows >= min_rows or node.get('Sort Space Type') == 'Disk':
+                issues.append({
+                    'type': 'sort', 'sort_key': node.get('Sort Key', []), 'input_rows': rows,
+                    'method': node.get('Sort Method'), 'space': node.get('Sort Space Type'),
+                })
+    return issues
+
+
+def issue_keys(report):
+    """Comparable identities of the issues in a report, for --baseline."""
+    return {
+        (route['path'], issue['type'], issue.get('relation') or ','.join(issue.get('sort_key', [])))
+        for route in report['routes']
+        for query in route['queries']
+        for issue in query['issues']
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Run every API GET route in-process, EXPLAIN (ANALYZE, BUFFERS) each SELECT it issued and report "
+        "sequential scans and sorts on large tables as JSON. Needs PostgreSQL and seeded data (see seed_benchmark)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', dest='paths',
+                            help="Explain only this path below /api/ (repeatable), e.g. 'techniques/?page=2'.")
+        parser.add_argument('--user', help="Email of the user to authenticate as; anonymous by default.")
+        parser.add_argument('--min-rows', type=int, default=10000,
+                            help="Only flag scans of tables, and sorts of inputs, at least this large.")
+        parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+        parser.add_argument('--baseline', help="Earlier JSON report; fail if this run has issues it did not.")
+        parser.add_argument('--strict', action='store_true', help="Fail on any issue, not only new ones.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("explain_endpoints needs PostgreSQL (EXPLAIN ANALYZE, BUFFERS).")
+        client = APIClient(raise_request_exception=False, SERVER_NAME='localhost')
+        if options['user']:
+            try:
+                client.force_authenticate(user=User.objects.get(email=options['user']))
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {options['user']}.")
+        paths = options['paths'] or router_paths() + EXTRA_PATHS + filter_paths()
+        sizes = table_sizes()
+
+        # A cached response would run no queries.
+        overrides = {
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'localhost'],
+            'SQL_INSTRUMENTATION': False,
+            'RESPONSE_CACHE_ENABLED': False,
+        }
+        with override_settings(**overrides):
+            routes = [self.explain(client, API_PREFIX + path.lstrip('/'), sizes, options['min_rows']) for path in paths]
+
+        report = {
+            'revision': git_revision(),
+            'authenticated': bool(options['user']),
+            'min_rows': options['min_rows'],
+            'issues': sum(len(query['issues']) for route in routes for query in route['queries']),
+            'routes': routes,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['strict'] and report['issues']:
+            raise CommandError(f"{report['issues']} plan issue(s) found.")
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                new = issue_keys(report) - issue_keys(json.load(f))
+            if new:
+                for path, kind, target in sorted(new):
+                    self.stderr.write(f"  {path}: {kind} {target}")
+                raise CommandError(f"{len(new)} plan regression(s) against {options['baseline']}.")
+
+    def explain(self, client, path, sizes, min_rows):
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(path)
+        queries, seen = [], set()
+        for query in captured:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(('SELECT', 'WITH')) or sql in seen:
+                continue
+            seen.add(sql)
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}')
+                result = cursor.fetchone()[0]
+            (explained,) = json.loads(result) if isinstance(result, str) else result
+            plan = explained['Plan']
+            queries.append({
+                'sql': sql,
+                'planning_ms': explained.get('Planning Time'),
+                'execution_ms': explained.get('Execution Time'),
+                'shared_hit_blocks': plan.get('Shared Hit Blocks'),
+                'shared_read_blocks': plan.get('Shared Read Blocks'),
+                'issues': plan_issues(plan, sizes, min_rows),
+            })
+        return {'path': path, 'status': response.status_code, 'queries': queries}
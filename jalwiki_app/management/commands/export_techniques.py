@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from jalwiki_app.corpus import RecordWriter, guess_format, technique_record
+from jalwiki_app.models import Technique
+
+
+class Command(BaseCommand):
+    help = "Stream techniques to a JSONL or CSV file in the format read by import_techniques."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file, or '-' (default) for stdout.")
+        parser.add_argument('--format', choices=['jsonl', 'csv'], help="Defaults to the file extension (jsonl otherwise).")
+        parser.add_argument('--published-only', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched (and prefetched) per round trip.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = guess_format(path, options['format'])
+        queryset = (
+            Technique.objects.select_related('added_by')
+            .prefetch_related('categories', 'regions')
+            .defer('search_vector')
+            .order_by('id')
+        )
+        if options['published_only']:
+            queryset = queryset.filter(is_published=True)
+
+        stream = self.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        if stream is self.stdout:
+            stream.ending = ''
+        try:
+            writer = RecordWriter(stream, fmt)
+            exported = 0
+            # iterator() with a chunk size keeps memory flat and prefetches per chunk.
+            for technique in queryset.iterator(chunk_size=options['chunk_size']):
+                writer.write(technique_record(technique))
+                exported += 1
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+        if path != '-':
+            self.stdout.write(self.style.SUCCESS(f"Exported {exported} technique(s) to {path}."))
+        else:
+            self.stderr.write(f"Exported {exported} technique(s).")
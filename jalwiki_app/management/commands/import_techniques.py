@@ -0,0 +1,178 @@
+import sys
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from jalwiki_app.bulk import copy_supported, insert_objects, insert_rows, reserve_ids
+from jalwiki_app.corpus import LIST_FIELDS, NAME_FIELDS, guess_format, parse_bool, read_records
+from jalwiki_app.counters import m2m_columns
+from jalwiki_app.models import Category, Region, Technique, User
+from jalwiki_app.signals import bulk_changed
+from jalwiki_app.slugs import allocate_slugs
+
+IMPACTS = {value for value, _ in Technique.IMPACT_CHOICES}
+UPDATABLE_FIELDS = ['title', 'summary', 'detailed_content', 'impact', 'is_published', 'added_by', 'updated_on'] + LIST_FIELDS
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = "Bulk import techniques from a JSONL or CSV file, creating missing categories and regions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="JSONL or CSV file, or '-' to read JSONL/CSV from stdin.")
+        parser.add_argument('--format', choices=['jsonl', 'csv'], help="Defaults to the file extension (jsonl otherwise).")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Records per transaction.")
+        parser.add_argument('--update-existing', action='store_true',
+                            help="Update techniques whose slug already exists instead of skipping them.")
+        parser.add_argument('--no-copy', action='store_true', help="Use bulk_create even on PostgreSQL.")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive.")
+        path = options['path']
+        fmt = guess_format(path, options['format'])
+        self.update_existing = options['update_existing']
+        self.use_copy = copy_supported() and not options['no_copy']
+        self.category_ids = dict(Category.objects.values_list('name', 'id'))
+        self.region_ids = dict(Region.objects.values_list('name', 'id'))
+        self.stats = Counter()
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            for chunk in chunked(read_records(stream, fmt), options['chunk_size']):
+                with transaction.atomic():
+                    self.import_chunk(chunk)
+                self.stdout.write(f"... {sum(self.stats[k] for k in ('created', 'updated', 'skipped', 'invalid'))} records")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            "Created {created}, updated {updated}, skipped {skipped}, invalid {invalid}; "
+            "new categories {categories}, new regions {regions}.".format(**{
+                key: self.stats[key] for key in ('created', 'updated', 'skipped', 'invalid', 'categories', 'regions')
+            })
+        ))
+
+    def clean(self, raw):
+        if not isinstance(raw, dict) or not all(raw.get(field) for field in ('title', 'summary', 'detailed_content')):
+            return None
+        record = {
+            'title': str(raw['title'])[:255],
+            'slug': slugify(raw.get('slug') or '')[:Technique._meta.get_field('slug').max_length],
+            'summary': str(raw['summary']),
+            'detailed_content': str(raw['detailed_content']),
+            'impact': raw.get('impact') if raw.get('impact') in IMPACTS else 'medium',
+            'is_published': parse_bool(raw.get('is_published', False)),
+            'added_by': raw.get('added_by') or None,
+        }
+        for field in LIST_FIELDS:
+            record[field] = [str(item)[:255] for item in raw.get(field) or []] or None
+        for field in NAME_FIELDS:
+            record[field] = [str(name)[:100] for name in raw.get(field) or []]
+        return record
+
+    def resolve_names(self, model, ids_by_name, names, stat):
+        missing = set(names) - ids_by_name.keys()
+        if missing:
+            model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+            ids_by_name.update(model.objects.filter(name__in=missing).values_list('name', 'id'))
+            self.stats[stat] += len(missing)
+            transaction.on_commit(lambda: bulk_changed.send(sender=model, pks=[]))
+
+    def import_chunk(self, chunk):
+        records = []
+        for raw in chunk:
+            record = self.clean(raw)
+            if record is None:
+                self.stats['invalid'] += 1
+            else:
+                records.append(record)
+        if not records:
+            return
+
+        self.resolve_names(Category, self.category_ids, {n for r in records for n in r['categories']}, 'categories')
+        self.resolve_names(Region, self.region_ids, {n for r in records for n in r['regions']}, 'regions')
+        user_ids = dict(User.objects.filter(
+            email__in={r['added_by'] for r in records if r['added_by']}
+        ).values_list('email', 'id'))
+        existing = Technique.objects.in_bulk([r['slug'] for r in records if r['slug']], field_name='slug')
+
+        now = timezone.now()
+        new, updated, claimed = [], [], set()
+        for record in records:
+            technique = existing.get(record['slug'])
+            if technique is None:
+                technique = Technique()
+                if record['slug'] in claimed:
+                    record['slug'] = ''
+                claimed.add(record['slug'])
+                new.append((technique, record))
+            elif self.update_existing and record['slug'] not in claimed:
+                claimed.add(record['slug'])
+                updated.append((technique, record))
+            else:
+                self.stats['skipped'] += 1
+                continue
+            for field in ('title', 'summary', 'detailed_content', 'impact', 'is_published', *LIST_FIELDS):
+                setattr(technique, field, record[field])
+            technique.added_by_id = user_ids.get(record['added_by'])
+            technique.updated_on = now
+
+        unslugged = [(technique, record) for technique, record in new if not record['slug']]
+        # Slugs given in the file are not saved yet, so allocation must skip them explicitly.
+        slugs = allocate_slugs(Technique, [r['title'] for _, r in unslugged], taken=claimed - {''})
+        for (technique, record), slug in zip(unslugged, slugs):
+            record['slug'] = slug
+        for technique, record in new:
+            technique.slug = record['slug']
+            technique.created_on = now
+
+        self.create_techniques([technique for technique, _ in new])
+        if updated:
+            Technique.objects.bulk_update([technique for technique, _ in updated], UPDATABLE_FIELDS, batch_size=500)
+        self.link_names(new + updated, replace=[technique.pk for technique, _ in updated])
+
+        self.stats['created'] += len(new)
+        self.stats['updated'] += len(updated)
+        pks = [technique.pk for technique, _ in new + updated]
+        transaction.on_commit(lambda: bulk_changed.send(sender=Technique, pks=pks))
+
+    def create_techniques(self, techniques):
+        if not techniques:
+            return
+        if not self.use_copy:
+            Technique.objects.bulk_create(techniques, batch_size=500)
+            return
+        for technique, pk in zip(techniques, reserve_ids(Technique, len(techniques))):
+            technique.pk = pk
+        insert_objects(techniques, use_copy=True)
+
+    def link_names(self, pairs, replace):
+        for field_name, ids_by_name in (('categories', self.category_ids), ('regions', self.region_ids)):
+            through, owner_fk, target_fk = m2m_columns(Technique, field_name)
+            if replace:
+                through.objects.filter(**{f'{owner_fk}__in': replace}).delete()
+            rows = {
+                (technique.pk, ids_by_name[name])
+                for technique, record in pairs
+                for name in record[field_name]
+            }
+            if not rows:
+                continue
+            if self.use_copy:
+                insert_rows(through, [f'{owner_fk}_id', f'{target_fk}_id'], rows, use_copy=True)
+            else:
+                through.objects.bulk_create(
+                    [through(**{f'{owner_fk}_id': owner, f'{target_fk}_id': target}) for owner, target in rows],
+                    batch_size=1000,
+                )
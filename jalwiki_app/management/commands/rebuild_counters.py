@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from jalwiki_app import counters
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized like/upvote/comment counters that have drifted from the real row counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many rows have drifted.")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        total = 0
+        for model, counter, actual in counters.all_counters():
+            with transaction.atomic():
+                fixed = counters.rebuild(model, counter, actual, dry_run=dry_run)
+            total += fixed
+            verb = "drifted" if dry_run else "fixed"
+            self.stdout.write(f"{model._meta.label}.{counter}: {fixed} {verb}")
+        self.stdout.write(self.style.SUCCESS(f"{total} counter(s) {'drifted' if dry_run else 'rebuilt'}."))
@@ -0,0 +1,87 @@
+import json
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+
+from jalwiki_app import jobs
+
+logger = logging.getLogger('jalwiki.jobs')
+MAINTENANCE_INTERVAL = 60
+
+
+def run_in_thread(job):
+    try:
+        return jobs.run(job)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run background jobs (jalwiki_app.jobs) on a thread pool until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=settings.JOB_WORKER_THREADS)
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL,
+                            help="Seconds to sleep when no job is due.")
+        parser.add_argument('--once', action='store_true', help="Run the jobs that are due now, then exit.")
+        parser.add_argument('--stats', action='store_true', help="Print queue depth and latency metrics as JSON and exit.")
+        parser.add_argument('--stats-interval', type=float, default=300,
+                            help="Log metrics on the jalwiki.jobs logger this often (seconds, 0 = never).")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(jobs.metrics(), indent=2))
+            return
+        if options['threads'] < 1:
+            raise CommandError("--threads must be positive.")
+        worker = jobs.worker_name()
+        threads = options['threads']
+        self.stdout.write(f"Worker {worker}: {threads} thread(s), jobs: {', '.join(sorted(jobs.registered()))}")
+
+        processed = failed = 0
+        next_maintenance = next_stats = 0
+        running = set()
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job') as pool:
+            try:
+                while True:
+                    now = time.monotonic()
+                    if now >= next_maintenance and not options['once']:
+                        self.maintenance()
+                        next_maintenance = now + MAINTENANCE_INTERVAL
+                    if options['stats_interval'] and now >= next_stats:
+                        if next_stats:
+                            logger.info(json.dumps(jobs.metrics()))
+                        next_stats = now + options['stats_interval']
+
+                    close_old_connections()
+                    claimed = jobs.claim(worker, threads - len(running)) if len(running) < threads else []
+                    running.update(pool.submit(run_in_thread, job) for job in claimed)
+                    if not running:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll_interval'])
+                        continue
+                    done, running = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        processed += 1
+                        try:
+                            failed += not future.result()
+                        except Exception:
+                            # Recording the outcome failed (e.g. the database went away); keep serving.
+                            failed += 1
+                            logger.exception("Job outcome could not be recorded")
+            except KeyboardInterrupt:
+                self.stdout.write("Stopping; waiting for running jobs to finish...")
+                wait(running)
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} job(s), {failed} failed."))
+
+    def maintenance(self):
+        requeued = jobs.requeue_stale(settings.JOB_STALE_AFTER)
+        if requeued:
+            logger.warning("Requeued %s stale job(s)", requeued)
+        jobs.purge_finished(settings.JOB_RETENTION)
+        jobs.schedule_periodic(settings.JOB_PERIODIC)
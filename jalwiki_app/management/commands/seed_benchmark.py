@@ -0,0 +1,268 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.text import slugify
+
+from jalwiki_app import counters
+from jalwiki_app.bulk import insert_objects, insert_rows, reserve_ids
+from jalwiki_app.counters import m2m_columns
+from jalwiki_app.models import Category, ForumComment, ForumTag, ForumThread, Region, Technique, User
+from jalwiki_app.signals import bulk_changed
+from jalwiki_app.slugs import allocate_slugs
+
+# Seeded users share this domain so --reset can find (and cascade from) them.
+BENCH_DOMAIN = 'bench.jalwiki.invalid'
+BENCH_PASSWORD = 'bench'
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+SPAN_SECONDS = 365 * 24 * 3600
+
+CATEGORIES = [
+    'Rainwater Harvesting', 'Groundwater Recharge', 'Drip Irrigation', 'Greywater Reuse', 'Watershed Management',
+    'Soil Moisture Conservation', 'Check Dams', 'Household Filtration', 'Desalination', 'Wetland Restoration',
+]
+REGIONS = [
+    'Maharashtra', 'Rajasthan', 'Gujarat', 'Karnataka', 'Tamil Nadu', 'Kerala', 'Punjab', 'Bihar',
+    'Odisha', 'Assam', 'Telangana', 'Madhya Pradesh',
+]
+TAGS = ['irrigation', 'harvesting', 'policy', 'filters', 'wells', 'farming', 'urban', 'monsoon', 'drought', 'diy']
+WORDS = (
+    'water rain roof tank well pond soil crop drip pipe filter sand gravel mulch bund trench canal village '
+    'farm monsoon aquifer recharge storage runoff catchment overflow gutter channel basin terrace field seed '
+    'harvest save reuse clean flow level season dry wet summer winter cost labour community system simple '
+    'local stone clay cement plastic barrel bucket valve pump meter'
+).split()
+ADJECTIVES = 'low-cost simple community household rooftop traditional solar gravity-fed modular seasonal'.split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a deterministic synthetic dataset (users, techniques, forum threads with deep "
+        "comment trees, likes and upvotes) for benchmarking. The same --seed always produces the same content."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--techniques', type=int, default=20000)
+        parser.add_argument('--threads', type=int, default=5000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--likes', type=int, default=1000000, help="Technique likes.")
+        parser.add_argument('--upvotes', type=int, default=1000000, help="Thread and comment upvotes, split 30/70.")
+        parser.add_argument('--max-depth', type=int, default=12, help="Deepest reply nesting in comment trees.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per insert statement or COPY.")
+        parser.add_argument('--reset', action='store_true', help="Delete previously seeded benchmark data first.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+        if options['users'] < 1 and any(options[key] for key in ('techniques', 'threads', 'comments')):
+            raise CommandError("--users must be positive to seed content.")
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.max_depth = max(options['max_depth'], 1)
+
+        with transaction.atomic():
+            if options['reset']:
+                self.phase('reset', self.reset)
+            elif User.objects.filter(email__endswith='@' + BENCH_DOMAIN).exists():
+                raise CommandError("Benchmark data already exists; pass --reset to replace it.")
+            users = self.phase('users', self.seed_users, options['users'])
+            techniques = self.phase('techniques', self.seed_techniques, options['techniques'], users)
+            self.phase('likes', self.seed_votes, Technique, 'likes', techniques, users, options['likes'])
+            threads = self.phase('threads', self.seed_threads, options['threads'], users)
+            comments = self.phase('comments', self.seed_comments, threads, users, options['comments'])
+            thread_upvotes = options['upvotes'] * 3 // 10
+            self.phase('thread upvotes', self.seed_votes, ForumThread, 'upvoted_by', [pk for pk, _ in threads], users,
+                       thread_upvotes)
+            self.phase('comment upvotes', self.seed_votes, ForumComment, 'upvoted_by', comments, users,
+                       options['upvotes'] - thread_upvotes)
+            self.phase('counters', self.rebuild_counters)
+            transaction.on_commit(lambda: self.phase('post-commit signals', self.notify, techniques))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(users)} users, {len(techniques)} techniques, {len(threads)} threads, "
+            f"{len(comments)} comments (seed {options['seed']})."
+        ))
+
+    def phase(self, name, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.stdout.write(f"{name}: {time.perf_counter() - start:.1f}s")
+        return result
+
+    # Content helpers ------------------------------------------------------
+
+    def sentence(self, low=6, high=16):
+        words = self.rng.choices(WORDS, k=self.rng.randint(low, high))
+        return ' '.join(words).capitalize() + '.'
+
+    def paragraph(self, sentences):
+        return ' '.join(self.sentence() for _ in range(sentences))
+
+    def moment(self, after=None):
+        if after is None:
+            return EPOCH + timedelta(seconds=self.rng.randrange(SPAN_SECONDS))
+        return after + timedelta(seconds=self.rng.randrange(1, 3 * 24 * 3600))
+
+    def skewed_counts(self, total, buckets, cap):
+        """Split ``total`` over ``buckets`` with a long tail, each at most ``cap``."""
+        if not buckets or total <= 0:
+            return [0] * buckets
+        weights = [1 / (rank + 1) ** 0.8 for rank in range(buckets)]
+        self.rng.shuffle(weights)
+        scale = total / sum(weights)
+        return [min(cap, int(weight * scale)) for weight in weights]
+
+    def in_batches(self, objs, insert):
+        for start in range(0, len(objs), self.batch_size):
+            insert(objs[start:start + self.batch_size])
+
+    # Phases ---------------------------------------------------------------
+
+    def reset(self):
+        bench_users = User.objects.filter(email__endswith='@' + BENCH_DOMAIN)
+        Technique.objects.filter(added_by__in=bench_users).delete()
+        # Threads, comments and votes cascade from the users.
+        bench_users.delete()
+
+    def seed_users(self, count):
+        password = make_password(BENCH_PASSWORD)
+        users = []
+        for i, pk in enumerate(reserve_ids(User, count)):
+            users.append(User(
+                pk=pk, email=f'user{i}@{BENCH_DOMAIN}', username=f'bench_{i}', password=password,
+                first_name=self.rng.choice(WORDS).title(), last_name=self.rng.choice(WORDS).title(),
+                mobile_no='9876543210', address='Benchmark', city='Warananagar', state=self.rng.choice(REGIONS),
+                pincode='416113', profile_pic='', is_active=True, is_staff=False, is_superuser=False,
+                date_joined=self.moment(),
+            ))
+        self.in_batches(users, insert_objects)
+        return [user.pk for user in users]
+
+    def named(self, model, names, **extra):
+        existing = dict(model.objects.filter(name__in=names).values_list('name', 'id'))
+        missing = [name for name in names if name not in existing]
+        model.objects.bulk_create(
+            [model(name=name, **{key: value(name) for key, value in extra.items()}) for name in missing],
+            ignore_conflicts=True,
+        )
+        return list(model.objects.filter(name__in=names).values_list('id', flat=True))
+
+    def seed_techniques(self, count, users):
+        category_ids = self.named(Category, CATEGORIES)
+        region_ids = self.named(Region, REGIONS)
+        titles = [
+            f"{self.rng.choice(ADJECTIVES).title()} {self.rng.choice(WORDS)} {self.rng.choice(WORDS)} {i}"
+            for i in range(count)
+        ]
+        techniques = []
+        for start in range(0, count, self.batch_size):
+            chunk_titles = titles[start:start + self.batch_size]
+            chunk = []
+            for title, slug, pk in zip(chunk_titles, allocate_slugs(Technique, chunk_titles),
+                                       reserve_ids(Technique, len(chunk_titles))):
+                created = self.moment()
+                chunk.append(Technique(
+                    pk=pk, title=title, slug=slug, added_by_id=self.rng.choice(users),
+                    summary=self.paragraph(2), detailed_content='\n\n'.join(self.paragraph(6) for _ in range(4)),
+                    main_image='', created_on=created, updated_on=self.moment(created),
+                    is_published=self.rng.random() < 0.9, likes_count=0,
+                    impact=self.rng.choice(['low', 'medium', 'high']),
+                    benefits=[self.sentence(3, 8) for _ in range(self.rng.randint(1, 5))],
+                    materials=self.rng.sample(WORDS, self.rng.randint(1, 6)),
+                    steps=[self.sentence(5, 12) for _ in range(self.rng.randint(2, 8))],
+                    search_vector=None,
+                ))
+            insert_objects(chunk)
+            self.link(Technique, 'categories', [(t.pk, self.rng.sample(category_ids, self.rng.randint(1, 3))) for t in chunk])
+            self.link(Technique, 'regions', [(t.pk, self.rng.sample(region_ids, self.rng.randint(1, 3))) for t in chunk])
+            techniques.extend(technique.pk for technique in chunk)
+        return techniques
+
+    def link(self, model, field_name, pairs):
+        through, owner_fk, target_fk = m2m_columns(model, field_name)
+        insert_rows(through, [f'{owner_fk}_id', f'{target_fk}_id'],
+                    [(owner, target) for owner, targets in pairs for target in targets])
+
+    def seed_votes(self, model, field_name, owners, users, total):
+        through, owner_fk, target_fk = m2m_columns(model, field_name)
+        rows = []
+        for owner, count in zip(owners, self.skewed_counts(total, len(owners), len(users))):
+            rows.extend((owner, user) for user in self.rng.sample(users, count))
+            if len(rows) >= self.batch_size:
+                insert_rows(through, [f'{owner_fk}_id', f'{target_fk}_id'], rows)
+                rows = []
+        if rows:
+            insert_rows(through, [f'{owner_fk}_id', f'{target_fk}_id'], rows)
+
+    def seed_threads(self, count, users):
+        """Returns (pk, created_at) pairs; comments are dated after their thread."""
+        tag_ids = self.named(ForumTag, TAGS, slug=slugify)
+        titles = [f"{self.sentence(4, 9)[:-1]} ({i})" for i in range(count)]
+        threads = []
+        for start in range(0, count, self.batch_size):
+            chunk_titles = titles[start:start + self.batch_size]
+            chunk = []
+            for title, slug, pk in zip(chunk_titles, allocate_slugs(ForumThread, chunk_titles),
+                                       reserve_ids(ForumThread, len(chunk_titles))):
+                created = self.moment()
+                chunk.append(ForumThread(
+                    pk=pk, title=title[:255], slug=slug, content=self.paragraph(5), author_id=self.rng.choice(users),
+                    type=self.rng.choice(ForumThread.ThreadType.values), created_at=created, updated_at=created,
+                    last_activity_at=created, upvote_count=0, comment_count=0,
+                ))
+            insert_objects(chunk)
+            self.link(ForumThread, 'tags', [(t.pk, self.rng.sample(tag_ids, self.rng.randint(0, 3))) for t in chunk])
+            threads.extend((thread.pk, thread.created_at) for thread in chunk)
+        return threads
+
+    def seed_comments(self, threads, users, total):
+        comment_ids, batch, pool = [], [], []
+        for (thread_id, created), count in zip(threads, self.skewed_counts(total, len(threads), total)):
+            # (id, depth) of this thread's comments so far; replies favour recent comments, so chains get deep.
+            previous = []
+            moment = created
+            for _ in range(count):
+                if not pool:
+                    # Reserved IDs must be written before reserving more (see reserve_ids).
+                    insert_objects(batch)
+                    batch = []
+                    pool = reserve_ids(ForumComment, self.batch_size)[::-1]
+                pk = pool.pop()
+                parent_id, depth = None, 1
+                if previous and self.rng.random() < 0.7:
+                    parent_id, parent_depth = previous[-1 - int(len(previous) * self.rng.random() ** 3)]
+                    if parent_depth < self.max_depth:
+                        depth = parent_depth + 1
+                    else:
+                        parent_id = None
+                moment = self.moment(moment)
+                batch.append(ForumComment(
+                    pk=pk, thread_id=thread_id, author_id=self.rng.choice(users), content=self.paragraph(2),
+                    parent_comment_id=parent_id, created_at=moment, updated_at=moment, upvote_count=0,
+                ))
+                previous.append((pk, depth))
+                comment_ids.append(pk)
+        insert_objects(batch)
+        latest = ForumComment.objects.filter(thread=OuterRef('pk')).order_by().values('thread').annotate(
+            latest=Max('created_at')).values('latest')
+        ForumThread.objects.filter(pk__in=[pk for pk, _ in threads]).update(
+            last_activity_at=Coalesce(Subquery(latest), F('created_at'))
+        )
+        return comment_ids
+
+    def rebuild_counters(self):
+        for model, counter, actual in counters.all_counters():
+            counters.rebuild(model, counter, actual)
+
+    def notify(self, techniques):
+        # Bulk inserts skip model signals: refresh search vectors and invalidate caches once.
+        bulk_changed.send(sender=Technique, pks=techniques)
+        for model in (Category, Region, ForumTag):
+            bulk_changed.send(sender=model, pks=[])
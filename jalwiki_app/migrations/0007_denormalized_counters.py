@@ -0,0 +1,53 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Technique = apps.get_model('jalwiki_app', 'Technique')
+    ForumThread = apps.get_model('jalwiki_app', 'ForumThread')
+    ForumComment = apps.get_model('jalwiki_app', 'ForumComment')
+
+    def count_of(queryset, fk_name):
+        counts = queryset.filter(**{fk_name: OuterRef('pk')}).order_by().values(fk_name).annotate(n=Count('*')).values('n')
+        return Coalesce(Subquery(counts), 0)
+
+    Technique.objects.update(likes_count=count_of(Technique.likes.through.objects.all(), 'technique'))
+    ForumThread.objects.update(
+        upvote_count=count_of(ForumThread.upvoted_by.through.objects.all(), 'forumthread'),
+        comment_count=count_of(ForumComment.objects.all(), 'thread'),
+    )
+    ForumComment.objects.update(upvote_count=count_of(ForumComment.upvoted_by.through.objects.all(), 'forumcomment'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jalwiki_app', '0006_alter_user_address_alter_user_city_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forumcomment',
+            name='upvote_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='forumthread',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='forumthread',
+            name='upvote_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='technique',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Denormalized number of likes, kept in sync by signals.'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:34
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import F, Func, TextField, Value
+
+
+def populate_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Technique = apps.get_model('jalwiki_app', 'Technique')
+    config = settings.TECHNIQUE_SEARCH_CONFIG
+
+    def joined(field):
+        return Func(F(field), Value(' '), function='array_to_string', output_field=TextField())
+
+    Technique.objects.update(search_vector=(
+        SearchVector('title', weight='A', config=config)
+        + SearchVector('summary', weight='B', config=config)
+        + SearchVector('detailed_content', joined('steps'), weight='C', config=config)
+        + SearchVector(joined('benefits'), joined('materials'), weight='D', config=config)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jalwiki_app', '0007_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='technique',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Weighted full-text vector, refreshed on save.', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='technique',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='technique_search_vector_gin'),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:35
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jalwiki_app', '0008_technique_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='technique',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='technique_title_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jalwiki_app', '0009_technique_title_trigram'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forumthread',
+            index=models.Index(fields=['-last_activity_at', '-id'], name='thread_activity_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='technique',
+            index=models.Index(fields=['-created_on', '-id'], name='technique_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 00:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jalwiki_app', '0010_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='technique',
+            name='main_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized copies of main_image, see jalwiki_app.images.'),
+        ),
+        migrations.AddField(
+            model_name='techniqueimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized copies of image, see jalwiki_app.images.'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='profile_pic_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized copies of profile_pic, see jalwiki_app.images.'),
+        ),
+    ]
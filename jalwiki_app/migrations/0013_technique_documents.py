@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 01:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jalwiki_app', '0012_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TechniqueDocument',
+            fields=[
+                ('technique', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='jalwiki_app.technique')),
+                ('detail', models.JSONField(help_text='TechniqueSerializer output without likes and viewer flags.')),
+                ('summary', models.JSONField(help_text='TechniqueListSerializer output without viewer flags.')),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 01:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jalwiki_app', '0013_technique_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedTechnique',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(help_text='1 is the closest neighbour.')),
+                ('score', models.FloatField()),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to', to='jalwiki_app.technique')),
+                ('technique', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='jalwiki_app.technique')),
+            ],
+            options={
+                'ordering': ['technique', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('technique', 'rank'), name='related_technique_rank_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-18 01:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jalwiki_app', '0014_related_techniques'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forumthread',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False, help_text='Decaying engagement score, see jalwiki_app.hotness.'),
+        ),
+        migrations.AddIndex(
+            model_name='forumthread',
+            index=models.Index(fields=['-hot_score', '-id'], name='thread_hot_id_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-18 01:19
+
+from django.db import migrations, models
+
+# ?categories__id= and ?regions__id= join the auto-created through tables by
+# the target column; their unique (technique_id, <target>_id) index leads with
+# the other column, so add the reverse pair for index-only lookups.
+THROUGH_INDEXES = [
+    ('technique_categories_rev_idx', 'jalwiki_app_technique_categories', 'category_id'),
+    ('technique_regions_rev_idx', 'jalwiki_app_technique_regions', 'region_id'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jalwiki_app', '0015_thread_hot_score'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forumcomment',
+            index=models.Index(fields=['thread', 'created_at'], name='comment_thread_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='technique',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_on', '-id'], name='technique_public_created_idx'),
+        ),
+    ] + [
+        migrations.RunSQL(
+            f'CREATE INDEX {name} ON {table} ({column}, technique_id)',
+            f'DROP INDEX {name}',
+        )
+        for name, table, column in THROUGH_INDEXES
+    ]
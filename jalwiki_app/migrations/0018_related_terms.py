@@ -0,0 +1,34 @@
+# Generated by Django 5.1.6 on 2026-10-18 01:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jalwiki_app', '0017_sync_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.TextField(unique=True)),
+                ('idf', models.FloatField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TechniqueTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weight', models.FloatField()),
+                ('technique', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='jalwiki_app.technique')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='jalwiki_app.relatedterm')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('technique', 'term'), name='technique_term_unique')],
+            },
+        ),
+    ]
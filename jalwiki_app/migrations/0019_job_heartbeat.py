@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 02:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jalwiki_app', '0018_related_terms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Refreshed by the worker while the job runs.', null=True),
+        ),
+    ]
@@ -3,6 +3,10 @@ from django.utils.text import slugify
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+
+from .slugs import save_with_unique_slug
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -37,6 +41,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     state = models.CharField(max_length=100, default='Maharashtra')
     pincode = models.CharField(max_length=6, default='416113')
     profile_pic = models.ImageField(upload_to='profiles/', null=True, blank=True)
+    profile_pic_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized copies of profile_pic, see jalwiki_app.images.")
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(default=timezone.now)
@@ -84,25 +89,23 @@ class Technique(models.Model):
     summary = models.TextField(help_text="Short overview of the technique.")
     detailed_content = models.TextField(help_text="Main detailed content.")
     main_image = models.ImageField(upload_to='technique_images/', blank=True, null=True)
+    main_image_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized copies of main_image, see jalwiki_app.images.")
     created_on = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_on = models.DateTimeField(auto_now=True, db_index=True)
     is_published = models.BooleanField(default=False, help_text="Mark as published to make it publicly visible.")
     likes = models.ManyToManyField(User, related_name='liked_techniques', blank=True)
+    likes_count = models.PositiveIntegerField(default=0, editable=False, help_text="Denormalized number of likes, kept in sync by signals.")
     impact = models.CharField(max_length=10, choices=IMPACT_CHOICES, default='medium') # Changed to ChoiceField
     regions = models.ManyToManyField(Region, related_name='techniques', help_text="Regions where the technique is applicable.", blank=True)
     benefits = ArrayField(models.CharField(max_length=255), blank=True, null=True)
     materials = ArrayField(models.CharField(max_length=255), blank=True, null=True)
     steps = ArrayField(models.CharField(max_length=255), blank=True, null=True)
+    search_vector = SearchVectorField(null=True, editable=False, help_text="Weighted full-text vector, refreshed on save.")
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            base_slug = slugify(self.title)
-            slug = base_slug
-            count = 1
-            while Technique.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{count}"
-                count += 1
-            self.slug = slug
+            save_with_unique_slug(self, self.title, lambda: super(Technique, self).save(*args, **kwargs))
+            return
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -111,6 +114,14 @@ class Technique(models.Model):
     class Meta:
         ordering = ['-created_on']
         # unique_together = ('slug', 'category')
+        indexes = [
+            GinIndex(fields=['search_vector'], name='technique_search_vector_gin'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='technique_title_trgm'),
+            models.Index(fields=['-created_on', '-id'], name='technique_created_id_idx'),
+            # Anonymous lists only ever see published techniques.
+            models.Index(fields=['-created_on', '-id'], condition=models.Q(is_published=True),
+                         name='technique_public_created_idx'),
+        ]
 
 def technique_image_upload_path(instance, filename):
     slug = instance.technique.slug or 'unspecified'
@@ -119,9 +130,11 @@ def technique_image_upload_path(instance, filename):
 class TechniqueImage(models.Model):
     technique = models.ForeignKey(Technique, on_delete=models.CASCADE, related_name='technique_images')
     image = models.ImageField(upload_to=technique_image_upload_path)
+    variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized copies of image, see jalwiki_app.images.")
     caption = models.CharField(max_length=255, blank=True, help_text="Optional caption for the image.")
     order = models.PositiveIntegerField(default=0, help_text="Position of the image in the display order.")
     type = models.CharField(max_length=50, choices=[('step', 'Step-by-Step'), ('diagram', 'Diagram'), ('result', 'Result'), ('other', 'Other')], default='other')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['order']
@@ -130,6 +143,55 @@ class TechniqueImage(models.Model):
         return f"{self.technique.title} - {self.caption}"
 
 
+class TechniqueDocument(models.Model):
+    """Serialized snapshot of a published technique, kept current by jalwiki_app.documents."""
+    technique = models.OneToOneField(Technique, on_delete=models.CASCADE, primary_key=True, related_name='document')
+    detail = models.JSONField(help_text="TechniqueSerializer output without likes and viewer flags.")
+    summary = models.JSONField(help_text="TechniqueListSerializer output without viewer flags.")
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Document of technique {self.technique_id}"
+
+
+class RelatedTechnique(models.Model):
+    """A ranked neighbour of a technique, computed offline by jalwiki_app.related."""
+    technique = models.ForeignKey(Technique, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Technique, on_delete=models.CASCADE, related_name='related_to')
+    rank = models.PositiveSmallIntegerField(help_text="1 is the closest neighbour.")
+    score = models.FloatField()
+
+    def __str__(self):
+        return f"{self.technique_id} -> {self.related_id} (#{self.rank})"
+
+    class Meta:
+        ordering = ['technique', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['technique', 'rank'], name='related_technique_rank_unique'),
+        ]
+
+
+class RelatedTerm(models.Model):
+    """A term of the TF-IDF vocabulary of the last full build of jalwiki_app.related."""
+    term = models.TextField(unique=True)
+    idf = models.FloatField()
+
+    def __str__(self):
+        return self.term
+
+
+class TechniqueTerm(models.Model):
+    """Weight of a vocabulary term in a published technique's normalized TF-IDF vector."""
+    technique = models.ForeignKey(Technique, on_delete=models.CASCADE, related_name='+')
+    term = models.ForeignKey(RelatedTerm, on_delete=models.CASCADE, related_name='+')
+    weight = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['technique', 'term'], name='technique_term_unique'),
+        ]
+
+
 
 
 from django.conf import settings
@@ -138,6 +200,7 @@ from django.utils import timezone
 class ForumTag(models.Model):
     name = models.CharField(max_length=50, unique=True)
     slug = models.SlugField(unique=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -170,31 +233,24 @@ class ForumThread(models.Model):
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     last_activity_at = models.DateTimeField(auto_now_add=True)  # Consider updating this on new comment
     upvoted_by = models.ManyToManyField(User, related_name='upvoted_threads', blank=True)
+    # Denormalized counters, kept in sync by jalwiki_app.signals
+    upvote_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    hot_score = models.FloatField(default=0, editable=False, help_text="Decaying engagement score, see jalwiki_app.hotness.")
 
     def __str__(self):
         return self.title
 
-    @property
-    def upvote_count(self):
-        return self.upvoted_by.count()
-
-    @property
-    def comment_count(self):
-        return self.comments.count()  # Assumes related_name='comments' on ForumComment model
+    class Meta:
+        indexes = [
+            models.Index(fields=['-last_activity_at', '-id'], name='thread_activity_id_idx'),
+            models.Index(fields=['-hot_score', '-id'], name='thread_hot_id_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.title)
-            slug = base_slug
-            counter = 1
-            while ForumThread.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
-
         # Update last_activity_at if it's a new thread or if explicitly needed
         # For existing threads, last_activity_at is usually updated by new comments
         if not self.pk:  # If new thread
@@ -203,6 +259,9 @@ class ForumThread(models.Model):
         # If you want updated_at to also refresh last_activity_at
         # self.last_activity_at = self.updated_at
 
+        if not self.slug:
+            save_with_unique_slug(self, self.title, lambda: super(ForumThread, self).save(*args, **kwargs))
+            return
         super().save(*args, **kwargs)
 
 
@@ -222,12 +281,13 @@ class ForumComment(models.Model):
         related_name='replies'
     )
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     upvoted_by = models.ManyToManyField(
         settings.AUTH_USER_MODEL,
         related_name='upvoted_comments',
         blank=True
     )
+    upvote_count = models.PositiveIntegerField(default=0, editable=False)  # Kept in sync by jalwiki_app.signals
 
     def save(self, *args, **kwargs):
         is_new = self._state.adding
@@ -240,12 +300,63 @@ class ForumComment(models.Model):
     def __str__(self):
         return f"Comment by {self.author.username or self.author.email} on {self.thread.title}"
 
-    @property
-    def upvote_count(self):
-        return self.upvoted_by.count()
-
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['thread', 'created_at'], name='comment_thread_created_idx'),
+        ]
+
+class Job(models.Model):
+    """A unit of background work, run by the run_workers command (see jalwiki_app.jobs)."""
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    name = models.CharField(max_length=100, help_text="Registered job name, e.g. 'images.build_variants'.")
+    payload = models.JSONField(default=dict, blank=True)
+    dedupe_key = models.CharField(max_length=255, null=True, blank=True,
+                                  help_text="At most one queued job may have a given key.")
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True,
+                                        help_text="Refreshed by the worker while the job runs.")
+    finished_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['dedupe_key'], condition=models.Q(status='queued'),
+                                    name='job_unique_queued_dedupe_key'),
+        ]
+
+
+class Tombstone(models.Model):
+    """A deleted row, kept for the /api/sync/ feed (see jalwiki_app.sync)."""
+    model = models.CharField(max_length=100, help_text="Model label, e.g. 'jalwiki_app.technique'.")
+    object_id = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id} deleted {self.deleted_at}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_id_idx'),
+        ]
+
 
 # Remember to run:
 # python manage.py makemigrations your_app_name
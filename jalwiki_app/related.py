@@ -0,0 +1,356 @@
+"""
+Content-based related techniques.
+
+Every published technique gets its RELATED_TECHNIQUES_COUNT best published
+neighbours, stored in RelatedTechnique so ``get_related`` is one indexed
+lookup. A neighbour's score is a weighted sum (RELATED_TECHNIQUES_WEIGHTS) of:
+
+- text: cosine similarity of TF-IDF vectors over the title (counted twice),
+  summary and steps, limited to the RELATED_TECHNIQUES_MAX_FEATURES most
+  common terms shared by at least two techniques;
+- categories, regions: Jaccard overlap;
+- impact: 1 for the same impact level, only counted on top of another signal;
+- colikes: users who liked both / sqrt(likes of each), ignoring users with
+  more than RELATED_TECHNIQUES_MAX_USER_LIKES likes.
+
+``rebuild`` scores everything with NumPy a block of rows at a time, so memory
+stays at the TF-IDF matrix plus one block of scores. It also keeps the
+vocabulary with its IDF (RelatedTerm) and the nonzero TF-IDF weights
+(TechniqueTerm) for ``refresh``.
+
+``refresh`` does not build the matrices. It re-weights the changed techniques
+over the stored vocabulary, then scores them in SQL against the pairs that
+share a term, category, region or light liker with them. All terms are
+symmetric, so these scores also tell which other lists the changed techniques
+now belong in, and those lists are re-scored the same way. Terms new since the
+last rebuild are ignored until the next one (the periodic 'related.rebuild'
+job).
+
+Both take a transaction-level advisory lock on PostgreSQL, so concurrent
+jobs do not delete and re-rank the same lists at once.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Min
+
+from . import bulk
+from .counters import m2m_columns
+from .models import RelatedTechnique, RelatedTerm, Technique, TechniqueTerm
+
+TOKEN_RE = re.compile(r'[^\W\d_]{2,}')
+STOP_WORDS = frozenset("""
+    a about after all also an and any are as at be been but by can do each for from has have how in into is it its
+    more most not of on or other our so such than that the their then there these they this to up use used using
+    was we were what when which will with you your
+""".split())
+BLOCK_SIZE = 256
+LOCK_KEY = 0x6a776b72  # pg_advisory_xact_lock key of the index writers
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def document(title, summary, steps):
+    return tokenize(title) * 2 + tokenize(summary) + tokenize(' '.join(steps or []))
+
+
+def _jaccard(matrix, rows):
+    intersection = matrix[rows] @ matrix.T
+    sizes = matrix.sum(axis=1)
+    union = sizes[rows, None] + sizes[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+class Corpus:
+    """Feature matrices of every published technique; row ``i`` describes ``pks[i]``."""
+
+    def __init__(self):
+        rows = list(
+            Technique.objects.filter(is_published=True).order_by('pk')
+            .values_list('pk', 'title', 'summary', 'steps', 'impact')
+        )
+        self.pks = [row[0] for row in rows]
+        self.index = {pk: i for i, pk in enumerate(self.pks)}
+        self.text = self._tfidf([document(title, summary, steps) for _, title, summary, steps, _ in rows])
+        impacts = {impact: code for code, impact in enumerate(sorted({row[4] for row in rows}))}
+        self.impact = np.array([impacts[row[4]] for row in rows], dtype=np.int16)
+        self.categories = self._membership('categories')
+        self.regions = self._membership('regions')
+        self.colikes, self.like_totals = self._colikes()
+
+    def _tfidf(self, documents):
+        counts = [Counter(tokens) for tokens in documents]
+        frequency = Counter(term for terms in counts for term in terms)
+        # A term used by a single technique cannot relate two of them.
+        vocabulary = [term for term, n in frequency.most_common() if n > 1][:settings.RELATED_TECHNIQUES_MAX_FEATURES]
+        columns = {term: j for j, term in enumerate(vocabulary)}
+        matrix = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+        for i, terms in enumerate(counts):
+            for term, n in terms.items():
+                if term in columns:
+                    matrix[i, columns[term]] = 1 + math.log(n)
+        idf = np.log((1 + len(documents)) / (1 + np.array([frequency[term] for term in vocabulary], dtype=np.float32))) + 1
+        matrix *= idf
+        self.vocabulary, self.idf = vocabulary, idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1)
+
+    def _membership(self, field_name):
+        through, owner_fk, target_fk = m2m_columns(Technique, field_name)
+        pairs = [
+            (self.index[owner], target)
+            for owner, target in through.objects.values_list(f'{owner_fk}_id', f'{target_fk}_id').iterator()
+            if owner in self.index
+        ]
+        columns = {target: j for j, target in enumerate(sorted({target for _, target in pairs}))}
+        matrix = np.zeros((len(self.pks), len(columns)), dtype=np.float32)
+        for i, target in pairs:
+            matrix[i, columns[target]] = 1
+        return matrix
+
+    def _colikes(self):
+        through, owner_fk, target_fk = m2m_columns(Technique, 'likes')
+        liked_by_user = defaultdict(list)
+        for technique_id, user_id in through.objects.values_list(f'{owner_fk}_id', f'{target_fk}_id').iterator():
+            if technique_id in self.index:
+                liked_by_user[user_id].append(self.index[technique_id])
+        pairs = defaultdict(Counter)
+        totals = np.zeros(len(self.pks), dtype=np.float32)
+        for liked in liked_by_user.values():
+            if len(liked) > settings.RELATED_TECHNIQUES_MAX_USER_LIKES:
+                continue
+            totals[liked] += 1
+            for i in liked:
+                pairs[i].update(j for j in liked if j != i)
+        return pairs, totals
+
+    def scores(self, rows):
+        """Scores of the techniques at row indices ``rows`` against every technique."""
+        weights = settings.RELATED_TECHNIQUES_WEIGHTS
+        rows = np.asarray(rows, dtype=np.intp)
+        scores = weights['text'] * (self.text[rows] @ self.text.T)
+        scores += weights['categories'] * _jaccard(self.categories, rows)
+        scores += weights['regions'] * _jaccard(self.regions, rows)
+        for r, i in enumerate(rows):
+            for j, n in self.colikes.get(i, {}).items():
+                scores[r, j] += weights['colikes'] * n / math.sqrt(self.like_totals[i] * self.like_totals[j])
+        same_impact = self.impact[rows, None] == self.impact[None, :]
+        scores += weights['impact'] * (same_impact & (scores > 0))
+        scores[np.arange(len(rows)), rows] = 0  # never related to itself
+        return scores
+
+    def blocks(self, rows):
+        """Yield (row indices, score matrix) a block of rows at a time."""
+        rows = list(rows)
+        for start in range(0, len(rows), BLOCK_SIZE):
+            block = rows[start:start + BLOCK_SIZE]
+            yield block, self.scores(block)
+
+    def neighbours(self, rows):
+        """{technique pk: [(related pk, score), ...] best first} for row indices ``rows``."""
+        count = settings.RELATED_TECHNIQUES_COUNT
+        result = {}
+        for block, scores in self.blocks(rows):
+            for i, row in zip(block, scores):
+                candidates = np.flatnonzero(row > 0)
+                if len(candidates) > count:
+                    candidates = candidates[np.argpartition(-row[candidates], count - 1)[:count]]
+                # Equal scores list the older technique first.
+                best = sorted(candidates, key=lambda j: (-row[j], j))
+                result[self.pks[i]] = [(self.pks[j], float(row[j])) for j in best]
+        return result
+
+
+def _lock():
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [LOCK_KEY])
+
+
+def _store(neighbours):
+    RelatedTechnique.objects.bulk_create([
+        RelatedTechnique(technique_id=pk, related_id=related_pk, rank=rank, score=score)
+        for pk, items in neighbours.items()
+        for rank, (related_pk, score) in enumerate(items, start=1)
+    ], batch_size=1000)
+
+
+def _store_vectors(corpus):
+    TechniqueTerm.objects.all().delete()
+    RelatedTerm.objects.all().delete()
+    bulk.insert_rows(RelatedTerm, ['id', 'term', 'idf'], [
+        (j + 1, term, float(idf)) for j, (term, idf) in enumerate(zip(corpus.vocabulary, corpus.idf))
+    ])
+    rows, columns = np.nonzero(corpus.text)
+    bulk.insert_rows(TechniqueTerm, ['technique_id', 'term_id', 'weight'], (
+        (corpus.pks[i], j + 1, float(corpus.text[i, j])) for i, j in zip(rows.tolist(), columns.tolist())
+    ))
+
+
+def rebuild():
+    """Recompute the whole index. Returns the number of techniques indexed."""
+    with transaction.atomic():
+        _lock()
+        corpus = Corpus()
+        neighbours = corpus.neighbours(range(len(corpus.pks)))
+        RelatedTechnique.objects.all().delete()
+        _store(neighbours)
+        _store_vectors(corpus)
+    return len(neighbours)
+
+
+def _update_vectors(pks):
+    """Re-weight the techniques ``pks`` over the stored vocabulary; returns the published ones."""
+    documents = {
+        pk: Counter(document(title, summary, steps))
+        for pk, title, summary, steps in Technique.objects.filter(pk__in=pks, is_published=True)
+        .values_list('pk', 'title', 'summary', 'steps')
+    }
+    vocabulary = {
+        term: (term_id, idf) for term_id, term, idf in
+        RelatedTerm.objects.filter(term__in={term for counts in documents.values() for term in counts})
+        .values_list('pk', 'term', 'idf')
+    }
+    rows = []
+    for pk, counts in documents.items():
+        weights = {vocabulary[term][0]: (1 + math.log(n)) * vocabulary[term][1] for term, n in counts.items() if term in vocabulary}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        rows += [(pk, term_id, weight / norm) for term_id, weight in weights.items()]
+    TechniqueTerm.objects.filter(technique_id__in=pks).delete()
+    bulk.insert_rows(TechniqueTerm, ['technique_id', 'term_id', 'weight'], rows)
+    return set(documents)
+
+
+def _pairs(model, owner_fk, key_fk, pks, measure='COUNT(*)', key_condition=('', ())):
+    """
+    {(pk, other): measure} over the rows of ``model`` for the techniques
+    ``pks`` joined to the rows of other published techniques with the same
+    ``key_fk``; ``key_condition`` is an optional SQL filter on ``a.<key>``.
+    """
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    owner = quote(model._meta.get_field(owner_fk).column)
+    key = quote(model._meta.get_field(key_fk).column)
+    technique = quote(Technique._meta.db_table)
+    published = quote(Technique._meta.get_field('is_published').column)
+    condition, condition_params = key_condition
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT a.{owner}, b.{owner}, {measure} FROM {table} a'
+            f' JOIN {table} b ON b.{key} = a.{key} AND b.{owner} <> a.{owner}'
+            f' JOIN {technique} t ON t.{quote(Technique._meta.pk.column)} = b.{owner} AND t.{published} = %s'
+            f' WHERE a.{owner} IN ({", ".join(["%s"] * len(pks))})'
+            f'{f" AND a.{key} IN ({condition})" if condition else ""}'
+            f' GROUP BY a.{owner}, b.{owner}',
+            [True, *pks, *condition_params],
+        )
+        return {(pk, other): value for pk, other, value in cursor.fetchall()}
+
+
+def _sizes(model, owner_fk, pks, **filters):
+    return dict(
+        model.objects.filter(**{f'{owner_fk}_id__in': pks}, **filters)
+        .values_list(f'{owner_fk}_id').annotate(n=Count('pk'))
+    )
+
+
+def _light_likers():
+    """The users with at most RELATED_TECHNIQUES_MAX_USER_LIKES likes on published techniques."""
+    through, owner_fk, target_fk = m2m_columns(Technique, 'likes')
+    return (
+        through.objects.filter(**{f'{owner_fk}__is_published': True})
+        .values(f'{target_fk}_id').annotate(n=Count('pk'))
+        .filter(n__lte=settings.RELATED_TECHNIQUES_MAX_USER_LIKES).values_list(f'{target_fk}_id', flat=True)
+    )
+
+
+def _scores(pks):
+    """
+    {pk: Counter(other: score)} of the published techniques ``pks`` against
+    every other published technique they share something with; the same
+    scores as Corpus.scores, read from the stored vectors and the M2M tables.
+    """
+    weights = settings.RELATED_TECHNIQUES_WEIGHTS
+    scores = defaultdict(Counter)
+    for (pk, other), dot in _pairs(TechniqueTerm, 'technique', 'term', pks, 'SUM(a.weight * b.weight)').items():
+        scores[pk][other] += weights['text'] * dot
+    for field_name in ('categories', 'regions'):
+        through, owner_fk, target_fk = m2m_columns(Technique, field_name)
+        shared = _pairs(through, owner_fk, target_fk, pks)
+        sizes = _sizes(through, owner_fk, {pk for pair in shared for pk in pair})
+        for (pk, other), n in shared.items():
+            scores[pk][other] += weights[field_name] * n / (sizes[pk] + sizes[other] - n)
+    through, owner_fk, target_fk = m2m_columns(Technique, 'likes')
+    light = _light_likers()
+    shared = _pairs(through, owner_fk, target_fk, pks, key_condition=light.query.sql_with_params())
+    totals = _sizes(through, owner_fk, {pk for pair in shared for pk in pair}, **{f'{target_fk}_id__in': light})
+    for (pk, other), n in shared.items():
+        scores[pk][other] += weights['colikes'] * n / math.sqrt(totals[pk] * totals[other])
+    impacts = dict(Technique.objects.filter(pk__in={*pks, *(other for row in scores.values() for other in row)})
+                   .values_list('pk', 'impact'))
+    for pk, row in scores.items():
+        for other in row:
+            if impacts[other] == impacts[pk]:
+                row[other] += weights['impact']
+    return scores
+
+
+def _blocks(pks):
+    """Yield _scores a block of techniques at a time."""
+    pks = sorted(pks)
+    for start in range(0, len(pks), BLOCK_SIZE):
+        block = pks[start:start + BLOCK_SIZE]
+        yield block, _scores(block)
+
+
+def _neighbours(pks):
+    """{technique pk: [(related pk, score), ...] best first}, like Corpus.neighbours."""
+    count = settings.RELATED_TECHNIQUES_COUNT
+    result = {}
+    for block, scores in _blocks(pks):
+        for pk in block:
+            # Equal scores list the older technique first.
+            best = sorted(scores[pk].items(), key=lambda item: (-item[1], item[0]))[:count]
+            result[pk] = [(other, float(score)) for other, score in best]
+    return result
+
+
+def refresh(pks):
+    """
+    Update the index after the techniques ``pks`` changed (or were unpublished
+    or deleted): their own lists, the lists that held them, and the lists they
+    now score high enough to enter.
+    """
+    pks = set(pks)
+    count = settings.RELATED_TECHNIQUES_COUNT
+    with transaction.atomic():
+        _lock()
+        if not RelatedTerm.objects.exists():
+            # No vocabulary yet (or too few techniques to have one).
+            return rebuild()
+        changed = _update_vectors(pks)
+        affected = set(RelatedTechnique.objects.filter(related_id__in=pks).values_list('technique_id', flat=True))
+        best = Counter()
+        for _, scores in _blocks(changed):
+            for row in scores.values():
+                best |= row
+        lists = {
+            row['technique_id']: (row['entries'], row['lowest'])
+            for row in RelatedTechnique.objects.filter(technique_id__in=list(best))
+            .values('technique_id').annotate(entries=Count('id'), lowest=Min('score'))
+        }
+        for other, score in best.items():
+            entries, lowest = lists.get(other, (0, 0))
+            if entries < count or score > lowest:
+                affected.add(other)
+        targets = Technique.objects.filter(pk__in=affected | pks, is_published=True).values_list('pk', flat=True)
+        neighbours = _neighbours(targets)
+        RelatedTechnique.objects.filter(technique_id__in=affected | pks).delete()
+        _store(neighbours)
+    return len(neighbours)
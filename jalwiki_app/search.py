@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F, Func, TextField, Value
+from django.db.models.functions import Concat
+from rest_framework import filters
+
+
+def _joined(array_field):
+    return Func(F(array_field), Value(' '), function='array_to_string', output_field=TextField())
+
+
+def technique_search_vector():
+    """Weighted tsvector for a technique: title > summary > content/steps > benefits/materials."""
+    config = settings.TECHNIQUE_SEARCH_CONFIG
+    return (
+        SearchVector('title', weight='A', config=config)
+        + SearchVector('summary', weight='B', config=config)
+        + SearchVector('detailed_content', _joined('steps'), weight='C', config=config)
+        + SearchVector(_joined('benefits'), _joined('materials'), weight='D', config=config)
+    )
+
+
+def full_text_supported(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def refresh_search_vectors(queryset):
+    """Recompute the stored search vector of every technique in ``queryset`` with one UPDATE."""
+    if full_text_supported(queryset):
+        return queryset.update(search_vector=technique_search_vector())
+    return 0
+
+
+class TechniqueSearchFilter(filters.SearchFilter):
+    """
+    ``?q=`` full-text search over the stored, GIN-indexed search vector.
+
+    Results are ordered by rank and annotated with ``search_rank`` and a
+    highlighted ``search_snippet``. On databases without full-text support
+    (SQLite test runs) it falls back to SearchFilter matching on the view's
+    ``search_fields``.
+    """
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        terms = request.query_params.get(self.search_param, '').strip()
+        if not terms:
+            return queryset
+        if not full_text_supported(queryset):
+            return super().filter_queryset(request, queryset, view)
+
+        config = settings.TECHNIQUE_SEARCH_CONFIG
+        query = SearchQuery(terms, search_type='websearch', config=config)
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+            search_snippet=SearchHeadline(
+                Concat('summary', Value(' '), 'detailed_content', output_field=TextField()),
+                query,
+                config=config,
+                start_sel='<mark>',
+                stop_sel='</mark>',
+                max_fragments=2,
+            ),
+        ).order_by('-search_rank', '-created_on')
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters[0]['description'] = 'Full-text search, results ordered by relevance.'
+        return parameters
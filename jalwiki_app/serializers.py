@@ -1,6 +1,129 @@
+from django.conf import settings
+from django.db import models
 from rest_framework import serializers
+from .counters import m2m_columns
+from .fieldsets import is_nested, requested_fieldset
+from .images import srcset
 from .models import User, Category, Technique, TechniqueImage, Region, ForumThread, ForumComment, ForumTag
 
+
+class ViewerFlagListSerializer(serializers.ListSerializer):
+    """Primes the viewer's likes/upvotes for the whole page before serializing each item."""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(iterable)
+        self.child.prime_viewer_flags(items)
+        return [self.child.to_representation(item) for item in items]
+
+
+class ViewerFlagMixin:
+    """
+    Answers ``is_liked_by_user`` from a set kept in the serializer context.
+
+    ``viewer_flag_field`` names the M2M field holding the likes/upvotes. The IDs
+    the viewer has voted on are fetched with one query per batch of objects and
+    shared by every serializer using the same context, including nested ones.
+    """
+    viewer_flag_field = None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not settings.VOTER_ARRAYS_COMPAT:
+            # Counts and is_liked_by_user replace the voter ID array (see the likers/voters endpoints).
+            fields.pop(self.viewer_flag_field, None)
+        return fields
+
+    def _viewer(self):
+        request = self.context.get('request')
+        if not request or not request.user.is_authenticated:
+            return None
+        return request.user
+
+    def _viewer_flag_state(self):
+        key = f'viewer_flags:{self.Meta.model._meta.label}.{self.viewer_flag_field}'
+        return self.context.setdefault(key, {'checked': set(), 'flagged': set()})
+
+    def _unchecked_flag_query(self, objs):
+        """The through-table query for objects not looked up yet, or None."""
+        viewer = self._viewer()
+        if viewer is None or 'is_liked_by_user' not in self.fields:
+            return None, set()
+        ids = {obj.pk for obj in objs} - self._viewer_flag_state()['checked']
+        if not ids:
+            return None, ids
+        through, owner_fk, target_fk = m2m_columns(self.Meta.model, self.viewer_flag_field)
+        query = through.objects.filter(**{target_fk: viewer.pk, f'{owner_fk}__in': ids}).values_list(f'{owner_fk}_id', flat=True)
+        return query, ids
+
+    def prime_viewer_flags(self, objs):
+        query, ids = self._unchecked_flag_query(objs)
+        if query is not None:
+            state = self._viewer_flag_state()
+            state['flagged'].update(query)
+            state['checked'].update(ids)
+
+    async def aprime_viewer_flags(self, objs):
+        """prime_viewer_flags() for async views, which must not query while serializing."""
+        query, ids = self._unchecked_flag_query(objs)
+        if query is not None:
+            state = self._viewer_flag_state()
+            state['flagged'].update([pk async for pk in query])
+            state['checked'].update(ids)
+
+    def get_is_liked_by_user(self, obj):
+        if self._viewer() is None:
+            return False
+        state = self._viewer_flag_state()
+        if obj.pk not in state['checked']:
+            self.prime_viewer_flags([obj])
+        return obj.pk in state['flagged']
+
+
+class SparseFieldsetMixin:
+    """
+    Honours ``?fields=`` and ``?expand=`` on reads (see fieldsets.py).
+
+    ``computed_fields`` names keys that ``to_representation`` adds outside of
+    the declared fields, so they can be requested too.
+    """
+    computed_fields = ()
+
+    def _fieldset(self):
+        return requested_fieldset(self.context.get('request'))
+
+    def include_field(self, name):
+        requested, _ = self._fieldset()
+        return requested is None or name in requested
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested, expand = self._fieldset()
+        if requested is None:
+            return fields
+        unknown = requested - set(fields) - set(self.computed_fields)
+        if unknown:
+            raise serializers.ValidationError({'fields': [f"Unknown field: {name}" for name in sorted(unknown)]})
+        trimmed = {}
+        for name, field in fields.items():
+            if name not in requested:
+                continue
+            if is_nested(field) and name not in expand:
+                source = {} if field.source in (None, name) else {'source': field.source}
+                field = serializers.PrimaryKeyRelatedField(
+                    many=isinstance(field, serializers.ListSerializer), read_only=True, **source,
+                )
+            trimmed[name] = field
+        return trimmed
+
+
+class SrcsetField(serializers.ReadOnlyField):
+    """Renders a variants JSON field (see images.py) as ``{format: srcset string}``."""
+
+    def to_representation(self, value):
+        return srcset(value, self.context.get('request'))
+
+
 class RegionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Region
@@ -26,44 +149,62 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description']
 
 class TechniqueImageSerializer(serializers.ModelSerializer):
+    srcset = SrcsetField(source='variants')
+
     class Meta:
         model = TechniqueImage
-        fields = ['id', 'image', 'caption', 'order', 'type']
+        fields = ['id', 'image', 'caption', 'order', 'type', 'srcset']
 
-class TechniqueListSerializer(serializers.ModelSerializer):
+class TechniqueListSerializer(SparseFieldsetMixin, ViewerFlagMixin, serializers.ModelSerializer):
     categories = CategorySerializer(many=True, read_only=True)
     added_by_username = serializers.CharField(source='added_by.username', read_only=True)
     regions = RegionSerializer(many=True, read_only=True)
+    is_liked_by_user = serializers.SerializerMethodField()
+    main_image_srcset = SrcsetField(source='main_image_variants')
+    viewer_flag_field = 'likes'
+    computed_fields = ('search_rank', 'snippet')
 
     class Meta:
         model = Technique
-        fields = ['id', 'title', 'slug', 'summary', 'main_image', 'created_on', 'updated_on', 'is_published', 'categories', 'added_by_username','regions']
+        fields = ['id', 'title', 'slug', 'summary', 'main_image', 'main_image_srcset', 'created_on', 'updated_on', 'is_published', 'categories', 'added_by_username','regions', 'is_liked_by_user']
+        list_serializer_class = ViewerFlagListSerializer
 
-class TechniqueSerializer(serializers.ModelSerializer):
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if hasattr(instance, 'search_rank'): # Only present for ?q= full-text searches
+            if self.include_field('search_rank'):
+                data['search_rank'] = instance.search_rank
+            if self.include_field('snippet'):
+                data['snippet'] = instance.search_snippet
+        return data
+
+class TechniqueSerializer(SparseFieldsetMixin, ViewerFlagMixin, serializers.ModelSerializer):
     categories = CategorySerializer(many=True, read_only=True)
     regions = RegionSerializer(many=True, read_only=True)
     added_by_username = serializers.CharField(source='added_by.username', read_only=True)
     images = TechniqueImageSerializer(many=True, read_only=True, source='technique_images') #Rename technique_images to images
+    is_liked_by_user = serializers.SerializerMethodField()
+    likes_count = serializers.IntegerField(read_only=True)
+    viewer_flag_field = 'likes'
 
     class Meta:
         model = Technique
-        fields = ['id', 'title', 'slug', 'added_by','summary', 'detailed_content', 'main_image', 'created_on', 'updated_on', 'is_published', 'categories','impact','regions', 'benefits', 'materials', 'steps', 'likes','added_by_username','images'] #Rename technique_images to images
+        fields = ['id', 'title', 'slug', 'added_by','summary', 'detailed_content', 'main_image', 'created_on', 'updated_on', 'is_published', 'categories','impact','regions', 'benefits', 'materials', 'steps', 'likes','added_by_username','images', 'is_liked_by_user', 'likes_count'] #Rename technique_images to images
+        list_serializer_class = ViewerFlagListSerializer
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['likes_count'] = instance.likes.count()
-        if instance.added_by: # Check if added_by is not None
-            data['added_by'] = instance.added_by.id
-        else:
-            data['added_by'] = None # Or handle as appropriate
+        if 'added_by' in data:
+            data['added_by'] = instance.added_by_id # None when the author is gone
         return data
 
 class AuthorSerializer(serializers.ModelSerializer):
     profile_pic_url = serializers.SerializerMethodField()
+    profile_pic_srcset = SrcsetField(source='profile_pic_variants')
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'profile_pic_url']
+        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'profile_pic_url', 'profile_pic_srcset']
 
     def get_profile_pic_url(self, obj):
         if obj.profile_pic:
@@ -73,6 +214,10 @@ class AuthorSerializer(serializers.ModelSerializer):
             return obj.profile_pic.url # Fallback if no request in context
         return None
 
+class VoterSerializer(AuthorSerializer):
+    class Meta(AuthorSerializer.Meta):
+        fields = ['id', 'username', 'profile_pic_url', 'profile_pic_srcset']
+
 class ForumTagSerializer(serializers.ModelSerializer):
     class Meta:
         model = ForumTag
@@ -80,7 +225,7 @@ class ForumTagSerializer(serializers.ModelSerializer):
         read_only_fields = ['slug']
 
 
-class ForumThreadSerializer(serializers.ModelSerializer):
+class ForumThreadSerializer(SparseFieldsetMixin, ViewerFlagMixin, serializers.ModelSerializer):
     author = AuthorSerializer(read_only=True)
     tags = ForumTagSerializer(many=True, read_only=True) # For reading
     tag_ids = serializers.PrimaryKeyRelatedField(
@@ -90,6 +235,7 @@ class ForumThreadSerializer(serializers.ModelSerializer):
     upvote_count = serializers.IntegerField(read_only=True)
     comment_count = serializers.IntegerField(read_only=True)
     is_liked_by_user = serializers.SerializerMethodField()
+    viewer_flag_field = 'upvoted_by'
 
     class Meta:
         model = ForumThread
@@ -105,23 +251,20 @@ class ForumThreadSerializer(serializers.ModelSerializer):
             'slug', 'author', 'created_at', 'updated_at', 'last_activity_at',
             'upvoted_by', 'is_liked_by_user'
         ]
-
-
-    def get_is_liked_by_user(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        return obj.upvoted_by.filter(id=request.user.id).exists()
+        list_serializer_class = ViewerFlagListSerializer
 
     def create(self, validated_data):
         return super().create(validated_data)
 
 
-class ForumCommentSerializer(serializers.ModelSerializer):
+class ForumCommentSerializer(SparseFieldsetMixin, ViewerFlagMixin, serializers.ModelSerializer):
     author = AuthorSerializer(read_only=True)
     upvote_count = serializers.IntegerField(read_only=True)
     is_liked_by_user = serializers.SerializerMethodField()
     replies = serializers.SerializerMethodField(read_only=True)
+    reply_count = serializers.SerializerMethodField()
+    has_more_replies = serializers.SerializerMethodField()
+    viewer_flag_field = 'upvoted_by'
 
     parent_comment = serializers.PrimaryKeyRelatedField(
         queryset=ForumComment.objects.all(),
@@ -140,24 +283,35 @@ class ForumCommentSerializer(serializers.ModelSerializer):
             'created_at',     # Read.
             'updated_at',     # Read.
             'upvote_count',   # Read.
-            'upvoted_by',     # Read: List of user IDs who upvoted.
+            'upvoted_by',     # Read: List of user IDs who upvoted (VOTER_ARRAYS_COMPAT only).
             'is_liked_by_user',# Read.
-            'replies'         # Read: Nested replies.
+            'replies',        # Read: Nested replies.
+            'reply_count',    # Read: Number of direct replies.
+            'has_more_replies' # Read: True when 'replies' is truncated.
         ]
         read_only_fields = [
             'author', 'created_at', 'updated_at', 'upvote_count',
-            'upvoted_by', 'is_liked_by_user', 'replies'
+            'upvoted_by', 'is_liked_by_user', 'replies', 'reply_count', 'has_more_replies'
         ]
+        list_serializer_class = ViewerFlagListSerializer
 
-    def get_is_liked_by_user(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        return obj.upvoted_by.filter(id=request.user.id).exists()
+    def _replies(self, obj):
+        # Comments linked by comments.build_comment_tree carry their replies already.
+        if hasattr(obj, 'tree_replies'):
+            return obj.tree_replies
+        return obj.replies.all()
 
     def get_replies(self, obj):
         serializer_context = self.context
-        return ForumCommentSerializer(obj.replies.all(), many=True, context=serializer_context).data
+        return ForumCommentSerializer(self._replies(obj), many=True, context=serializer_context).data
+
+    def get_reply_count(self, obj):
+        if hasattr(obj, 'reply_total'):
+            return obj.reply_total
+        return len(obj.replies.all())
+
+    def get_has_more_replies(self, obj):
+        return self.get_reply_count(obj) > len(self._replies(obj))
 
     def create(self, validated_data):
         return super().create(validated_data)
@@ -165,4 +319,10 @@ class ForumCommentSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         instance.content = validated_data.get('content', instance.content)
         instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+
+class FlatForumCommentSerializer(ForumCommentSerializer):
+    # No nested replies (the sync feed, ?stream=1): the client links them through parent_comment.
+    class Meta(ForumCommentSerializer.Meta):
+        fields = [name for name in ForumCommentSerializer.Meta.fields if name not in ('replies', 'reply_count', 'has_more_replies')]
@@ -0,0 +1,360 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from jalwiki_pro.authentication import user_cache
+
+from . import autocomplete, counters, documents, events, hotness, images, jobs, sync, tasks
+from .votes import vote_changed
+from .cache import bump_model_version
+from .models import Category, Region, Technique, TechniqueImage, ForumThread, ForumComment, ForumTag, Tombstone, User
+
+# Sent after bulk_create/bulk_update/COPY writes, which bypass the model
+# signals below. Arguments: sender (the model class) and pks.
+bulk_changed = Signal()
+
+
+def _sync_m2m_counter(model, counter, field_name, instance, action, reverse, pk_set):
+    through, owner_fk, target_fk = counters.m2m_columns(model, field_name)
+    pending = instance.__dict__.setdefault('_pending_counter_changes', {})
+
+    if action in ('pre_remove', 'pre_clear'):
+        # Only rows that actually exist are removed, so look them up before they go.
+        if reverse:
+            rows = through.objects.filter(**{target_fk: instance.pk})
+            if pk_set is not None:
+                rows = rows.filter(**{f'{owner_fk}__in': pk_set})
+            pending[through] = list(rows.values_list(f'{owner_fk}_id', flat=True))
+        else:
+            rows = through.objects.filter(**{owner_fk: instance.pk})
+            if pk_set is not None:
+                rows = rows.filter(**{f'{target_fk}__in': pk_set})
+            pending[through] = rows.count()
+
+    elif action == 'post_add' and pk_set:
+        # pk_set only contains the rows that were really inserted.
+        if reverse:
+            counters.adjust(model, counter, 1, pk__in=pk_set)
+        else:
+            counters.adjust(model, counter, len(pk_set), pk=instance.pk)
+
+    elif action in ('post_remove', 'post_clear'):
+        removed = pending.pop(through, None)
+        if reverse and removed:
+            counters.adjust(model, counter, -1, pk__in=removed)
+        elif not reverse and removed:
+            counters.adjust(model, counter, -removed, pk=instance.pk)
+
+
+def _connect_m2m_counter(model, counter, field_name):
+    def handler(sender, instance, action, reverse, pk_set, **kwargs):
+        _sync_m2m_counter(model, counter, field_name, instance, action, reverse, pk_set)
+
+    through = counters.m2m_columns(model, field_name)[0]
+    m2m_changed.connect(handler, sender=through, weak=False,
+                        dispatch_uid=f'counter:{model._meta.label}.{counter}')
+
+
+for _model, _counter, _field_name in counters.M2M_COUNTERS:
+    _connect_m2m_counter(_model, _counter, _field_name)
+
+
+@receiver(post_save, sender=ForumComment)
+def increment_comment_count(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust(ForumThread, 'comment_count', 1, pk=instance.thread_id)
+
+
+@receiver(post_delete, sender=ForumComment)
+def decrement_comment_count(sender, instance, **kwargs):
+    counters.adjust(ForumThread, 'comment_count', -1, pk=instance.thread_id)
+
+
+SEARCHABLE_FIELDS = {'title', 'summary', 'detailed_content', 'steps', 'benefits', 'materials'}
+
+
+@receiver(post_save, sender=Technique)
+def update_search_vector(sender, instance, update_fields, **kwargs):
+    if update_fields is not None and not SEARCHABLE_FIELDS.intersection(update_fields):
+        return
+    jobs.enqueue('search.refresh_vectors', {'pks': [instance.pk]}, dedupe_key=f'search:{instance.pk}')
+
+
+@receiver(bulk_changed, sender=Technique)
+def update_search_vectors_in_bulk(sender, pks, **kwargs):
+    if pks:
+        jobs.enqueue('search.refresh_vectors', {'pks': list(pks)})
+
+
+@receiver([post_save, post_delete, bulk_changed], sender=Technique)
+def invalidate_title_autocomplete(sender, **kwargs):
+    autocomplete.technique_titles.clear()
+
+
+@receiver([post_save, post_delete, bulk_changed], sender=Category)
+@receiver([post_save, post_delete, bulk_changed], sender=Region)
+@receiver([post_save, post_delete, bulk_changed], sender=ForumTag)
+def invalidate_lookup_autocomplete(sender, **kwargs):
+    for index in autocomplete.lookup_indexes.values():
+        if index.queryset.model is sender:
+            index.invalidate()
+
+
+# Models whose changes invalidate cached API responses (see cache.CachedResponseMixin).
+VERSIONED_MODELS = [Technique, Category, Region, TechniqueImage, ForumTag]
+
+
+def _response_cache_changed(model):
+    # Both run after commit (bump_model_version defers itself), so the warm-up
+    # renders the committed rows under the new version.
+    bump_model_version(model)
+    transaction.on_commit(tasks.schedule_cache_warm, robust=True)
+
+
+def bump_response_cache_version(sender, **kwargs):
+    _response_cache_changed(sender)
+
+
+def bump_technique_version_on_m2m(sender, action, **kwargs):
+    if action.startswith('post_'):
+        _response_cache_changed(Technique)
+
+
+@receiver(vote_changed, sender=Technique)
+def bump_technique_version_on_vote(sender, **kwargs):
+    _response_cache_changed(Technique)
+
+
+for _model in VERSIONED_MODELS:
+    post_save.connect(bump_response_cache_version, sender=_model, dispatch_uid=f'response-cache-save:{_model._meta.label}')
+    post_delete.connect(bump_response_cache_version, sender=_model, dispatch_uid=f'response-cache-delete:{_model._meta.label}')
+    bulk_changed.connect(bump_response_cache_version, sender=_model, dispatch_uid=f'response-cache-bulk:{_model._meta.label}')
+
+for _field_name in ('categories', 'regions', 'likes'):
+    m2m_changed.connect(bump_technique_version_on_m2m, sender=getattr(Technique, _field_name).through,
+                        dispatch_uid=f'response-cache-m2m:{_field_name}')
+
+
+def schedule_image_variants(sender, instance, update_fields, raw=False, **kwargs):
+    image_field = images.IMAGE_FIELDS[sender][0]
+    if raw or (update_fields is not None and image_field not in update_fields):
+        return
+    if not images.variants_current(instance):
+        images.schedule_variants(instance)
+
+
+for _model in images.IMAGE_FIELDS:
+    post_save.connect(schedule_image_variants, sender=_model, dispatch_uid=f'image-variants:{_model._meta.label}')
+
+
+# Technique documents (jalwiki_app.documents): rebuilt inline when a technique
+# itself changes. When something many techniques share changes, their
+# documents are dropped at once (responses fall back to the serializers) and
+# rebuilt by a job.
+
+def _rebuild_documents_later(pks):
+    pks = sorted(set(pks))
+    if pks:
+        documents.discard(pks)
+        jobs.enqueue('documents.rebuild', {'pks': pks})
+
+
+def _deleted_with_technique(origin):
+    return isinstance(origin, Technique) or getattr(origin, 'model', None) is Technique
+
+
+@receiver(post_save, sender=Technique)
+def rebuild_technique_document(sender, instance, raw=False, **kwargs):
+    if not raw:
+        documents.rebuild([instance.pk])
+
+
+@receiver(post_save, sender=TechniqueImage)
+@receiver(post_delete, sender=TechniqueImage)
+def rebuild_document_on_image_change(sender, instance, raw=False, origin=None, **kwargs):
+    if not raw and not _deleted_with_technique(origin):
+        documents.rebuild([instance.technique_id])
+
+
+@receiver(images.variants_changed)
+def rebuild_document_on_new_variants(sender, pk, **kwargs):
+    if sender is Technique:
+        documents.rebuild([pk])
+    elif sender is TechniqueImage:
+        documents.rebuild(TechniqueImage.objects.filter(pk=pk).values_list('technique_id', flat=True))
+
+
+@receiver(bulk_changed, sender=Technique)
+def rebuild_documents_in_bulk(sender, pks, **kwargs):
+    _rebuild_documents_later(pks)
+
+
+def _linked_techniques(field_name, instance):
+    through, owner_fk, target_fk = counters.m2m_columns(Technique, field_name)
+    return set(through.objects.filter(**{f'{target_fk}_id': instance.pk}).values_list(f'{owner_fk}_id', flat=True))
+
+
+def _connect_document_m2m(field_name, related_model):
+    def m2m_handler(sender, instance, action, reverse, pk_set, **kwargs):
+        if action == 'pre_clear' and reverse:
+            instance._document_pks = _linked_techniques(field_name, instance)
+        elif action in ('post_add', 'post_remove', 'post_clear'):
+            if not reverse:
+                documents.rebuild([instance.pk])
+            else:
+                documents.rebuild(pk_set if pk_set is not None else instance.__dict__.pop('_document_pks', ()))
+
+    def save_handler(sender, instance, created, raw=False, **kwargs):
+        if not created and not raw:
+            _rebuild_documents_later(_linked_techniques(field_name, instance))
+
+    def pre_delete_handler(sender, instance, **kwargs):
+        instance._document_pks = _linked_techniques(field_name, instance)
+
+    def post_delete_handler(sender, instance, **kwargs):
+        _rebuild_documents_later(instance.__dict__.pop('_document_pks', ()))
+
+    uid = f'technique-document:{field_name}'
+    m2m_changed.connect(m2m_handler, sender=getattr(Technique, field_name).through, weak=False, dispatch_uid=uid)
+    post_save.connect(save_handler, sender=related_model, weak=False, dispatch_uid=uid)
+    pre_delete.connect(pre_delete_handler, sender=related_model, weak=False, dispatch_uid=uid)
+    post_delete.connect(post_delete_handler, sender=related_model, weak=False, dispatch_uid=uid)
+
+
+_connect_document_m2m('categories', Category)
+_connect_document_m2m('regions', Region)
+
+
+@receiver(post_save, sender=User)
+def rebuild_documents_on_author_change(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if created or raw or (update_fields is not None and 'username' not in update_fields):
+        return
+    _rebuild_documents_later(Technique.objects.filter(added_by=instance).values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=User)
+def remember_authored_techniques(sender, instance, **kwargs):
+    instance._document_pks = list(Technique.objects.filter(added_by=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=User)
+def rebuild_documents_on_author_delete(sender, instance, **kwargs):
+    _rebuild_documents_later(instance.__dict__.pop('_document_pks', ()))
+
+
+# Related techniques (jalwiki_app.related). Likes only feed the periodic
+# 'related.rebuild' job.
+RELATED_FIELDS = {'title', 'summary', 'steps', 'impact', 'is_published'}
+
+
+def _refresh_related(pks):
+    for pk in pks:
+        jobs.enqueue('related.refresh', {'pks': [pk]}, dedupe_key=f'related:{pk}')
+
+
+@receiver(post_save, sender=Technique)
+def refresh_related_on_save(sender, instance, update_fields, raw=False, **kwargs):
+    if not raw and (update_fields is None or RELATED_FIELDS.intersection(update_fields)):
+        _refresh_related([instance.pk])
+
+
+@receiver(pre_delete, sender=Technique)
+def remember_related_holders(sender, instance, **kwargs):
+    instance._related_holders = list(instance.related_to.values_list('technique_id', flat=True))
+
+
+@receiver(post_delete, sender=Technique)
+def refresh_related_on_delete(sender, instance, **kwargs):
+    _refresh_related(instance.__dict__.pop('_related_holders', ()))
+
+
+@receiver(bulk_changed, sender=Technique)
+def rebuild_related_in_bulk(sender, pks, **kwargs):
+    if pks:
+        jobs.enqueue('related.rebuild', dedupe_key='related.rebuild')
+
+
+def refresh_related_on_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        _refresh_related((pk_set or ()) if reverse else [instance.pk])
+
+
+for _field_name in ('categories', 'regions'):
+    m2m_changed.connect(refresh_related_on_m2m, sender=getattr(Technique, _field_name).through,
+                        dispatch_uid=f'related:{_field_name}')
+
+
+# Forum hot scores (jalwiki_app.hotness), recomputed after the counters above
+# have been adjusted.
+
+@receiver(post_save, sender=ForumThread)
+def score_new_thread(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        hotness.update([instance.pk])
+
+
+@receiver(post_save, sender=ForumComment)
+@receiver(post_delete, sender=ForumComment)
+def rescore_thread_on_comment(sender, instance, created=True, raw=False, **kwargs):
+    if created and not raw:
+        hotness.update([instance.thread_id])
+
+
+@receiver(vote_changed, sender=ForumThread)
+def rescore_thread_on_vote(sender, instance, **kwargs):
+    hotness.update([instance.pk])
+
+
+def rescore_threads_on_upvote(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        hotness.update((pk_set or ()) if reverse else [instance.pk])
+
+
+m2m_changed.connect(rescore_threads_on_upvote, sender=ForumThread.upvoted_by.through, dispatch_uid='hot-score:upvotes')
+
+
+# Users cached for claims-based JWT authentication (jalwiki_pro.authentication).
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+# Sync feed (jalwiki_app.sync): deletions become tombstones.
+
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(model=sender._meta.label_lower, object_id=instance.pk)
+
+
+for _model in (Technique, TechniqueImage, ForumTag, ForumThread, ForumComment):
+    post_delete.connect(record_tombstone, sender=_model, dispatch_uid=f'sync-tombstone:{_model._meta.label_lower}')
+
+
+# ... and images follow their technique in and out of public view.
+
+@receiver(pre_save, sender=Technique)
+def remember_published_state(sender, instance, update_fields=None, raw=False, **kwargs):
+    if not raw and instance.pk is not None and (update_fields is None or 'is_published' in update_fields):
+        instance._was_published = Technique.objects.filter(pk=instance.pk).values_list('is_published', flat=True).first()
+
+
+@receiver(post_save, sender=Technique)
+def touch_images_on_publish(sender, instance, created, raw=False, **kwargs):
+    was_published = instance.__dict__.pop('_was_published', None)
+    if not raw and not created and was_published is not None and was_published != instance.is_published:
+        sync.touch_technique_images(instance.pk)
+
+
+# Live forum events (jalwiki_app.events).
+
+@receiver(post_save, sender=ForumComment)
+def publish_comment_event(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        events.publish_comment(instance, created)
+
+
+@receiver(vote_changed, sender=ForumThread)
+@receiver(vote_changed, sender=ForumComment)
+def publish_vote_count_event(sender, instance, count, **kwargs):
+    events.publish_vote_count(instance, count)
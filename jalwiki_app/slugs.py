@@ -0,0 +1,75 @@
+import re
+from collections import defaultdict
+from itertools import chain
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+# Characters kept free at the end of a slug field for the "-<n>" suffix.
+SUFFIX_ROOM = 6
+
+
+def slug_base(model, text, field='slug'):
+    max_length = model._meta.get_field(field).max_length
+    return slugify(text)[:max_length - SUFFIX_ROOM].strip('-') or model._meta.model_name
+
+
+def allocate_slugs(model, texts, field='slug', taken=()):
+    """
+    Return a free slug for each of ``texts`` using a single query.
+
+    The slugs already taken for every base are fetched at once. A free base is
+    used as it is; otherwise the lowest free suffix is (``base-1``, ...), so a
+    title ending in a number, e.g. ``pond-2024``, does not push later
+    duplicates up to ``pond-2025``.
+    Duplicates within ``texts`` get distinct slugs, so this also serves bulk
+    imports; ``taken`` adds slugs that are not saved yet but already spoken for. Callers must still handle a concurrent insert winning the race,
+    see save_with_unique_slug().
+    """
+    bases = [slug_base(model, text, field) for text in texts]
+    if not bases:
+        return []
+    condition = Q()
+    for base in set(bases):
+        # Only numbered suffixes: a prefix match would also read every 'base-...' slug.
+        condition |= Q(**{field: base}) | Q(**{f'{field}__regex': rf'^{re.escape(base)}-\d+$'})
+
+    used = defaultdict(set)
+    wanted = set(bases)
+    for slug in chain(model._default_manager.filter(condition).values_list(field, flat=True).iterator(), taken):
+        if slug in wanted:
+            used[slug].add(0)
+        head, _, tail = slug.rpartition('-')
+        if head in wanted and tail.isdigit():
+            used[head].add(int(tail))
+
+    slugs = []
+    for base in bases:
+        taken = used[base]
+        suffix = 0
+        while suffix in taken:
+            suffix += 1
+        taken.add(suffix)
+        slugs.append(f'{base}-{suffix}' if suffix else base)
+    return slugs
+
+
+def save_with_unique_slug(instance, text, save, field='slug', attempts=5):
+    """
+    Give ``instance`` a free slug derived from ``text`` and call ``save()``.
+
+    If a concurrent request inserted the same slug first, the unique
+    constraint fails inside a savepoint and a new slug is allocated.
+    """
+    model = type(instance)
+    for attempt in range(attempts):
+        setattr(instance, field, allocate_slugs(model, [text], field)[0])
+        try:
+            with transaction.atomic():
+                save()
+            return
+        except IntegrityError:
+            slug_taken = model._default_manager.filter(**{field: getattr(instance, field)}).exists()
+            if not slug_taken or attempt == attempts - 1:
+                raise
@@ -0,0 +1,170 @@
+"""
+Incremental "changes since" feed: ``GET /api/sync/?since=<token>``.
+
+Returns the techniques, technique images, forum tags, threads and comments
+created or updated after ``since`` (by their indexed updated_on/updated_at
+column), plus the IDs of those deleted since then (Tombstone rows written on
+post_delete), at most ``limit`` changes per page. ``next`` is the token for
+the following request and ``has_more`` says whether to ask again right away.
+Without ``since`` the feed starts from the beginning, i.e. a full sync.
+
+A token is a (timestamp, stream, id) position in one global order of all
+changes, so pages never skip or repeat a change. Changes from the last
+SYNC_SETTLE_SECONDS are held back until the transactions writing around
+them have committed. Tombstones are purged after SYNC_TOMBSTONE_RETENTION. A
+token older than that can no longer see every deletion, so the response
+says ``reset: true`` and starts over from the beginning; the client should
+drop its copy.
+
+Readers who cannot see unpublished techniques get them, and their images,
+as deletions. Publishing or unpublishing a technique touches its images'
+updated_at, so they follow it into (or out of) such a reader's copy.
+Counter-only updates (likes, comment counts) do not move updated_at and are
+not part of the feed.
+"""
+import base64
+import json
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from . import votes
+from .models import ForumComment, ForumTag, ForumThread, Technique, TechniqueImage, Tombstone
+from .serializers import FlatForumCommentSerializer, ForumTagSerializer, ForumThreadSerializer, TechniqueImageSerializer, TechniqueSerializer
+
+
+class SyncTechniqueSerializer(TechniqueSerializer):
+    # Images have their own stream; an image change does not touch the technique.
+    class Meta(TechniqueSerializer.Meta):
+        fields = [name for name in TechniqueSerializer.Meta.fields if name != 'images']
+
+
+class SyncTechniqueImageSerializer(TechniqueImageSerializer):
+    class Meta(TechniqueImageSerializer.Meta):
+        fields = TechniqueImageSerializer.Meta.fields + ['technique']
+
+
+Stream = namedtuple('Stream', 'name model timestamp serializer_class queryset')
+
+STREAMS = [
+    Stream('techniques', Technique, 'updated_on', SyncTechniqueSerializer, lambda: votes.with_voters(
+        Technique.objects.select_related('added_by').prefetch_related('categories', 'regions'), 'likes',
+    )),
+    Stream('technique_images', TechniqueImage, 'updated_at', SyncTechniqueImageSerializer, lambda: (
+        TechniqueImage.objects.annotate(technique_published=F('technique__is_published'))
+    )),
+    Stream('forum_tags', ForumTag, 'updated_at', ForumTagSerializer, ForumTag.objects.all),
+    Stream('forum_threads', ForumThread, 'updated_at', ForumThreadSerializer, lambda: votes.with_voters(
+        ForumThread.objects.select_related('author').prefetch_related('tags'), 'upvoted_by',
+    )),
+    Stream('forum_comments', ForumComment, 'updated_at', FlatForumCommentSerializer, lambda: votes.with_voters(
+        ForumComment.objects.select_related('author'), 'upvoted_by',
+    )),
+]
+STREAMS_BY_LABEL = {stream.model._meta.label_lower: stream for stream in STREAMS}
+TOMBSTONES = len(STREAMS)  # Position of the tombstone stream in the global order.
+# What makes a row visible to readers who are not staff.
+PUBLISHED_FLAGS = {Technique: 'is_published', TechniqueImage: 'technique_published'}
+
+Position = namedtuple('Position', 'timestamp stream pk')
+
+
+def encode_token(position):
+    raw = json.dumps({'t': position.timestamp.isoformat(), 's': position.stream, 'p': position.pk}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    try:
+        data = json.loads(base64.urlsafe_b64decode((token + '=' * (-len(token) % 4)).encode()))
+        timestamp = parse_datetime(data['t'])
+        if timestamp is None:
+            raise ValueError
+        return Position(timestamp, int(data['s']), int(data['p']))
+    except (TypeError, ValueError, KeyError):
+        raise ValidationError({'since': ["Invalid sync token."]})
+
+
+def _after(field, index, since):
+    """Rows of stream ``index`` that come after ``since`` in the global order."""
+    if since is None:
+        return Q()
+    if index > since.stream:
+        return Q(**{f'{field}__gte': since.timestamp})
+    if index < since.stream:
+        return Q(**{f'{field}__gt': since.timestamp})
+    return Q(**{f'{field}__gt': since.timestamp}) | Q(**{field: since.timestamp, 'pk__gt': since.pk})
+
+
+def _keys(model, field, index, since, until, limit, queryset=None):
+    queryset = model._default_manager.all() if queryset is None else queryset
+    rows = (
+        queryset.filter(_after(field, index, since), **{f'{field}__lte': until})
+        .order_by(field, 'pk').values_list(field, 'pk')[:limit]
+    )
+    return [Position(timestamp, index, pk) for timestamp, pk in rows]
+
+
+def changes_since(since, limit, request):
+    """One page of the feed after the position ``since`` (None for a full sync)."""
+    now = timezone.now()
+    until = now - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+    reset = since is not None and since.timestamp < now - settings.SYNC_TOMBSTONE_RETENTION
+    if reset:
+        since = None
+    staff = request.user.is_staff
+
+    # The first ``limit`` keys of each stream, merged; only those rows are loaded.
+    keys = []
+    for index, stream in enumerate(STREAMS):
+        keys += _keys(stream.model, stream.timestamp, index, since, until, limit)
+    keys += _keys(Tombstone, 'deleted_at', TOMBSTONES, since, until, limit)
+    keys.sort()
+    page, has_more = keys[:limit], len(keys) > limit
+
+    changes = {stream.name: [] for stream in STREAMS}
+    deleted = {stream.name: [] for stream in STREAMS}
+    context = {'request': request}
+    for index, stream in enumerate(STREAMS):
+        order = {key.pk: n for n, key in enumerate(page) if key.stream == index}
+        if not order:
+            continue
+        objs = sorted(stream.queryset().filter(pk__in=order), key=lambda obj: order[obj.pk])
+        flag = None if staff else PUBLISHED_FLAGS.get(stream.model)
+        if flag:
+            deleted[stream.name] += [obj.pk for obj in objs if not getattr(obj, flag)]
+            objs = [obj for obj in objs if getattr(obj, flag)]
+        changes[stream.name] = stream.serializer_class(objs, many=True, context=context).data
+    tombstone_pks = [key.pk for key in page if key.stream == TOMBSTONES]
+    for label, object_id in Tombstone.objects.filter(pk__in=tombstone_pks).order_by('deleted_at', 'pk').values_list('model', 'object_id'):
+        if label in STREAMS_BY_LABEL:
+            deleted[STREAMS_BY_LABEL[label].name].append(object_id)
+
+    if has_more:
+        position = page[-1]
+    elif since is not None and since.timestamp >= until:
+        position = since  # Asked again within the settle window; never move backwards.
+    else:
+        # Everything up to ``until`` has been seen.
+        position = Position(until, TOMBSTONES + 1, 0)
+    return {
+        'changes': changes,
+        'deleted': deleted,
+        'next': encode_token(position),
+        'has_more': has_more,
+        'reset': reset,
+    }
+
+
+def touch_technique_images(technique_pk):
+    """Move the images of a technique whose visibility changed into the feed."""
+    return TechniqueImage.objects.filter(technique_id=technique_pk).update(updated_at=timezone.now())
+
+
+def purge_tombstones(older_than):
+    return Tombstone.objects.filter(deleted_at__lt=timezone.now() - older_than).delete()[0]
@@ -0,0 +1,74 @@
+"""Background jobs run by jalwiki_app.jobs workers."""
+from urllib.parse import urlsplit
+
+from django.apps import apps
+from django.conf import settings
+from django.test import RequestFactory
+from django.urls import resolve
+
+from . import counters, documents, hotness, images, jobs, related, sync
+from .cache import bump_model_version
+from .models import Technique
+from .search import refresh_search_vectors
+
+
+@jobs.register('images.build_variants')
+def build_image_variants(model, pk):
+    images.process_image(apps.get_model(model), pk)
+
+
+@jobs.register('search.refresh_vectors')
+def refresh_technique_search_vectors(pks):
+    refresh_search_vectors(Technique.objects.filter(pk__in=pks))
+
+
+@jobs.register('documents.rebuild')
+def rebuild_technique_documents(pks):
+    """Rebuilds after a change shared by many techniques (a category, region or author)."""
+    if documents.rebuild(pks):
+        bump_model_version(Technique)
+
+
+@jobs.register('related.refresh')
+def refresh_related_techniques(pks):
+    related.refresh(pks)
+
+
+@jobs.register('related.rebuild')
+def rebuild_related_techniques():
+    """Periodic full rebuild; co-likes are not refreshed incrementally."""
+    related.rebuild()
+
+
+@jobs.register('forum.decay_hot_scores')
+def decay_hot_scores():
+    hotness.decay()
+
+
+@jobs.register('sync.purge_tombstones')
+def purge_sync_tombstones():
+    sync.purge_tombstones(settings.SYNC_TOMBSTONE_RETENTION)
+
+
+@jobs.register('counters.reconcile')
+def reconcile_counters():
+    """Periodic safety net for denormalized counters (see rebuild_counters)."""
+    for model, counter, actual in counters.all_counters():
+        counters.rebuild(model, counter, actual)
+
+
+@jobs.register('cache.warm')
+def warm_response_cache():
+    """Render RESPONSE_CACHE_WARM_URLS anonymously so the next visitor gets a cached response."""
+    factory = RequestFactory()
+    for url in settings.RESPONSE_CACHE_WARM_URLS:
+        parts = urlsplit(url)
+        request = factory.get(f'{parts.path}?{parts.query}', HTTP_HOST=parts.netloc, secure=parts.scheme == 'https')
+        match = resolve(parts.path)
+        match.func(request, *match.args, **match.kwargs)
+
+
+def schedule_cache_warm():
+    if settings.RESPONSE_CACHE_ENABLED and settings.RESPONSE_CACHE_WARM_URLS:
+        # Coalesces a burst of writes into one warm-up a few seconds later.
+        jobs.enqueue('cache.warm', dedupe_key='cache.warm', delay=settings.RESPONSE_CACHE_WARM_DELAY)
@@ -1,13 +1,54 @@
+import gzip
+import json
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+import asyncio
+
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.db.models.signals import post_init
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APITestCase as DRFTestCase, APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
-from .models import Technique, Category, Region
+from jalwiki_pro.asgi import application
+from jalwiki_pro.authentication import ClaimsRefreshToken, user_cache
+from jalwiki_pro.pagination import KeysetPagination
+from . import autocomplete, bulk, events, hotness, jobs, related, sync, votes
+from .models import Job, RelatedTechnique, RelatedTerm, Technique, TechniqueDocument, TechniqueImage, Category, Region, ForumThread, ForumComment, ForumTag
+from .slugs import allocate_slugs
+from .management.commands import explain_endpoints
+from .urls import router
 
 
 User = get_user_model()
 
 
+class APITestCase(DRFTestCase):
+	"""
+	Writes in these tests are rolled back, never committed, so they do not bump
+	the response cache versions (those wait for the commit); start every test
+	from an empty response cache so earlier tests' pages are not served.
+	"""
+
+	def _pre_setup(self):
+		super()._pre_setup()
+		caches[settings.RESPONSE_CACHE_ALIAS].clear()
+
+
 class PublicReadPaginationTests(APITestCase):
 	def setUp(self):
 		# Users
@@ -83,3 +124,1531 @@ class PublicReadPaginationTests(APITestCase):
 		res = self.client.get("/api/techniques/?page_size=5")
 		self.assertEqual(res.status_code, status.HTTP_200_OK)
 		self.assertLessEqual(len(res.data.get("results", [])), 5)
+
+
+class DenormalizedCounterTests(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(
+			email="liker@example.com", password="pass1234", username="liker", first_name="l", last_name="k",
+		)
+		self.other = User.objects.create_user(
+			email="other@example.com", password="pass1234", username="other", first_name="o", last_name="t",
+		)
+		self.technique = Technique.objects.create(title="Drip", summary="s", detailed_content="d", is_published=True)
+		self.thread = ForumThread.objects.create(title="Wells", content="c", author=self.user)
+
+	def test_toggle_like_updates_stored_count(self):
+		self.client.force_authenticate(user=self.user)
+		url = f"/api/techniques/{self.technique.id}/toggle_like/"
+		res = self.client.post(url)
+		self.assertEqual(res.data, {"liked": True, "likes_count": 1})
+		res = self.client.post(url)
+		self.assertEqual(res.data, {"liked": False, "likes_count": 0})
+
+	def test_m2m_changes_in_both_directions(self):
+		self.technique.likes.add(self.user, self.other)
+		self.technique.likes.add(self.user)  # already present, must not double count
+		self.technique.refresh_from_db()
+		self.assertEqual(self.technique.likes_count, 2)
+
+		self.user.liked_techniques.remove(self.technique)
+		self.technique.refresh_from_db()
+		self.assertEqual(self.technique.likes_count, 1)
+
+		self.technique.likes.remove(self.user)  # not present any more
+		self.technique.likes.clear()
+		self.technique.refresh_from_db()
+		self.assertEqual(self.technique.likes_count, 0)
+
+	def test_comment_create_and_delete(self):
+		root = ForumComment.objects.create(thread=self.thread, author=self.user, content="a")
+		ForumComment.objects.create(thread=self.thread, author=self.other, content="b", parent_comment=root)
+		self.thread.refresh_from_db()
+		self.assertEqual(self.thread.comment_count, 2)
+
+		root.delete()  # cascades to the reply
+		self.thread.refresh_from_db()
+		self.assertEqual(self.thread.comment_count, 0)
+
+	def test_rebuild_counters_fixes_drift(self):
+		self.thread.upvoted_by.add(self.user)
+		comment = ForumComment.objects.create(thread=self.thread, author=self.user, content="a")
+		ForumThread.objects.filter(pk=self.thread.pk).update(upvote_count=7, comment_count=0)
+		ForumComment.objects.filter(pk=comment.pk).update(upvote_count=3)
+
+		call_command("rebuild_counters", stdout=StringIO())
+
+		self.thread.refresh_from_db()
+		comment.refresh_from_db()
+		self.assertEqual((self.thread.upvote_count, self.thread.comment_count), (1, 1))
+		self.assertEqual(comment.upvote_count, 0)
+
+	def test_put_and_delete_like_are_idempotent(self):
+		self.technique.likes.add(self.other)
+		self.client.force_authenticate(user=self.user)
+		url = f"/api/techniques/{self.technique.id}/like/"
+		for _ in range(2):
+			self.assertEqual(self.client.put(url).data, {"liked": True, "likes_count": 2})
+		for _ in range(2):
+			self.assertEqual(self.client.delete(url).data, {"liked": False, "likes_count": 1})
+		self.assertEqual(list(self.technique.likes.all()), [self.other])
+		self.assertEqual(self.client.put("/api/techniques/999999/like/").status_code, status.HTTP_404_NOT_FOUND)
+
+	def test_upvote_methods(self):
+		comment = ForumComment.objects.create(thread=self.thread, author=self.other, content="a")
+		self.client.force_authenticate(user=self.user)
+		for url in (f"/api/forum-threads/{self.thread.slug}/upvote/", f"/api/forum-comments/{comment.pk}/upvote/"):
+			self.assertEqual(self.client.post(url).data["count"], 1)
+			self.assertEqual(self.client.put(url).data, {"status": "vote processed", "upvoted": True, "count": 1})
+			self.assertEqual(self.client.delete(url).data["count"], 0)
+			self.assertEqual(self.client.delete(url).data["count"], 0)
+			self.assertEqual(self.client.post(url).data["upvoted"], True)
+
+	def test_toggle_does_not_load_voters(self):
+		for i in range(5):
+			voter = User.objects.create_user(
+				email=f"voter{i}@example.com", password="pass1234", username=f"voter{i}", first_name="v", last_name="v",
+			)
+			self.technique.likes.add(voter)
+		self.client.force_authenticate(user=self.user)
+		with CaptureQueriesContext(connection) as ctx:
+			res = self.client.post(f"/api/techniques/{self.technique.id}/toggle_like/")
+		self.assertEqual(res.data, {"liked": True, "likes_count": 6})
+		through = Technique.likes.through._meta.db_table
+		self.assertFalse(any(
+			f'FROM "{through}"' in query["sql"] and "jalwiki_app_user" in query["sql"] for query in ctx.captured_queries
+		))
+
+	def test_vote_changed_only_on_change(self):
+		received = []
+		votes.vote_changed.connect(lambda **kwargs: received.append(kwargs["voted"]), sender=Technique, weak=False,
+			dispatch_uid="test-vote-changed")
+		self.addCleanup(votes.vote_changed.disconnect, sender=Technique, dispatch_uid="test-vote-changed")
+		votes.set_vote(self.technique, "likes", self.user, True)
+		votes.set_vote(self.technique, "likes", self.user, True)
+		self.assertEqual(votes.toggle(self.technique, "likes", self.user), (False, 0))
+		self.assertEqual(received, [True, False])
+
+
+class ViewerFlagBatchingTests(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(
+			email="viewer@example.com", password="pass1234", username="viewer", first_name="v", last_name="w",
+		)
+		self.client.force_authenticate(user=self.user)
+
+	def _list_queries(self, url):
+		with CaptureQueriesContext(connection) as ctx:
+			res = self.client.get(url)
+		self.assertEqual(res.status_code, status.HTTP_200_OK)
+		return res, len(ctx.captured_queries)
+
+	def test_thread_flags_cost_does_not_grow_with_page(self):
+		for i in range(2):
+			ForumThread.objects.create(title=f"T{i}", content="c", author=self.user)
+		_, small = self._list_queries("/api/forum-threads/")
+
+		threads = [ForumThread.objects.create(title=f"U{i}", content="c", author=self.user) for i in range(6)]
+		threads[0].upvoted_by.add(self.user)
+		res, large = self._list_queries("/api/forum-threads/")
+
+		self.assertEqual(small, large)
+		flagged = {item["id"] for item in res.data["results"] if item["is_liked_by_user"]}
+		self.assertEqual(flagged, {threads[0].id})
+
+	def test_technique_flags(self):
+		liked = Technique.objects.create(title="A", summary="s", detailed_content="d", is_published=True)
+		Technique.objects.create(title="B", summary="s", detailed_content="d", is_published=True)
+		liked.likes.add(self.user)
+
+		res = self.client.get("/api/techniques/")
+		flags = {item["id"]: item["is_liked_by_user"] for item in res.data["results"]}
+		self.assertTrue(flags.pop(liked.id))
+		self.assertFalse(any(flags.values()))
+
+		res = self.client.get(f"/api/techniques/{liked.id}/")
+		self.assertTrue(res.data["is_liked_by_user"])
+
+
+class CommentTreeTests(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(
+			email="tree@example.com", password="pass1234", username="tree", first_name="t", last_name="r",
+		)
+		self.client.force_authenticate(user=self.user)
+
+	def _thread_with_chain(self, title, depth):
+		thread = ForumThread.objects.create(title=title, content="c", author=self.user)
+		parent = None
+		for level in range(depth):
+			parent = ForumComment.objects.create(thread=thread, author=self.user, content=f"l{level}", parent_comment=parent)
+		return thread
+
+	def _get(self, url):
+		with CaptureQueriesContext(connection) as ctx:
+			res = self.client.get(url)
+		self.assertEqual(res.status_code, status.HTTP_200_OK)
+		return res, len(ctx.captured_queries)
+
+	def test_query_count_is_constant_for_deep_threads(self):
+		shallow = self._thread_with_chain("Shallow", 2)
+		deep = self._thread_with_chain("Deep", 9)
+		_, shallow_queries = self._get(f"/api/forum-threads/{shallow.slug}/thread-comments/")
+		res, deep_queries = self._get(f"/api/forum-threads/{deep.slug}/thread-comments/")
+		self.assertEqual(shallow_queries, deep_queries)
+
+		node, depth = res.data[0], 1
+		while node["replies"]:
+			node, depth = node["replies"][0], depth + 1
+		self.assertEqual(depth, 9)
+
+	def test_max_depth_and_load_more(self):
+		thread = ForumThread.objects.create(title="Wide", content="c", author=self.user)
+		root = ForumComment.objects.create(thread=thread, author=self.user, content="root")
+		for i in range(3):
+			reply = ForumComment.objects.create(thread=thread, author=self.user, content=f"r{i}", parent_comment=root)
+		ForumComment.objects.create(thread=thread, author=self.user, content="deep", parent_comment=reply)
+
+		res, _ = self._get(f"/api/forum-threads/{thread.slug}/thread-comments/?replies_limit=2&max_depth=2")
+		root_data = res.data[0]
+		self.assertEqual(root_data["reply_count"], 3)
+		self.assertTrue(root_data["has_more_replies"])
+		self.assertEqual(len(root_data["replies"]), 2)
+		self.assertEqual(root_data["replies"][0]["replies"], [])
+
+		res, _ = self._get(f"/api/forum-comments/{root.id}/replies/?offset=2&limit=10")
+		self.assertEqual(res.data["count"], 3)
+		self.assertEqual([c["content"] for c in res.data["results"]], ["r2"])
+		self.assertEqual(res.data["results"][0]["replies"][0]["content"], "deep")
+
+	def test_reply_trees_load_only_the_returned_subtree(self):
+		thread = self._thread_with_chain("Busy", 3)
+		root, reply, nested = thread.comments.order_by("pk")
+		other = ForumComment.objects.create(thread=thread, author=self.user, content="other")
+		for i in range(5):
+			ForumComment.objects.create(thread=thread, author=self.user, content=f"o{i}", parent_comment=other)
+		loaded = set()
+		def record(sender, instance, **kwargs):
+			loaded.add(instance.pk)
+		post_init.connect(record, sender=ForumComment)
+		self.addCleanup(post_init.disconnect, record, sender=ForumComment)
+
+		res, _ = self._get(f"/api/forum-comments/{root.id}/?max_depth=2")
+		self.assertEqual(loaded, {root.pk, reply.pk})
+		self.assertEqual(res.data["replies"][0]["reply_count"], 1)
+		self.assertEqual(res.data["replies"][0]["replies"], [])
+
+		loaded.clear()
+		res, _ = self._get(f"/api/forum-comments/{root.id}/replies/")
+		self.assertEqual(loaded, {root.pk, reply.pk, nested.pk})
+		self.assertEqual(res.data["results"][0]["replies"][0]["content"], "l2")
+
+
+@override_settings(JOB_QUEUE_EAGER=True)  # search vectors are refreshed by a job
+class TechniqueFullTextSearchTests(APITestCase):
+	def setUp(self):
+		self.match = Technique.objects.create(
+			title="Rooftop rainwater harvesting",
+			summary="Collect rainwater from roofs",
+			detailed_content="Gutters route rainwater into a storage tank.",
+			is_published=True,
+		)
+		Technique.objects.create(title="Drip irrigation", summary="Pipes", detailed_content="Emitters", is_published=True)
+		Technique.objects.create(title="Hidden rainwater draft", summary="s", detailed_content="d", is_published=False)
+
+	def test_q_returns_only_matching_published_techniques(self):
+		res = self.client.get("/api/techniques/?q=rainwater")
+		self.assertEqual(res.status_code, status.HTTP_200_OK)
+		self.assertEqual([item["id"] for item in res.data["results"]], [self.match.id])
+
+	@skipUnless(connection.vendor == "postgresql", "full-text ranking needs PostgreSQL")
+	def test_q_ranks_and_highlights(self):
+		Technique.objects.create(
+			title="Check dams", summary="Slow runoff", detailed_content="Also captures rainwater.", is_published=True,
+		)
+		res = self.client.get("/api/techniques/?q=rainwater")
+		results = res.data["results"]
+		self.assertEqual(results[0]["id"], self.match.id)  # title match outranks content match
+		self.assertGreaterEqual(results[0]["search_rank"], results[1]["search_rank"])
+		self.assertIn("<mark>", results[0]["snippet"])
+
+
+class AutocompleteTests(APITestCase):
+	def setUp(self):
+		Category.objects.create(name="Rainwater Harvesting")
+		Category.objects.create(name="Urban Rain Gardens")
+		Region.objects.create(name="Rajasthan")
+		ForumTag.objects.create(name="rain")
+		self.tech = Technique.objects.create(title="Rain barrels", summary="s", detailed_content="d", is_published=True)
+		Technique.objects.create(title="Rain draft", summary="s", detailed_content="d", is_published=False)
+
+	def test_matches_every_table(self):
+		res = self.client.get("/api/autocomplete/?q=rai")
+		self.assertEqual(res.status_code, status.HTTP_200_OK)
+		self.assertEqual([t["id"] for t in res.data["techniques"]], [self.tech.id])
+		self.assertEqual([c["name"] for c in res.data["categories"]], ["Rainwater Harvesting", "Urban Rain Gardens"])
+		self.assertEqual([r["name"] for r in res.data["regions"]], [])
+		self.assertEqual([t["name"] for t in res.data["tags"]], ["rain"])
+
+	def test_lookup_tables_served_from_memory_until_changed(self):
+		self.client.get("/api/autocomplete/?q=raj")
+		with self.assertNumQueries(0):
+			res = self.client.get("/api/autocomplete/?q=r")  # too short for technique titles
+		self.assertEqual([r["name"] for r in res.data["regions"]], ["Rajasthan"])
+
+		Region.objects.create(name="Rann of Kutch")
+		res = self.client.get("/api/autocomplete/?q=ran")
+		self.assertEqual([r["name"] for r in res.data["regions"]], ["Rann of Kutch"])
+
+	def test_invalidate_during_a_load_serves_the_loaded_copy(self):
+		index = autocomplete.lookup_indexes["regions"]
+		index.invalidate()
+		monotonic = autocomplete.time.monotonic
+		def invalidating_monotonic():
+			index.invalidate()  # a change signal arriving while the copy is loaded
+			return monotonic()
+		with mock.patch.object(autocomplete.time, "monotonic", invalidating_monotonic):
+			self.assertEqual([r["name"] for r in index.search("raj", 5)], ["Rajasthan"])
+		self.assertEqual([r["name"] for r in index.search("raj", 5)], ["Rajasthan"])
+
+	def test_technique_titles_cache_exact_queries(self):
+		self.client.get("/api/autocomplete/?q=rain b")
+		with self.assertNumQueries(0):
+			res = self.client.get("/api/autocomplete/?q=rain b")
+		self.assertEqual([t["title"] for t in res.data["techniques"]], ["Rain barrels"])
+
+	@skipUnless(connection.vendor == "postgresql", "trigram matching needs PostgreSQL")
+	def test_technique_titles_keep_trigram_matches_of_longer_queries(self):
+		self.client.get("/api/autocomplete/?q=ra")
+		res = self.client.get("/api/autocomplete/?q=rain barels")
+		self.assertEqual([t["title"] for t in res.data["techniques"]], ["Rain barrels"])
+
+
+class KeysetPaginationTests(APITestCase):
+	def setUp(self):
+		self.techniques = [
+			Technique.objects.create(title=f"Keyset {i}", summary="s", detailed_content="d", is_published=True)
+			for i in range(7)
+		]
+
+	def _walk(self, url):
+		ids = []
+		while url:
+			res = self.client.get(url)
+			self.assertEqual(res.status_code, status.HTTP_200_OK)
+			self.assertNotIn("count", res.data)
+			ids.extend(item["id"] for item in res.data["results"])
+			url = res.data["next"]
+		return ids
+
+	def test_walks_every_row_once_in_order(self):
+		expected = list(Technique.objects.order_by("-created_on", "-id").values_list("id", flat=True))
+		self.assertEqual(self._walk("/api/techniques/?pagination=cursor&page_size=3"), expected)
+
+	def test_inserts_do_not_shift_pages(self):
+		first = self.client.get("/api/techniques/?pagination=cursor&page_size=3")
+		Technique.objects.create(title="Newest", summary="s", detailed_content="d", is_published=True)
+		rest = self._walk(first.data["next"])
+		seen = [item["id"] for item in first.data["results"]] + rest
+		self.assertEqual(sorted(seen), sorted(t.id for t in self.techniques))
+
+	def test_previous_link_and_counts(self):
+		first = self.client.get("/api/techniques/?pagination=cursor&page_size=3&count=exact")
+		self.assertEqual(first.data["count"], 7)
+		second = self.client.get(first.data["next"])
+		back = self.client.get(second.data["previous"])
+		self.assertEqual(back.data["results"], first.data["results"])
+
+		res = self.client.get("/api/techniques/?pagination=cursor&count=approximate")
+		self.assertIn("count_is_approximate", res.data)
+
+	def test_invalid_cursor(self):
+		res = self.client.get("/api/techniques/?cursor=bogus")
+		self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+	def test_other_orderings_are_refused(self):
+		for query in ("ordering=updated_on", "q=keyset"):
+			res = self.client.get(f"/api/techniques/?pagination=cursor&{query}")
+			self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, query)
+		res = self.client.get("/api/techniques/?ordering=updated_on&page_size=3")
+		self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+	def test_cursor_bounds_the_leading_column(self):
+		# The OR chain alone gives the planner no range on created_on.
+		paginator = KeysetPagination(("-created_on", "-id"), 3)
+		last = self.techniques[3]
+		for reverse, bound in ((False, "<="), (True, ">=")):
+			beyond = Technique.objects.filter(paginator._beyond([last.created_on, last.pk], reverse))
+			self.assertIn(f'"created_on" {bound}', str(beyond.query))
+		expected = list(Technique.objects.order_by("-created_on", "-id").values_list("id", flat=True))
+		self.assertCountEqual(
+			Technique.objects.filter(paginator._beyond([last.created_on, last.pk], False)).values_list("id", flat=True),
+			expected[expected.index(last.pk) + 1:],
+		)
+
+
+class ResponseCacheTests(APITestCase):
+	def setUp(self):
+		caches[settings.RESPONSE_CACHE_ALIAS].clear()
+		self.category = Category.objects.create(name="Soil")
+		self.technique = Technique.objects.create(title="Mulch", summary="s", detailed_content="d", is_published=True)
+		self.technique.categories.add(self.category)
+
+	def test_etag_and_not_modified(self):
+		url = f"/api/techniques/{self.technique.id}/"
+		first = self.client.get(url)
+		self.assertEqual(first.status_code, status.HTTP_200_OK)
+		etag = first["ETag"]
+		with self.assertNumQueries(0):
+			res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+		self.assertEqual(res["ETag"], etag)
+
+	def test_changes_invalidate(self):
+		self.client.get("/api/techniques/")
+		with self.assertNumQueries(0):
+			self.client.get("/api/techniques/")
+
+		with self.captureOnCommitCallbacks(execute=True):
+			self.category.name = "Soil health"
+			self.category.save()
+			# Until the write commits, versions stay put: a reader could still see the old rows.
+			with self.assertNumQueries(0):
+				self.client.get("/api/techniques/")
+		res = self.client.get("/api/techniques/")
+		self.assertEqual(res.data["results"][0]["categories"][0]["name"], "Soil health")
+
+		with self.captureOnCommitCallbacks(execute=True):
+			self.technique.regions.add(Region.objects.create(name="Goa"))
+		res = self.client.get("/api/techniques/")
+		self.assertEqual(res.data["results"][0]["regions"][0]["name"], "Goa")
+
+	def test_authenticated_requests_bypass_cache(self):
+		staff = User.objects.create_user(
+			email="cache-staff@example.com", password="pass1234", username="cstaff", first_name="c", last_name="s", is_staff=True,
+		)
+		self.client.get("/api/techniques/")
+		self.client.force_authenticate(user=staff)
+		res = self.client.get("/api/techniques/")
+		self.assertNotIn("ETag", res)
+
+	def test_file_based_backend(self):
+		with tempfile.TemporaryDirectory() as location:
+			backend = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location}
+			with self.settings(CACHES={"default": backend, "responses": backend}):
+				etag = self.client.get("/api/categories/")["ETag"]
+				res = self.client.get("/api/categories/", HTTP_IF_NONE_MATCH=etag)
+				self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class SlugAllocationTests(APITestCase):
+	def test_sequential_suffixes(self):
+		slugs = [Technique.objects.create(title="Check Dam", summary="s", detailed_content="d").slug for _ in range(3)]
+		self.assertEqual(slugs, ["check-dam", "check-dam-1", "check-dam-2"])
+		ForumThread.objects.create(title="Check Dam", content="c", author=User.objects.create_user(
+			email="slug@example.com", password="pass1234", username="slug", first_name="s", last_name="l",
+		))
+		self.assertTrue(ForumThread.objects.filter(slug="check-dam").exists())
+
+	def test_bulk_allocation_is_one_query(self):
+		Technique.objects.create(title="Swale", summary="s", detailed_content="d")
+		Technique.objects.create(title="Swale", summary="s", detailed_content="d")
+		with self.assertNumQueries(1):
+			slugs = allocate_slugs(Technique, ["Swale", "Swale", "Bund", "swale-1"])
+		self.assertEqual(slugs, ["swale-2", "swale-3", "bund", "swale-1-1"])
+
+	def test_only_numbered_suffixes_are_read(self):
+		Technique.objects.create(title="Pond", summary="s", detailed_content="d")
+		Technique.objects.create(title="Pond liner", summary="s", detailed_content="d")
+		Technique.objects.create(title="Pond 2024", summary="s", detailed_content="d")
+		with CaptureQueriesContext(connection) as ctx:
+			self.assertEqual(allocate_slugs(Technique, ["Pond", "Pond"]), ["pond-1", "pond-2"])
+		# A prefix LIKE 'pond-%' would also read pond-liner and every other 'pond-...' slug.
+		self.assertNotIn("LIKE", ctx.captured_queries[0]["sql"].upper())
+
+	def test_free_base_with_numbered_siblings(self):
+		Technique.objects.create(title="Rain 2024", summary="s", detailed_content="d")
+		self.assertEqual(allocate_slugs(Technique, ["Rain", "Rain"]), ["rain", "rain-1"])
+
+	def test_long_titles_fit_the_column(self):
+		technique = Technique.objects.create(title="Very long title " * 10, summary="s", detailed_content="d")
+		self.assertLessEqual(len(technique.slug), Technique._meta.get_field("slug").max_length)
+
+	def test_retries_when_a_concurrent_insert_wins(self):
+		Technique.objects.create(title="Race", summary="s", detailed_content="d")
+		with mock.patch("jalwiki_app.slugs.allocate_slugs", side_effect=[["race"], ["race-1"]]):
+			technique = Technique.objects.create(title="Race", summary="s", detailed_content="d")
+		self.assertEqual(technique.slug, "race-1")
+
+	def test_api_create_uses_model_allocation(self):
+		user = User.objects.create_user(
+			email="creator@example.com", password="pass1234", username="creator", first_name="c", last_name="r",
+		)
+		Technique.objects.create(title="Percolation Pit", summary="s", detailed_content="d")
+		self.client.force_authenticate(user=user)
+		res = self.client.post("/api/techniques/", {"title": "Percolation Pit", "summary": "s", "detailed_content": "d"}, format="json")
+		self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(res.data["slug"], "percolation-pit-1")
+
+
+class TechniqueImportExportTests(APITestCase):
+	def _import(self, path, *args):
+		call_command("import_techniques", path, *args, "--chunk-size", "2", stdout=StringIO())
+
+	def test_jsonl_import_creates_techniques_names_and_links(self):
+		Category.objects.create(name="Agriculture")
+		records = [
+			{"title": "Contour trenches", "summary": "s", "detailed_content": "d", "is_published": True,
+			 "categories": ["Agriculture", "Soil"], "regions": ["Deccan"], "steps": ["Mark contours", "Dig"]},
+			{"title": "Contour trenches", "summary": "s2", "detailed_content": "d2", "categories": ["Soil"]},
+			{"title": "Farm ponds", "summary": "s", "detailed_content": "d", "impact": "high"},
+			{"title": "", "summary": "missing title", "detailed_content": "d"},
+		]
+		with tempfile.TemporaryDirectory() as directory:
+			path = f"{directory}/techniques.jsonl"
+			with open(path, "w") as handle:
+				handle.write("\n".join(json.dumps(record) for record in records))
+			self._import(path)
+
+		self.assertEqual(Technique.objects.count(), 3)
+		first = Technique.objects.get(slug="contour-trenches")
+		self.assertEqual(first.steps, ["Mark contours", "Dig"])
+		self.assertEqual(sorted(first.categories.values_list("name", flat=True)), ["Agriculture", "Soil"])
+		self.assertEqual(list(first.regions.values_list("name", flat=True)), ["Deccan"])
+		self.assertTrue(Technique.objects.filter(slug="contour-trenches-1").exists())
+		self.assertEqual(Category.objects.count(), 2)
+
+	def test_file_slugs_are_not_allocated_twice_and_bad_lines_are_invalid(self):
+		with tempfile.TemporaryDirectory() as directory:
+			path = f"{directory}/techniques.jsonl"
+			with open(path, "w") as handle:
+				handle.write("\n".join([
+					json.dumps({"title": "Swale", "summary": "s", "detailed_content": "d"}),
+					"{not json",
+					json.dumps({"title": "Other", "slug": "swale", "summary": "s", "detailed_content": "d"}),
+				]))
+			out = StringIO()
+			call_command("import_techniques", path, "--chunk-size", "3", stdout=out)
+		self.assertEqual(dict(Technique.objects.values_list("title", "slug")), {"Swale": "swale-1", "Other": "swale"})
+		self.assertIn("invalid 1", out.getvalue())
+
+	@skipUnless(connection.vendor == "postgresql", "COPY is PostgreSQL-only")
+	def test_copy_writes_json_fields(self):
+		technique = Technique.objects.create(title="Copied", summary="s", detailed_content="d")
+		variants = {"webp": [{"width": 320, "url": "a\tb.webp"}], "note": "line\nbreak \\ \"quoted\""}
+		(pk,) = bulk.reserve_ids(TechniqueImage, 1)
+		bulk.insert_rows(
+			TechniqueImage, ["id", "technique_id", "image", "variants", "caption", "order", "type", "updated_at"],
+			[(pk, technique.pk, "x.jpg", variants, "", 0, "other", timezone.now())], use_copy=True,
+		)
+		self.assertEqual(TechniqueImage.objects.get(pk=pk).variants, variants)
+
+	def test_csv_round_trip_and_update(self):
+		technique = Technique.objects.create(
+			title="Bunds", summary="s", detailed_content="d", benefits=["Less runoff", "More moisture"], is_published=True,
+		)
+		technique.regions.add(Region.objects.create(name="Vidarbha"))
+		with tempfile.TemporaryDirectory() as directory:
+			path = f"{directory}/techniques.csv"
+			call_command("export_techniques", path, stdout=StringIO())
+			Technique.objects.filter(pk=technique.pk).update(summary="changed")
+			self._import(path, "--update-existing")
+
+		technique.refresh_from_db()
+		self.assertEqual(Technique.objects.count(), 1)
+		self.assertEqual(technique.summary, "s")
+		self.assertEqual(technique.benefits, ["Less runoff", "More moisture"])
+		self.assertEqual(list(technique.regions.values_list("name", flat=True)), ["Vidarbha"])
+
+
+class QueryBudgetMixin:
+	"""Pins the number of queries a request may run, so N+1 regressions fail loudly."""
+
+	def assertQueryBudget(self, url, budget, client=None, **extra):
+		client = client or self.client
+		with CaptureQueriesContext(connection) as ctx:
+			res = client.get(url, **extra)
+		self.assertEqual(res.status_code, status.HTTP_200_OK, url)
+		if len(ctx) > budget:
+			statements = "\n".join(query["sql"] for query in ctx.captured_queries)
+			self.fail(f"{url} ran {len(ctx)} queries, budget is {budget}:\n{statements}")
+		return res
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class RouterQueryBudgetTests(QueryBudgetMixin, APITestCase):
+	# Budgets for GET on every router endpoint (list, then detail), with several
+	# rows per table so per-row queries would exceed them.
+	QUERY_BUDGETS = {
+		"users": (2, 1),
+		"techniques": (5, 6),
+		"categories": (2, 1),
+		"regions": (2, 1),
+		"forum-tags": (2, 1),
+		"forum-threads": (5, 4),
+		"forum-comments": (5, 4),
+	}
+
+	def setUp(self):
+		self.user = User.objects.create_user(
+			email="budget@example.com", password="pass1234", username="budget", first_name="b", last_name="u",
+		)
+		self.client.force_authenticate(user=self.user)
+		tags = [ForumTag.objects.create(name=f"tag{i}") for i in range(3)]
+		categories = [Category.objects.create(name=f"Cat {i}") for i in range(3)]
+		regions = [Region.objects.create(name=f"Region {i}") for i in range(3)]
+		self.details = {"users": self.user.pk, "categories": categories[0].pk, "regions": regions[0].pk, "forum-tags": tags[0].pk}
+		for i in range(5):
+			technique = Technique.objects.create(
+				title=f"Budget {i}", summary="s", detailed_content="d", is_published=True, added_by=self.user,
+			)
+			technique.categories.add(*categories)
+			technique.regions.add(*regions)
+			technique.likes.add(self.user)
+			thread = ForumThread.objects.create(title=f"Budget {i}", content="c", author=self.user)
+			thread.tags.add(*tags)
+			thread.upvoted_by.add(self.user)
+			comment = ForumComment.objects.create(thread=thread, author=self.user, content="c")
+			reply = ForumComment.objects.create(thread=thread, author=self.user, content="r", parent_comment=comment)
+			ForumComment.objects.create(thread=thread, author=self.user, content="rr", parent_comment=reply)
+		self.details.update({"techniques": technique.pk, "forum-threads": thread.slug, "forum-comments": comment.pk})
+
+	def test_every_router_endpoint_has_a_budget(self):
+		prefixes = {prefix for prefix, _, _ in router.registry}
+		self.assertEqual(prefixes, set(self.QUERY_BUDGETS))
+
+	def test_endpoints_stay_within_budget(self):
+		for prefix, (list_budget, detail_budget) in self.QUERY_BUDGETS.items():
+			with self.subTest(prefix=prefix):
+				self.assertQueryBudget(f"/api/{prefix}/", list_budget)
+				self.assertQueryBudget(f"/api/{prefix}/{self.details[prefix]}/", detail_budget)
+
+
+class QueryInstrumentationMiddlewareTests(APITestCase):
+	def test_server_timing_header_and_log_line(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			Category.objects.create(name="Logged")
+		with self.assertLogs("jalwiki.sql", level="INFO") as logs:
+			res = self.client.get("/api/categories/")
+		self.assertRegex(res["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+$')
+		entry = json.loads(logs.records[-1].getMessage())
+		self.assertEqual(entry["path"], "/api/categories/")
+		self.assertGreaterEqual(entry["queries"], 1)
+		self.assertLessEqual(len(entry["slowest"]), settings.SQL_INSTRUMENTATION_SLOWEST)
+
+
+class BenchmarkCommandTests(APITestCase):
+	SIZES = ["--users", "6", "--techniques", "8", "--threads", "3", "--comments", "40", "--likes", "20",
+		"--upvotes", "30", "--batch-size", "7"]
+
+	def _seed(self, *args):
+		call_command("seed_benchmark", *self.SIZES, *args, stdout=StringIO())
+
+	def test_seed_is_deterministic_and_counters_match(self):
+		self._seed("--seed", "3")
+		first = list(Technique.objects.order_by("id").values_list("title", "summary", "likes_count"))
+		self._seed("--seed", "3", "--reset")
+		self.assertEqual(list(Technique.objects.order_by("id").values_list("title", "summary", "likes_count")), first)
+		self.assertEqual(User.objects.count(), 6)
+		self.assertEqual(ForumComment.objects.count(), sum(ForumThread.objects.values_list("comment_count", flat=True)))
+		self.assertTrue(ForumComment.objects.filter(parent_comment__parent_comment__isnull=False).exists())
+		self.assertEqual(sum(Technique.objects.values_list("likes_count", flat=True)), Technique.likes.through.objects.count())
+
+	def test_bench_api_reports_every_route(self):
+		self._seed()
+		out = StringIO()
+		call_command("bench_api", "--iterations", "2", "--warmup", "0", stdout=out)
+		report = json.loads(out.getvalue())
+		paths = {route["path"] for route in report["routes"]}
+		self.assertIn("/api/techniques/", paths)
+		self.assertIn("/api/sync/", paths)
+		self.assertIn("/api/async/techniques/", paths)
+		self.assertTrue(any(path.endswith("/thread-comments/") for path in paths))
+		details = next(route for route in report["routes"] if route["path"] == "/api/users/get_user_details/")
+		self.assertEqual((details["status"], details["authenticated"]), (200, True))
+		self.assertEqual(next(route for route in report["routes"] if route["path"] == "/api/sync/")["status"], 200)
+		techniques = next(route for route in report["routes"] if route["path"] == "/api/techniques/")
+		self.assertEqual(techniques["status"], 200)
+		self.assertLessEqual(techniques["p50_ms"], techniques["p99_ms"])
+		self.assertGreaterEqual(techniques["max_queries"], 1)
+
+
+def png_upload(name="photo.png", size=(40, 30)):
+	from PIL import Image
+
+	buffer = BytesIO()
+	Image.new("RGBA", size, (20, 120, 200, 255)).save(buffer, "PNG")
+	return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class ImageVariantTests(APITestCase):
+	def setUp(self):
+		media = tempfile.TemporaryDirectory()
+		self.addCleanup(media.cleanup)
+		overrides = override_settings(MEDIA_ROOT=media.name, JOB_QUEUE_EAGER=True, IMAGE_VARIANT_WIDTHS=[16, 32, 64])
+		overrides.enable()
+		self.addCleanup(overrides.disable)
+		self.user = User.objects.create_user(
+			email="pics@example.com", password="pass1234", username="pics", first_name="p", last_name="x",
+		)
+		self.client.force_authenticate(user=self.user)
+		self.technique = Technique.objects.create(title="Pictured", summary="s", detailed_content="d", is_published=True)
+
+	def test_profile_picture_variants_are_built_after_commit(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			res = self.client.post("/api/users/update_profile_picture/", {"profile_pic": png_upload()}, format="multipart")
+		self.assertEqual(res.status_code, 200)
+		self.user.refresh_from_db()
+		variants = self.user.profile_pic_variants
+		self.assertEqual(variants["source"], self.user.profile_pic.name)
+		# Never upscaled past the 40px original.
+		self.assertEqual(sorted(variants["webp"]), ["16", "32"])
+		thread = ForumThread.objects.create(title="Pics", content="c", author=self.user)
+		author = self.client.get(f"/api/forum-threads/{thread.slug}/").data["author"]
+		self.assertRegex(author["profile_pic_srcset"]["jpeg"], r"^http://testserver/media/profiles/variants/\S+-16\.jpg 16w, \S+ 32w$")
+
+	def test_gallery_image_srcset_and_backfill(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			res = self.client.post(f"/api/techniques/{self.technique.pk}/add_image/", {"image": png_upload()}, format="multipart")
+		self.assertEqual(res.status_code, 201)
+		images = self.client.get(f"/api/techniques/{self.technique.pk}/get_images/").data
+		self.assertIn("32w", images[0]["srcset"]["webp"])
+
+		TechniqueImage.objects.update(variants={})
+		call_command("backfill_image_variants", stdout=StringIO())
+		self.assertEqual(set(TechniqueImage.objects.get().variants), {"source", "webp", "jpeg"})
+
+	def test_listing_exposes_main_image_srcset(self):
+		self.technique.main_image = png_upload("main.png", size=(80, 40))
+		with self.captureOnCommitCallbacks(execute=True):
+			self.technique.save()
+		item = self.client.get("/api/techniques/").data["results"][0]
+		self.assertEqual(item["main_image_srcset"]["webp"].count("w,"), 2)
+
+
+def flaky_job(calls, fail_times):
+	calls.append(len(calls))
+	if len(calls) <= fail_times:
+		raise RuntimeError("boom")
+
+
+class JobQueueTests(APITestCase):
+	def setUp(self):
+		self.calls = []
+		registry = mock.patch.dict(jobs._registry, {"tests.flaky": lambda fail_times=0: flaky_job(self.calls, fail_times)})
+		registry.start()
+		self.addCleanup(registry.stop)
+
+	def test_dedupe_key_and_claiming(self):
+		first = jobs.enqueue("tests.flaky", dedupe_key="same")
+		self.assertEqual(jobs.enqueue("tests.flaky", dedupe_key="same").pk, first.pk)
+		jobs.enqueue("tests.flaky", delay=60)
+		self.assertEqual(Job.objects.count(), 2)
+
+		claimed = jobs.claim("w1", 10)
+		self.assertEqual([job.pk for job in claimed], [first.pk])
+		self.assertEqual(claimed[0].attempts, 1)
+		self.assertEqual(jobs.claim("w2", 10), [])
+		# Once the first job left the queue its key is free again.
+		self.assertNotEqual(jobs.enqueue("tests.flaky", dedupe_key="same").pk, first.pk)
+
+	def test_failures_are_retried_with_backoff_then_marked_failed(self):
+		job = jobs.enqueue("tests.flaky", {"fail_times": 5}, max_attempts=2)
+		with self.assertLogs("jalwiki.jobs", level="WARNING"):
+			self.assertFalse(jobs.run(jobs.claim("w", 1)[0]))
+		job.refresh_from_db()
+		self.assertEqual(job.status, Job.Status.QUEUED)
+		self.assertGreater(job.run_at, job.created_at)
+		self.assertIn("boom", job.last_error)
+
+		Job.objects.update(run_at=job.created_at)
+		with self.assertLogs("jalwiki.jobs", level="ERROR"):
+			self.assertFalse(jobs.run(jobs.claim("w", 1)[0]))
+		job.refresh_from_db()
+		self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+		self.assertEqual(jobs.metrics()["depth"], {"failed": {"tests.flaky": 1}})
+
+	def test_requeue_defers_to_a_queued_duplicate(self):
+		failing = jobs.enqueue("tests.flaky", {"fail_times": 5}, dedupe_key="same")
+		stale = jobs.enqueue("tests.flaky", dedupe_key="other")
+		lonely = jobs.enqueue("tests.flaky", dedupe_key="lonely")
+		claimed = {job.pk: job for job in jobs.claim("w", 3)}
+		# Saves while they ran queued the same work again.
+		twin = jobs.enqueue("tests.flaky", dedupe_key="same")
+		jobs.enqueue("tests.flaky", dedupe_key="other", delay=60)
+		with self.assertLogs("jalwiki.jobs", level="WARNING"):
+			self.assertFalse(jobs.run(claimed[failing.pk]))
+		Job.objects.filter(pk__in=[stale.pk, lonely.pk]).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+		self.assertEqual(jobs.requeue_stale(60), 1)
+
+		statuses = dict(Job.objects.values_list("pk", "status"))
+		self.assertEqual(
+			[statuses[job.pk] for job in (failing, stale, twin, lonely)],
+			[Job.Status.DONE, Job.Status.DONE, Job.Status.QUEUED, Job.Status.QUEUED],
+		)
+		self.assertIn("boom", Job.objects.get(pk=failing.pk).last_error)
+
+	def test_only_silent_jobs_are_stale_and_a_lost_claim_cannot_finish(self):
+		job = jobs.enqueue("tests.flaky")
+		(first,) = jobs.claim("w1", 1)
+		Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=1))
+		self.assertEqual(jobs.requeue_stale(60), 0)  # long-running, but its heartbeat is recent
+
+		Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+		self.assertEqual(jobs.requeue_stale(60), 1)
+		(second,) = jobs.claim("w1", 1)
+		with self.assertLogs("jalwiki.jobs", level="WARNING"):
+			self.assertTrue(jobs.run(first))
+		job.refresh_from_db()
+		self.assertEqual((job.status, job.attempts), (Job.Status.RUNNING, 2))
+		self.assertTrue(jobs.run(second))
+		job.refresh_from_db()
+		self.assertEqual(job.status, Job.Status.DONE)
+
+	def test_successful_runs_feed_latency_metrics(self):
+		jobs.enqueue("tests.flaky")
+		self.assertTrue(jobs.run(jobs.claim("w", 1)[0]))
+		self.assertEqual(self.calls, [0])
+		stats = jobs.metrics()
+		self.assertEqual(stats["depth"], {"done": {"tests.flaky": 1}})
+		self.assertEqual(stats["latency"]["tests.flaky"]["count"], 1)
+
+	@override_settings(JOB_QUEUE_EAGER=True)
+	def test_eager_mode_runs_inline(self):
+		self.assertIsNone(jobs.enqueue("tests.flaky"))
+		self.assertEqual(self.calls, [0])
+		self.assertFalse(Job.objects.exists())
+
+
+class RunWorkersCommandTests(TransactionTestCase):
+	def test_once_drains_due_jobs_on_threads(self):
+		with mock.patch.dict(jobs._registry, {"tests.create": lambda name: Category.objects.create(name=name)}):
+			for i in range(3):
+				jobs.enqueue("tests.create", {"name": f"Worker {i}"})
+			call_command("run_workers", "--once", "--threads", "2", "--stats-interval", "0", stdout=StringIO())
+		self.assertEqual(Category.objects.filter(name__startswith="Worker").count(), 3)
+		self.assertEqual(set(Job.objects.values_list("status", flat=True)), {Job.Status.DONE})
+
+	@override_settings(JOB_HEARTBEAT_INTERVAL=0.05)
+	def test_running_jobs_beat(self):
+		with mock.patch.dict(jobs._registry, {"tests.sleep": lambda: time.sleep(0.5)}):
+			jobs.enqueue("tests.sleep")
+			(job,) = jobs.claim("w", 1)
+			self.assertTrue(jobs.run(job))
+		job.refresh_from_db()
+		self.assertGreater(job.heartbeat_at, job.started_at)
+
+	def test_worker_survives_a_failure_to_record_an_outcome(self):
+		with mock.patch.object(jobs, "run", side_effect=DatabaseError("connection lost")):
+			jobs.enqueue("counters.reconcile")
+			with self.assertLogs("jalwiki.jobs", level="ERROR"):
+				out = StringIO()
+				call_command("run_workers", "--once", "--stats-interval", "0", stdout=out)
+		self.assertIn("1 failed", out.getvalue())
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class AsyncEndpointTests(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(
+			email="async@example.com", password="pass1234", username="async", first_name="a", last_name="s",
+		)
+		self.auth = {"headers": {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}}
+		category = Category.objects.create(name="Async")
+		for i in range(3):
+			technique = Technique.objects.create(title=f"Async {i}", summary="s", detailed_content="d", is_published=True)
+			technique.categories.add(category)
+		technique.likes.add(self.user)
+		self.technique = technique
+		self.thread = ForumThread.objects.create(title="Async thread", content="c", author=self.user)
+		root = ForumComment.objects.create(thread=self.thread, author=self.user, content="root")
+		self.comment = ForumComment.objects.create(thread=self.thread, author=self.user, content="reply", parent_comment=root)
+
+	def _async(self, method, url, **extra):
+		return async_to_sync(getattr(self.async_client, method))(url, **extra)
+
+	def assertSameResponse(self, path, **extra):
+		sync = self.client.get(f"/api/{path}", **extra)
+		asynchronous = self._async("get", f"/api/async/{path}", **extra)
+		self.assertEqual(asynchronous.status_code, sync.status_code, path)
+		self.assertEqual(
+			asynchronous.content.decode().replace("/api/async/", "/api/"), sync.content.decode(), path,
+		)
+		return asynchronous
+
+	def test_reads_match_the_sync_routes(self):
+		for extra in ({}, self.auth):
+			for path in (
+				"techniques/", "techniques/?page_size=2&page=2", "techniques/?pagination=cursor&page_size=2",
+				f"techniques/{self.technique.pk}/", "techniques/999999/", "forum-threads/",
+				f"forum-threads/{self.thread.slug}/thread-comments/",
+			):
+				with self.subTest(path=path, authenticated=bool(extra)):
+					self.assertSameResponse(path, **extra)
+
+	def test_toggles_match_the_sync_routes(self):
+		self.assertEqual(self._async("post", f"/api/async/techniques/{self.technique.pk}/toggle_like/").status_code, 401)
+		toggle = f"techniques/{self.technique.pk}/toggle_like/"
+		res = self._async("post", f"/api/async/{toggle}", **self.auth)
+		self.assertEqual(json.loads(res.content), {"liked": False, "likes_count": 0})
+		self.assertEqual(self.client.post(f"/api/{toggle}", **self.auth).data, {"liked": True, "likes_count": 1})
+		self.assertEqual(json.loads(self._async("post", f"/api/async/{toggle}", **self.auth).content), {"liked": False, "likes_count": 0})
+
+		res = self._async("post", f"/api/async/forum-threads/{self.thread.slug}/upvote/", **self.auth)
+		self.assertEqual(json.loads(res.content), {"status": "vote processed", "upvoted": True, "count": 1})
+		res = self._async("post", f"/api/async/forum-comments/{self.comment.pk}/upvote/", **self.auth)
+		self.assertEqual(json.loads(res.content)["count"], 1)
+		self.assertEqual(self._async("get", f"/api/async/forum-comments/{self.comment.pk}/upvote/", **self.auth).status_code, 405)
+
+
+class SparseFieldsetTests(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(
+			email="sparse@example.com", password="pass1234", username="sparse", first_name="s", last_name="p",
+		)
+		self.category = Category.objects.create(name="Storage")
+		self.technique = Technique.objects.create(
+			title="Tanka", summary="s", detailed_content="long text", is_published=True, added_by=self.user,
+		)
+		self.technique.categories.add(self.category)
+		self.technique.likes.add(self.user)
+		self.thread = ForumThread.objects.create(title="Tanks", content="c", author=self.user)
+		ForumComment.objects.create(thread=self.thread, author=self.user, content="first")
+
+	def _get(self, url):
+		with CaptureQueriesContext(connection) as ctx:
+			res = self.client.get(url)
+		self.assertEqual(res.status_code, status.HTTP_200_OK, res.content)
+		return res, ctx.captured_queries
+
+	@override_settings(TECHNIQUE_DOCUMENTS_ENABLED=False)  # compare with the serializer path
+	def test_fields_limit_payload_and_queries(self):
+		_, full_queries = self._get("/api/techniques/")
+		res, queries = self._get("/api/techniques/?fields=id,title")
+		self.assertEqual(res.data["results"], [{"id": self.technique.id, "title": "Tanka"}])
+		self.assertLess(len(queries), len(full_queries))
+		self.assertFalse(any("detailed_content" in query["sql"] for query in queries))
+
+	def test_relations_collapse_to_ids_unless_expanded(self):
+		url = f"/api/techniques/{self.technique.id}/?fields=id,categories,likes_count,added_by"
+		res, _ = self._get(url)
+		self.assertEqual(res.data, {"id": self.technique.id, "categories": [self.category.id], "likes_count": 1,
+			"added_by": self.user.id})
+		res, _ = self._get(f"{url}&expand=categories")
+		self.assertEqual(res.data["categories"], [{"id": self.category.id, "name": "Storage", "description": None}])
+
+		res, _ = self._get("/api/forum-threads/?fields=slug,author,tags")
+		self.assertEqual(res.data["results"], [{"slug": self.thread.slug, "author": self.user.id, "tags": []}])
+		res, _ = self._get(f"/api/forum-threads/{self.thread.slug}/thread-comments/?fields=content,author&expand=author")
+		self.assertEqual(res.data[0]["content"], "first")
+		self.assertEqual(res.data[0]["author"]["username"], "sparse")
+
+	def test_unknown_fields_are_rejected_and_writes_ignore_fields(self):
+		self.assertEqual(self.client.get("/api/techniques/?fields=id,nope").status_code, status.HTTP_400_BAD_REQUEST)
+		self.client.force_authenticate(user=self.user)
+		res = self.client.post("/api/forum-threads/?fields=id", {"title": "New", "content": "c"}, format="json")
+		self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+		self.assertIn("content", res.data)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False, JOB_QUEUE_EAGER=True)
+class TechniqueDocumentTests(APITestCase):
+	def setUp(self):
+		media = tempfile.TemporaryDirectory()
+		self.addCleanup(media.cleanup)
+		overrides = override_settings(MEDIA_ROOT=media.name, IMAGE_VARIANT_WIDTHS=[16])
+		overrides.enable()
+		self.addCleanup(overrides.disable)
+		self.user = User.objects.create_user(
+			email="doc@example.com", password="pass1234", username="doc", first_name="d", last_name="c",
+		)
+		self.category = Category.objects.create(name="Harvesting")
+		self.technique = Technique.objects.create(
+			title="Check dam", summary="s", detailed_content="d", is_published=True, added_by=self.user,
+			main_image=png_upload(), steps=["dig", "line"],
+		)
+		self.technique.categories.add(self.category)
+		self.technique.likes.add(self.user)
+		TechniqueImage.objects.create(technique=self.technique, image=png_upload("step.png"), caption="Step")
+		self.client.force_authenticate(user=self.user)
+
+	def assertMatchesLive(self, url):
+		with CaptureQueriesContext(connection) as ctx:
+			stored = self.client.get(url)
+		with override_settings(TECHNIQUE_DOCUMENTS_ENABLED=False), CaptureQueriesContext(connection) as live_ctx:
+			live = self.client.get(url)
+		self.assertEqual(json.loads(stored.content), json.loads(live.content))
+		self.assertEqual(list(stored.data), list(live.data))
+		self.assertLess(len(ctx.captured_queries), len(live_ctx.captured_queries))
+		return stored.data
+
+	def test_responses_match_the_serializers(self):
+		data = self.assertMatchesLive(f"/api/techniques/{self.technique.pk}/")
+		self.assertEqual((data["likes_count"], data["is_liked_by_user"]), (1, True))
+		self.assertNotIn("likes", data)
+		with override_settings(VOTER_ARRAYS_COMPAT=True):
+			data = self.assertMatchesLive(f"/api/techniques/{self.technique.pk}/")
+		self.assertEqual(data["likes"], [self.user.pk])
+		self.assertTrue(data["images"][0]["image"].startswith("http://testserver/"))
+		self.assertTrue(data["images"][0]["srcset"]["webp"].startswith("http://testserver/"))
+		data = self.assertMatchesLive("/api/techniques/")
+		self.assertTrue(data["results"][0]["main_image_srcset"]["jpeg"].startswith("http://testserver/"))
+		self.assertMatchesLive("/api/techniques/?pagination=cursor")
+
+	def test_changes_rebuild_documents(self):
+		self.category.name = "Rain harvesting"
+		self.category.save()
+		self.assertEqual(self.technique.document.summary["categories"][0]["name"], "Rain harvesting")
+		self.user.username = "renamed"
+		self.user.save()
+		self.technique.document.refresh_from_db()
+		self.assertEqual(self.technique.document.detail["added_by_username"], "renamed")
+
+		Technique.objects.filter(pk=self.technique.pk).update(is_published=False)
+		self.technique.refresh_from_db()
+		self.technique.save()
+		self.assertFalse(TechniqueDocument.objects.exists())
+
+	def test_check_command_reports_and_fixes_drift(self):
+		out = StringIO()
+		call_command("check_technique_documents", stdout=out)
+		self.assertIn("0 stale", out.getvalue())
+		TechniqueDocument.objects.update(summary={"title": "Old"})
+		with self.assertRaises(CommandError):
+			call_command("check_technique_documents", stdout=StringIO())
+		call_command("check_technique_documents", "--fix", stdout=StringIO())
+		call_command("check_technique_documents", stdout=StringIO())
+
+
+@override_settings(JOB_QUEUE_EAGER=True)
+class RelatedTechniqueTests(APITestCase):
+	def setUp(self):
+		self.storage = Category.objects.create(name="Storage")
+		self.farming = Category.objects.create(name="Farming")
+		self.tank = self._technique("Rooftop rainwater tank", "Collect rooftop rainwater in a tank.", self.storage)
+		self.barrel = self._technique("Rain barrel", "A barrel stores rooftop rainwater for gardens.", self.storage)
+		self.drip = self._technique("Drip irrigation", "Pipes deliver drops to plant roots.", self.farming)
+		self.draft = self._technique("Rooftop rainwater tank v2", "Collect rooftop rainwater in a tank.", self.storage,
+			is_published=False)
+
+	def _technique(self, title, summary, category, is_published=True):
+		technique = Technique.objects.create(title=title, summary=summary, detailed_content="d", is_published=is_published)
+		technique.categories.add(category)
+		return technique
+
+	def _related(self, technique):
+		res = self.client.get(f"/api/techniques/{technique.pk}/get_related/")
+		self.assertEqual(res.status_code, status.HTTP_200_OK)
+		return [item["id"] for item in res.data]
+
+	def test_ranked_published_neighbours(self):
+		self.assertEqual(self._related(self.tank), [self.barrel.pk])
+		with CaptureQueriesContext(connection) as ctx:
+			self._related(self.barrel)
+		self.assertLessEqual(len(ctx.captured_queries), 2)
+
+	def test_changes_refresh_the_index(self):
+		self.drip.summary = "Drip lines fed from a rooftop rainwater tank."
+		self.drip.save()
+		self.assertEqual(self._related(self.tank), [self.barrel.pk, self.drip.pk])
+		self.assertIn(self.tank.pk, self._related(self.drip))
+
+		self.barrel.is_published = False
+		self.barrel.save()
+		self.assertEqual(self._related(self.tank), [self.drip.pk])
+		self.barrel.delete()
+		self.drip.delete()
+		self.assertEqual(self._related(self.tank), [])
+
+	def test_build_command_matches_incremental_index(self):
+		incremental = list(RelatedTechnique.objects.values_list("technique", "related", "rank"))
+		call_command("build_related_index", stdout=StringIO())
+		self.assertEqual(list(RelatedTechnique.objects.values_list("technique", "related", "rank")), incremental)
+
+	def test_refresh_scores_against_the_stored_vectors(self):
+		fan = User.objects.create_user(
+			email="fan@example.com", password="pass1234", username="fan", first_name="f", last_name="n",
+		)
+		self.tank.likes.add(fan)
+		self.drip.likes.add(fan)
+		related.rebuild()
+		self.assertTrue(RelatedTerm.objects.filter(term="rainwater").exists())
+		with mock.patch.object(related, "Corpus", side_effect=AssertionError("refresh built a corpus")), \
+				self.assertNoLogs("jalwiki_app.jobs", "ERROR"):
+			self.drip.categories.add(self.storage)
+			self.barrel.summary = "A barrel stores rooftop rainwater."
+			self.barrel.save()
+		incremental = list(RelatedTechnique.objects.values_list("technique", "related", "rank", "score"))
+		related.rebuild()
+		rebuilt = list(RelatedTechnique.objects.values_list("technique", "related", "rank", "score"))
+		self.assertEqual([row[:3] for row in incremental], [row[:3] for row in rebuilt])
+		for (*_, score), (*_, expected) in zip(incremental, rebuilt):
+			self.assertAlmostEqual(score, expected, places=5)
+
+
+class HotThreadTests(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(
+			email="hot@example.com", password="pass1234", username="hot", first_name="h", last_name="t",
+		)
+		self.old = ForumThread.objects.create(title="Old well", content="c", author=self.user)
+		self.busy = ForumThread.objects.create(title="Busy pond", content="c", author=self.user)
+		self.new = ForumThread.objects.create(title="New tank", content="c", author=self.user)
+		now = timezone.now()
+		ForumThread.objects.filter(pk=self.old.pk).update(created_at=now - timedelta(hours=48))
+		ForumThread.objects.filter(pk=self.busy.pk).update(created_at=now - timedelta(hours=2))
+		hotness.decay()
+
+	def _score(self, thread):
+		thread.refresh_from_db()
+		return thread.hot_score
+
+	def test_votes_and_comments_rescore_the_thread(self):
+		self.client.force_authenticate(user=self.user)
+		before = self._score(self.busy)
+		self.client.post(f"/api/forum-threads/{self.busy.slug}/upvote/")
+		after_vote = self._score(self.busy)
+		self.assertGreater(after_vote, before)
+		comment = ForumComment.objects.create(thread=self.busy, author=self.user, content="Same here")
+		self.assertGreater(self._score(self.busy), after_vote)
+		comment.delete()
+		self.assertAlmostEqual(self._score(self.busy), after_vote, places=3)
+
+	def test_ordering_hot_pages_in_score_order(self):
+		for _ in range(3):
+			ForumComment.objects.create(thread=self.busy, author=self.user, content="c")
+		expected = [self.busy.pk, self.new.pk, self.old.pk]
+		res = self.client.get("/api/forum-threads/", {"ordering": "hot"})
+		self.assertEqual([item["id"] for item in res.data["results"]], expected)
+
+		seen, params = [], {"ordering": "hot", "pagination": "cursor", "page_size": 1}
+		while True:
+			res = self.client.get("/api/forum-threads/", params)
+			seen += [item["id"] for item in res.data["results"]]
+			if not res.data["next"]:
+				break
+			params = {"ordering": "hot", "page_size": 1, "cursor": res.data["next"].split("cursor=")[1].split("&")[0]}
+		self.assertEqual(seen, expected)
+
+	def test_decay_job_ages_scores(self):
+		fresh = self._score(self.new)
+		ForumThread.objects.filter(pk=self.new.pk).update(created_at=timezone.now() - timedelta(hours=12))
+		with override_settings(JOB_QUEUE_EAGER=True):
+			jobs.enqueue("forum.decay_hot_scores")
+		self.assertLess(self._score(self.new), fresh)
+		ForumThread.objects.filter(pk=self.new.pk).update(
+			created_at=timezone.now() - timedelta(days=settings.FORUM_HOT_WINDOW_DAYS + 1),
+		)
+		hotness.decay()
+		self.assertEqual(self._score(self.new), 0)
+
+
+class ExplainEndpointsTests(APITestCase):
+	def test_plan_issues_flags_large_scans_and_sorts(self):
+		plan = {
+			"Node Type": "Limit",
+			"Plans": [{
+				"Node Type": "Sort", "Sort Key": ["created_on DESC"], "Sort Method": "top-N heapsort",
+				"Sort Space Type": "Memory",
+				"Plans": [{"Node Type": "Seq Scan", "Relation Name": "jalwiki_app_technique", "Actual Rows": 50000, "Actual Loops": 1}],
+			}, {
+				"Node Type": "Seq Scan", "Relation Name": "jalwiki_app_category", "Actual Rows": 10, "Actual Loops": 1,
+			}],
+		}
+		sizes = {"jalwiki_app_technique": 50000, "jalwiki_app_category": 10}
+		issues = explain_endpoints.plan_issues(plan, sizes, min_rows=1000)
+		self.assertEqual(sorted(issue["type"] for issue in issues), ["seq_scan", "sort"])
+		self.assertEqual(explain_endpoints.plan_issues(plan, sizes, min_rows=100000), [])
+
+	@skipUnless(connection.vendor != "postgresql", "checks the non-PostgreSQL error")
+	def test_requires_postgresql(self):
+		with self.assertRaises(CommandError):
+			call_command("explain_endpoints", stdout=StringIO())
+
+	@skipUnless(connection.vendor == "postgresql", "EXPLAIN ANALYZE needs PostgreSQL")
+	def test_report_is_json(self):
+		Technique.objects.create(title="Drip", summary="s", detailed_content="d", is_published=True)
+		out = StringIO()
+		call_command("explain_endpoints", "--path", "techniques/", stdout=out)
+		report = json.loads(out.getvalue())
+		self.assertEqual(report["routes"][0]["status"], 200)
+		self.assertTrue(report["routes"][0]["queries"])
+
+
+class ClaimsAuthenticationTests(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(
+			email="claims@example.com", password="pass1234", username="claims", first_name="c", last_name="l",
+		)
+		user_cache.clear()
+
+	def _queries(self, token, path="/api/forum-threads/"):
+		client = APIClient(HTTP_AUTHORIZATION=f"Bearer {token}")
+		with CaptureQueriesContext(connection) as ctx:
+			res = client.get(path)
+		self.assertEqual(res.status_code, status.HTTP_200_OK)
+		return len(ctx.captured_queries)
+
+	def test_login_token_skips_the_user_lookup(self):
+		res = self.client.post("/api/users/login/", {"email": "claims@example.com", "password": "pass1234"}, format="json")
+		access = res.data["tokens"]["access"]
+		plain = RefreshToken.for_user(self.user).access_token
+		self.assertEqual(self._queries(access), self._queries(plain) - 1)
+
+	def test_full_user_is_loaded_once_and_invalidated_on_save(self):
+		client = APIClient(HTTP_AUTHORIZATION=f"Bearer {ClaimsRefreshToken.for_user(self.user).access_token}")
+		res = client.post("/api/forum-threads/", {"title": "Wells", "content": "c"}, format="json")
+		self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(ForumThread.objects.get().author, self.user)
+		with self.assertNumQueries(0):
+			self.assertEqual(user_cache.get(self.user.pk).username, "claims")
+		self.user.username = "renamed"
+		self.user.save()
+		self.assertEqual(user_cache.get(self.user.pk).username, "renamed")
+
+	def test_inactive_claim_is_rejected(self):
+		self.user.is_active = False
+		token = ClaimsRefreshToken.for_user(self.user).access_token
+		res = APIClient(HTTP_AUTHORIZATION=f"Bearer {token}").get("/api/users/get_user_details/")
+		self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+	def test_refresh_reissues_current_claims(self):
+		self.user.is_staff = True
+		self.user.save()
+		Technique.objects.create(title="Draft", summary="s", detailed_content="d", is_published=False)
+		res = self.client.post("/api/users/login/", {"email": "claims@example.com", "password": "pass1234"}, format="json")
+		refresh = res.data["tokens"]["refresh"]
+		self.assertNotIn("is_staff", ClaimsRefreshToken(refresh).payload)
+		staff = APIClient(HTTP_AUTHORIZATION=f"Bearer {res.data['tokens']['access']}")
+		self.assertEqual(len(staff.get("/api/techniques/").data["results"]), 1)
+
+		self.user.is_staff = False
+		self.user.save()
+		res = self.client.post("/api/token/refresh/", {"refresh": refresh}, format="json")
+		self.assertEqual(res.status_code, status.HTTP_200_OK)
+		demoted = APIClient(HTTP_AUTHORIZATION=f"Bearer {res.data['access']}")
+		self.assertEqual(demoted.get("/api/techniques/").data["results"], [])
+
+		self.user.is_active = False
+		self.user.save()
+		res = self.client.post("/api/token/refresh/", {"refresh": refresh}, format="json")
+		self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class VoterListTests(APITestCase):
+	def setUp(self):
+		self.voters = [
+			User.objects.create_user(
+				email=f"voter{i}@example.com", password="pass1234", username=f"voter{i}", first_name="v", last_name="t",
+			)
+			for i in range(5)
+		]
+		self.technique = Technique.objects.create(title="Drip", summary="s", detailed_content="d", is_published=True)
+		self.thread = ForumThread.objects.create(title="Wells", content="c", author=self.voters[0])
+		self.comment = ForumComment.objects.create(thread=self.thread, author=self.voters[0], content="c")
+		for voter in self.voters:
+			self.technique.likes.add(voter)
+			self.thread.upvoted_by.add(voter)
+		self.comment.upvoted_by.add(self.voters[1])
+
+	def _pages(self, url):
+		usernames, params = [], {"page_size": 2}
+		while True:
+			res = self.client.get(url, params)
+			self.assertEqual(res.status_code, status.HTTP_200_OK)
+			self.assertEqual(set(res.data["results"][0]), {"id", "username", "profile_pic_url", "profile_pic_srcset"})
+			usernames += [user["username"] for user in res.data["results"]]
+			if not res.data["next"]:
+				return usernames
+			params = {"page_size": 2, "cursor": res.data["next"].split("cursor=")[1].split("&")[0]}
+
+	def test_paginated_voters_newest_first(self):
+		newest_first = [voter.username for voter in reversed(self.voters)]
+		self.assertEqual(self._pages(f"/api/techniques/{self.technique.pk}/likers/"), newest_first)
+		self.assertEqual(self._pages(f"/api/forum-threads/{self.thread.slug}/voters/"), newest_first)
+		self.assertEqual(self._pages(f"/api/forum-comments/{self.comment.pk}/voters/"), ["voter1"])
+
+	def test_payloads_carry_counts_not_voter_arrays(self):
+		self.client.force_authenticate(user=self.voters[1])
+		with CaptureQueriesContext(connection) as ctx:
+			thread = self.client.get(f"/api/forum-threads/{self.thread.slug}/").data
+		self.assertNotIn("upvoted_by", thread)
+		self.assertEqual((thread["upvote_count"], thread["is_liked_by_user"]), (5, True))
+		# Only the viewer's own vote is looked up, not every voter.
+		self.assertEqual(sum("forumthread_upvoted_by" in q["sql"] for q in ctx.captured_queries), 1)
+		comment = self.client.get(f"/api/forum-threads/{self.thread.slug}/thread-comments/").data[0]
+		self.assertNotIn("upvoted_by", comment)
+		self.assertEqual((comment["upvote_count"], comment["is_liked_by_user"]), (1, True))
+
+		with override_settings(VOTER_ARRAYS_COMPAT=True):
+			thread = self.client.get(f"/api/forum-threads/{self.thread.slug}/").data
+			technique = self.client.get(f"/api/techniques/{self.technique.pk}/").data
+		self.assertEqual(sorted(thread["upvoted_by"]), sorted(voter.pk for voter in self.voters))
+		self.assertEqual(len(technique["likes"]), 5)
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class SyncFeedTests(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(
+			email="sync@example.com", password="pass1234", username="sync", first_name="s", last_name="y",
+		)
+		self.technique = Technique.objects.create(title="Drip", summary="s", detailed_content="d", is_published=True)
+		self.draft = Technique.objects.create(title="Draft", summary="s", detailed_content="d")
+		self.tag = ForumTag.objects.create(name="wells")
+		self.thread = ForumThread.objects.create(title="Wells", content="c", author=self.user)
+		self.comment = ForumComment.objects.create(thread=self.thread, author=self.user, content="first")
+
+	def _sync(self, **params):
+		res = self.client.get("/api/sync/", params)
+		self.assertEqual(res.status_code, status.HTTP_200_OK, res.content)
+		return res.data
+
+	def _ids(self, data, name):
+		return [item["id"] for item in data["changes"][name]]
+
+	def test_full_then_incremental_sync(self):
+		data = self._sync()
+		self.assertEqual(self._ids(data, "techniques"), [self.technique.pk])
+		self.assertEqual(data["deleted"]["techniques"], [self.draft.pk])  # not visible anonymously
+		self.assertEqual(self._ids(data, "forum_tags"), [self.tag.pk])
+		self.assertEqual(self._ids(data, "forum_threads"), [self.thread.pk])
+		self.assertEqual(data["changes"]["forum_comments"][0]["content"], "first")
+		self.assertNotIn("replies", data["changes"]["forum_comments"][0])
+		self.assertFalse(data["has_more"] or data["reset"])
+
+		data = self._sync(since=data["next"])
+		self.assertFalse(any(data["changes"].values()) or any(data["deleted"].values()))
+
+		self.thread.title = "Village wells"
+		self.thread.save()
+		comment_pk = self.comment.pk
+		self.comment.delete()
+		data = self._sync(since=data["next"])
+		self.assertEqual([item["title"] for item in data["changes"]["forum_threads"]], ["Village wells"])
+		self.assertEqual(data["deleted"]["forum_comments"], [comment_pk])
+		self.assertFalse(data["changes"]["techniques"])
+
+	def test_images_follow_their_technique_in_and_out_of_view(self):
+		images = TechniqueImage.objects.bulk_create([
+			TechniqueImage(technique=self.draft, image=f"techniques/draft-{i}.jpg") for i in range(2)
+		])
+		image_pks = sorted(image.pk for image in images)
+		data = self._sync()
+		self.assertEqual(sorted(data["deleted"]["technique_images"]), image_pks)
+
+		self.draft.is_published = True
+		self.draft.save()
+		data = self._sync(since=data["next"])
+		self.assertEqual(self._ids(data, "techniques"), [self.draft.pk])
+		self.assertEqual(sorted(self._ids(data, "technique_images")), image_pks)
+
+		self.draft.is_published = False
+		self.draft.save()
+		data = self._sync(since=data["next"])
+		self.assertEqual(data["deleted"]["techniques"], [self.draft.pk])
+		self.assertEqual(sorted(data["deleted"]["technique_images"]), image_pks)
+
+	def test_bounded_pages_cover_every_change_once(self):
+		for i in range(4):
+			ForumComment.objects.create(thread=self.thread, author=self.user, content=f"reply {i}")
+		tag_pk = self.tag.pk
+		self.tag.delete()
+		changes, pages, params = [], 0, {"limit": 2}
+		while True:
+			data = self._sync(**params)
+			pages += 1
+			page = [(name, item["id"]) for name, items in data["changes"].items() for item in items]
+			page += [(f"-{name}", pk) for name, pks in data["deleted"].items() for pk in pks]
+			self.assertLessEqual(len(page), 2)
+			changes += page
+			params = {"limit": 2, "since": data["next"]}
+			if not data["has_more"]:
+				break
+		self.assertEqual(len(changes), len(set(changes)))
+		self.assertIn(("-forum_tags", tag_pk), changes)
+		self.assertNotIn(("forum_tags", tag_pk), changes)
+		self.assertEqual(sum(name == "forum_comments" for name, _ in changes), 5)
+		self.assertGreater(pages, 3)
+
+	def test_stale_and_invalid_tokens(self):
+		old = sync.encode_token(sync.Position(timezone.now() - settings.SYNC_TOMBSTONE_RETENTION - timedelta(days=1), 0, 0))
+		data = self._sync(since=old)
+		self.assertTrue(data["reset"])
+		self.assertEqual(self._ids(data, "techniques"), [self.technique.pk])
+		self.assertEqual(self.client.get("/api/sync/", {"since": "nope"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ForumEventTests(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(
+			email="live@example.com", password="pass1234", username="live", first_name="l", last_name="e",
+		)
+		self.client.force_authenticate(self.user)
+		self.thread = ForumThread.objects.create(title="Live thread", content="c", author=self.user)
+
+	def _stream(self, slug, actions):
+		"""Open the thread's event stream, run the sync ``actions`` and return the frames received."""
+		async def scenario():
+			communicator = ApplicationCommunicator(application, {
+				"type": "http", "method": "GET", "path": f"/api/events/forum-threads/{slug}/",
+				"headers": [(b"origin", b"http://localhost:3000")], "query_string": b"",
+			})
+			await communicator.send_input({"type": "http.request", "body": b""})
+			start = await communicator.receive_output(timeout=2)
+			frames = []
+			if start["status"] == 200:
+				self.assertEqual((await communicator.receive_output(timeout=2))["body"], b"retry: 5000\n\n")
+				expected = await sync_to_async(actions)()
+				for _ in range(expected):
+					frames.append((await communicator.receive_output(timeout=2))["body"].decode())
+			else:
+				frames.append(json.loads((await communicator.receive_output(timeout=2))["body"]))
+			await communicator.send_input({"type": "http.disconnect"})
+			await communicator.wait(timeout=2)
+			return start, frames
+		return async_to_sync(scenario)()
+
+	def test_comments_and_votes_are_streamed(self):
+		def actions():
+			with self.captureOnCommitCallbacks(execute=True):
+				comment = ForumComment.objects.create(thread=self.thread, author=self.user, content="hello")
+			comment.content = "hello again"
+			with self.captureOnCommitCallbacks(execute=True):
+				comment.save()
+				self.client.post(f"/api/forum-threads/{self.thread.slug}/upvote/")
+				self.client.post(f"/api/forum-comments/{comment.pk}/upvote/")
+			self.comment = comment
+			return 4
+
+		start, frames = self._stream(self.thread.slug, actions)
+		headers = dict(start["headers"])
+		self.assertEqual(headers[b"content-type"], b"text/event-stream; charset=utf-8")
+		self.assertEqual(headers[b"access-control-allow-origin"], b"http://localhost:3000")
+		parsed = []
+		for frame in frames:
+			event, data = frame.strip().split("\n")
+			parsed.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+		self.assertEqual([event for event, _ in parsed], ["comment-created", "comment-edited", "vote-count", "vote-count"])
+		self.assertEqual(parsed[0][1]["content"], "hello")
+		self.assertEqual(parsed[1][1]["content"], "hello again")
+		self.assertEqual(parsed[1][1]["thread"], self.thread.pk)
+		self.assertEqual(parsed[2][1], {"object": "thread", "id": self.thread.pk, "count": 1})
+		self.assertEqual(parsed[3][1], {"object": "comment", "id": self.comment.pk, "count": 1})
+
+	def test_other_threads_are_not_streamed(self):
+		other = ForumThread.objects.create(title="Other thread", content="c", author=self.user)
+
+		def actions():
+			with self.captureOnCommitCallbacks(execute=True):
+				ForumComment.objects.create(thread=other, author=self.user, content="elsewhere")
+				ForumComment.objects.create(thread=self.thread, author=self.user, content="here")
+			return 1
+
+		_, frames = self._stream(self.thread.slug, actions)
+		self.assertIn('"content":"here"', frames[0])
+
+	@override_settings(FORUM_EVENTS_HEARTBEAT=0.01)
+	def test_quiet_streams_get_keepalives(self):
+		_, frames = self._stream(self.thread.slug, lambda: 2)
+		self.assertEqual(frames, [": keepalive\n\n"] * 2)
+
+	def test_unknown_thread(self):
+		start, frames = self._stream("no-such-thread", None)
+		self.assertEqual(start["status"], 404)
+		self.assertEqual(frames[0]["detail"], "No ForumThread matches the given query.")
+
+	@override_settings(FORUM_EVENTS_QUEUE_SIZE=3)
+	def test_slow_subscribers_get_resync(self):
+		broker = events.LocalBroker()
+
+		async def scenario():
+			async with broker.subscribe(7) as subscription:
+				for i in range(5):
+					broker.publish(7, "vote-count", {"id": i})
+				await asyncio.sleep(0.01)
+				received = [await subscription.get()]
+				broker.publish(7, "vote-count", {"id": 5})
+				received.append(await subscription.get())
+			self.assertEqual(broker._channels, {})
+			return received
+
+		self.assertEqual(async_to_sync(scenario)(), [events.RESYNC, events.frame("vote-count", {"id": 5})])
+
+
+@override_settings(STREAMING_CHUNK_SIZE=2, RESPONSE_CACHE_ENABLED=False)
+class StreamingListTests(APITestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(
+			email="stream@example.com", password="pass1234", username="stream", first_name="s", last_name="t",
+		)
+		category = Category.objects.create(name="Streams")
+		for i in range(5):
+			technique = Technique.objects.create(title=f"Stream {i}", summary="s", detailed_content="d", is_published=True)
+			technique.categories.add(category)
+		technique.likes.add(self.user)
+		self.thread = ForumThread.objects.create(title="Streamed thread", content="c", author=self.user)
+		root = ForumComment.objects.create(thread=self.thread, author=self.user, content="root")
+		for i in range(4):
+			ForumComment.objects.create(thread=self.thread, author=self.user, content=f"reply {i}", parent_comment=root)
+		self.client.force_authenticate(self.user)
+
+	def _stream(self, path, params=None, **extra):
+		response = self.client.get(path, {"stream": "1", **(params or {})}, **extra)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertTrue(response.streaming)
+		return response, b"".join(response.streaming_content)
+
+	def test_streams_the_whole_list_in_order(self):
+		for path in ("/api/techniques/", "/api/forum-threads/"):
+			expected = self.client.get(path, {"page_size": 100}).json()["results"]
+			_, body = self._stream(path)
+			self.assertEqual(json.loads(body), expected, path)
+		with override_settings(TECHNIQUE_DOCUMENTS_ENABLED=False):
+			_, body = self._stream("/api/techniques/")
+		self.assertEqual(json.loads(body), self.client.get("/api/techniques/", {"page_size": 100}).json()["results"])
+		self.assertEqual(sum(item["is_liked_by_user"] for item in json.loads(body)), 1)
+
+	def test_comments_are_flat_and_filtered(self):
+		other = ForumThread.objects.create(title="Other", content="c", author=self.user)
+		ForumComment.objects.create(thread=other, author=self.user, content="elsewhere")
+		_, body = self._stream("/api/forum-comments/", {"thread_id": self.thread.pk})
+		comments = json.loads(body)
+		self.assertEqual([comment["content"] for comment in comments], ["root"] + [f"reply {i}" for i in range(4)])
+		self.assertNotIn("replies", comments[0])
+		self.assertEqual(comments[1]["parent_comment"], comments[0]["id"])
+
+	def test_queries_grow_per_chunk_not_per_row(self):
+		def queries(count):
+			with override_settings(TECHNIQUE_DOCUMENTS_ENABLED=False), CaptureQueriesContext(connection) as captured:
+				self.assertEqual(len(json.loads(self._stream("/api/techniques/")[1])), count)
+			return len(captured)
+
+		few = queries(5)
+		for i in range(4):
+			Technique.objects.create(title=f"More {i}", summary="s", detailed_content="d", is_published=True)
+		# Two more chunks of two: a query for the rows' categories, regions and the viewer's likes each.
+		self.assertLessEqual(queries(9) - few, 2 * 3 + 1)
+
+	def test_gzip_and_authentication(self):
+		response, body = self._stream("/api/forum-threads/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+		self.assertEqual(response["Content-Encoding"], "gzip")
+		self.assertIn("Accept-Encoding", response["Vary"])
+		self.assertEqual(len(json.loads(gzip.decompress(body))), 1)
+		with override_settings(STREAMING_GZIP=False):
+			response, body = self._stream("/api/forum-threads/", HTTP_ACCEPT_ENCODING="gzip")
+		self.assertFalse(response.has_header("Content-Encoding"))
+		self.client.force_authenticate(None)
+		self.assertEqual(self.client.get("/api/techniques/", {"stream": "1"}).status_code, status.HTTP_401_UNAUTHORIZED)
+
+	def test_streams_under_asgi(self):
+		headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+		async def scenario():
+			response = await self.async_client.get("/api/techniques/", {"stream": "1"}, headers=headers)
+			return response, b"".join([chunk async for chunk in response.streaming_content])
+
+		response, body = async_to_sync(scenario)()
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(len(json.loads(body)), 5)
+
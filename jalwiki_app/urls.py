@@ -2,8 +2,9 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from django.conf.urls.static import static
 from django.conf import settings
-from .views import UserViewSet, TechniqueViewSet, CategoryViewSet, RegionViewSet, ForumThreadViewSet, ForumCommentViewSet, ForumTagViewSet
+from .views import UserViewSet, TechniqueViewSet, CategoryViewSet, RegionViewSet, ForumThreadViewSet, ForumCommentViewSet, ForumTagViewSet, AutocompleteView, SyncView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from . import async_views
 
 
 router = DefaultRouter()
@@ -18,11 +19,24 @@ router.register(r'forum-comments', ForumCommentViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('autocomplete/', AutocompleteView.as_view(), name='autocomplete'),
+    path('sync/', SyncView.as_view(), name='sync'),
     path('users/get_user_details/', UserViewSet.as_view({'get': 'get_user_details'}), name='get_user_details'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
 
+# Async versions of the hottest routes (same responses), see async_views.py.
+urlpatterns += [
+    path('async/techniques/', async_views.technique_list, name='async-technique-list'),
+    path('async/techniques/<str:pk>/', async_views.technique_detail, name='async-technique-detail'),
+    path('async/techniques/<str:pk>/toggle_like/', async_views.technique_toggle_like, name='async-technique-toggle-like'),
+    path('async/forum-threads/', async_views.thread_list, name='async-forumthread-list'),
+    path('async/forum-threads/<str:slug>/thread-comments/', async_views.thread_comments, name='async-forumthread-comments'),
+    path('async/forum-threads/<str:slug>/upvote/', async_views.thread_upvote, name='async-forumthread-upvote'),
+    path('async/forum-comments/<str:pk>/upvote/', async_views.comment_upvote, name='async-forumcomment-upvote'),
+]
+
 urlpatterns += router.urls
 
 if settings.DEBUG:
@@ -1,24 +1,34 @@
 from rest_framework import viewsets, status, filters, permissions
+from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from rest_framework.response import Response
 from django.contrib.auth.hashers import check_password
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.shortcuts import get_object_or_404
 from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
-from django.utils.text import slugify
-from django.db.models import Q
+from django.db.models import F
 from django.conf import settings
-
+from jalwiki_pro.authentication import ClaimsRefreshToken
+from jalwiki_pro.pagination import ReplyPagination, VoterPagination
+
+from . import sync, votes
+from .autocomplete import autocomplete
+from .cache import CachedResponseMixin
+from .comments import build_comment_tree, load_reply_trees, tree_options
+from .documents import TechniqueDocumentMixin
+from .fieldsets import trim_queryset
+from .search import TechniqueSearchFilter
+from .streaming import StreamingListMixin, streaming_requested
 from .models import User, Category, Technique, TechniqueImage, Region, ForumThread, ForumComment, ForumTag
-from .serializers import UserSerializer, CategorySerializer, TechniqueSerializer, TechniqueListSerializer, TechniqueImageSerializer, RegionSerializer, ForumThreadSerializer, ForumCommentSerializer, ForumTagSerializer
+from .serializers import UserSerializer, CategorySerializer, TechniqueSerializer, TechniqueListSerializer, TechniqueImageSerializer, RegionSerializer, ForumThreadSerializer, ForumCommentSerializer, FlatForumCommentSerializer, ForumTagSerializer, VoterSerializer
 
 
-class RegionViewSet(viewsets.ModelViewSet):
+class RegionViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Region.objects.all()
     serializer_class = RegionSerializer
+    cache_dependencies = (Region,)
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name']
@@ -40,7 +50,7 @@ class UserViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
     def get_tokens_for_user(self, user):
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         return {
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -58,7 +68,7 @@ class UserViewSet(viewsets.ModelViewSet):
             user = User.objects.get(email=email)
             if check_password(password, user.password):
                 user_data = UserSerializer(user).data
-                refresh = RefreshToken.for_user(user)
+                refresh = ClaimsRefreshToken.for_user(user)
                 access_token = refresh.access_token
                 tokens_dict = {
                     'refresh': str(refresh),
@@ -159,9 +169,10 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer.save()
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cache_dependencies = (Category,)
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name']
@@ -171,33 +182,47 @@ class CategoryViewSet(viewsets.ModelViewSet):
         serializer.save()
 
 
-class TechniqueViewSet(viewsets.ModelViewSet):
+class TechniqueViewSet(StreamingListMixin, CachedResponseMixin, TechniqueDocumentMixin, viewsets.ModelViewSet):
     queryset = Technique.objects.all()
     serializer_class = TechniqueSerializer
+    cache_dependencies = (Technique, Category, Region, TechniqueImage)
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, TechniqueSearchFilter, filters.OrderingFilter]
     filterset_fields = ['categories__id', 'added_by', 'is_published', 'regions__id']
     search_fields = ['title', 'summary', 'detailed_content', 'impact', 'benefits', 'materials', 'steps']
     ordering_fields = ['created_on', 'updated_on']
+    keyset_ordering = ('-created_on', '-id')  # ?pagination=cursor
+    keyset_exclusive_params = ('ordering', 'q')  # their orders cannot be cursor-paged
 
     def get_queryset(self):
+        queryset = Technique.objects.select_related('added_by').prefetch_related('categories', 'regions')
+        if self.action in ('toggle_like', 'like', 'likers', 'get_related'):
+            queryset = Technique.objects.only('pk', 'likes_count')
+        elif self.action != 'list':
+            queryset = votes.with_voters(queryset.prefetch_related('technique_images'), 'likes')
+        if self.action in ('list', 'retrieve'):
+            queryset = trim_queryset(queryset, self.get_serializer_class(), self.request)
         if self.request.user.is_staff:
-            return Technique.objects.all()
-        return Technique.objects.filter(is_published=True)
+            return queryset
+        return queryset.filter(is_published=True)
 
     def get_serializer_class(self):
         if self.action == 'list':
             return TechniqueListSerializer
         return TechniqueSerializer
 
+    def get_stream_queryset(self):
+        queryset = super().get_stream_queryset()
+        return self.document_rows(queryset) if self.serve_documents(self.request) else queryset
+
+    def serialize_chunk(self, rows):
+        if self.serve_documents(self.request):
+            return self.summaries(rows)
+        return super().serialize_chunk(rows)
+
     def perform_create(self, serializer):
-        base_slug = slugify(self.request.data.get('title', ''))
-        slug = base_slug
-        count = 1
-        while Technique.objects.filter(slug=slug).exists():
-            slug = f"{base_slug}-{count}"
-            count += 1
-        serializer.save(added_by=self.request.user, slug=slug)
+        # An empty slug lets Technique.save allocate one from the title.
+        serializer.save(added_by=self.request.user, slug='')
 
     @action(detail=True, methods=['post'])
     def add_image(self, request, pk=None):
@@ -211,33 +236,42 @@ class TechniqueViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def get_images(self, request, pk=None):
         technique = self.get_object()
-        images = technique.images.all()
+        images = technique.technique_images.all()
         serializer = TechniqueImageSerializer(images, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=['post'])
     def toggle_like(self, request, pk=None):
         try:
-            technique = self.get_object()
-            user = request.user
-            if user in technique.likes.all():
-                technique.likes.remove(user)
-                liked = False
-            else:
-                technique.likes.add(user)
-                liked = True
-            return Response({'liked': liked, 'likes_count': technique.likes.count()})
+            liked, likes_count = votes.toggle(self.get_object(), 'likes', request.user)
+            return Response({'liked': liked, 'likes_count': likes_count})
+        except Technique.DoesNotExist:
+            return Response({"error": "Technique not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    @action(detail=True, methods=['put', 'delete'])
+    def like(self, request, pk=None):
+        """PUT likes, DELETE unlikes; repeating either is harmless, unlike toggle_like."""
+        try:
+            liked = request.method == 'PUT'
+            _, likes_count = votes.set_vote(self.get_object(), 'likes', request.user, liked)
+            return Response({'liked': liked, 'likes_count': likes_count})
         except Technique.DoesNotExist:
             return Response({"error": "Technique not found"}, status=status.HTTP_404_NOT_FOUND)
 
+    @action(detail=True, methods=['get'])
+    def likers(self, request, pk=None):
+        return voters_response(self.get_object(), 'likes', request, self)
+
     @action(detail=True, methods=['get'])
     def get_related(self, request, pk=None):
         technique = self.get_object()
+        # Ranked neighbours precomputed by jalwiki_app.related.
         related_techniques = Technique.objects.filter(
-            Q(categories__in=technique.categories.all())
-        ).exclude(id=technique.id).distinct()[:5]
-        serializer = TechniqueListSerializer(related_techniques, many=True)
-        return Response(serializer.data)
+            related_to__technique=technique, is_published=True,
+        ).order_by('related_to__rank').only('pk')
+        if self.serve_documents(request):
+            related_techniques = related_techniques.annotate(document_summary=F('document__summary'))
+        return Response(self.summaries(list(related_techniques[:5])))
 
     @action(detail=False, methods=['get'])
     def user_techniques(self, request):
@@ -281,53 +315,138 @@ class TechniqueImageViewSet(viewsets.ModelViewSet):
             return Response({"error": "Technique not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+def upvote_response(obj, request):
+    if request.method == 'POST':
+        upvoted, count = votes.toggle(obj, 'upvoted_by', request.user)
+    else:
+        upvoted = request.method == 'PUT'
+        _, count = votes.set_vote(obj, 'upvoted_by', request.user, upvoted)
+    return Response({'status': 'vote processed', 'upvoted': upvoted, 'count': count})
+
+
+def voters_response(obj, field_name, request, view):
+    """A cursor page (?cursor=, ?page_size=) of the users who voted on ``obj``, newest vote first."""
+    rows, user_field = votes.voter_rows(obj, field_name)
+    paginator = VoterPagination()
+    page = paginator.paginate_queryset(rows, request, view)
+    users = [getattr(row, user_field) for row in page]
+    serializer = VoterSerializer(users, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
 class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
         return obj.author == request.user
 
-class ForumTagViewSet(viewsets.ModelViewSet):
+class ForumTagViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = ForumTag.objects.all()
     serializer_class = ForumTagSerializer
+    cache_dependencies = (ForumTag,)
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
-class ForumThreadViewSet(viewsets.ModelViewSet):
-    queryset = ForumThread.objects.all().prefetch_related('tags', 'author', 'upvoted_by', 'comments__author', 'comments__upvoted_by', 'comments__replies')
+class ForumThreadViewSet(StreamingListMixin, viewsets.ModelViewSet):
+    queryset = ForumThread.objects.select_related('author').prefetch_related('tags')
     serializer_class = ForumThreadSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
     lookup_field = 'slug'
+    hot_ordering = ('-hot_score', '-id')  # ?ordering=hot, see jalwiki_app.hotness
+
+    @property
+    def keyset_ordering(self):  # ?pagination=cursor
+        request = getattr(self, 'request', None)
+        if request is not None and request.query_params.get('ordering') == 'hot':
+            return self.hot_ordering
+        return ('-last_activity_at', '-id')
+
+    def get_queryset(self):
+        if self.action in ('list_comments', 'upvote', 'voters'):
+            return ForumThread.objects.all()
+        queryset = votes.with_voters(super().get_queryset(), 'upvoted_by')
+        if self.action == 'list' and self.request.query_params.get('ordering') == 'hot':
+            # Matches thread_hot_id_idx, so every page is an index range scan.
+            queryset = queryset.order_by(*self.hot_ordering)
+        if self.action in ('list', 'retrieve'):
+            queryset = trim_queryset(queryset, self.get_serializer_class(), self.request)
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    @action(detail=True, methods=['post', 'put', 'delete'], permission_classes=[permissions.IsAuthenticated])
     def upvote(self, request, slug=None):
-        thread = self.get_object()
-        user = request.user
-        if user in thread.upvoted_by.all():
-            thread.upvoted_by.remove(user)
-            upvoted = False
-        else:
-            thread.upvoted_by.add(user)
-            upvoted = True
-        return Response({'status': 'vote processed', 'upvoted': upvoted, 'count': thread.upvote_count})
+        # POST toggles; PUT and DELETE set the vote and can be retried safely.
+        return upvote_response(self.get_object(), request)
 
     @action(detail=True, methods=['get'], url_path='thread-comments')
     def list_comments(self, request, slug=None):
         thread = self.get_object()
-        comments = thread.comments.filter(parent_comment__isnull=True).prefetch_related('author', 'upvoted_by', 'replies')
-        serializer = ForumCommentSerializer(comments, many=True, context={'request': request})
+        # The whole tree shares the thread FK, so one query loads every level.
+        comments = list(trim_queryset(
+            votes.with_voters(thread.comments.select_related('author'), 'upvoted_by'), ForumCommentSerializer, request,
+        ))
+        max_depth, replies_limit = tree_options(request.query_params)
+        roots = build_comment_tree(comments, max_depth=max_depth, replies_limit=replies_limit)
+        serializer = ForumCommentSerializer(roots, many=True, context={'request': request})
+        serializer.child.prime_viewer_flags(comments)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def voters(self, request, slug=None):
+        return voters_response(self.get_object(), 'upvoted_by', request, self)
 
-class ForumCommentViewSet(viewsets.ModelViewSet):
-    queryset = ForumComment.objects.all().select_related('author', 'thread', 'parent_comment').prefetch_related('upvoted_by', 'replies')
+
+class ForumCommentViewSet(StreamingListMixin, viewsets.ModelViewSet):
+    queryset = ForumComment.objects.all()
     serializer_class = ForumCommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
 
+    def tree_queryset(self):
+        return trim_queryset(
+            votes.with_voters(ForumComment.objects.select_related('author'), 'upvoted_by'), ForumCommentSerializer, self.request,
+        )
+
+    def with_reply_trees(self, comments):
+        """
+        Reload ``comments`` and load the replies below them (see
+        load_reply_trees), linked in memory so nested replies cost no queries.
+        """
+        queryset = self.tree_queryset()
+        by_id = {comment.pk: comment for comment in queryset.filter(pk__in=[comment.pk for comment in comments])}
+        nodes = [by_id[comment.pk] for comment in comments]
+        max_depth, replies_limit = tree_options(self.request.query_params)
+        return nodes, nodes + load_reply_trees(queryset, nodes, max_depth, replies_limit)
+
+    def list(self, request, *args, **kwargs):
+        if streaming_requested(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        nodes, loaded = self.with_reply_trees(page if page is not None else list(queryset))
+        serializer = self.get_serializer(nodes, many=True)
+        serializer.child.prime_viewer_flags(loaded)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def get_stream_queryset(self):
+        return votes.with_voters(super().get_stream_queryset().select_related('author'), 'upvoted_by')
+
+    def serialize_chunk(self, rows):
+        # Flat: building reply trees would reload whole threads for every chunk.
+        return FlatForumCommentSerializer(rows, many=True, context=self.get_serializer_context()).data
+
+    def retrieve(self, request, *args, **kwargs):
+        (comment,), loaded = self.with_reply_trees([self.get_object()])
+        serializer = self.get_serializer(comment)
+        serializer.prime_viewer_flags(loaded)
+        return Response(serializer.data)
+
     def get_queryset(self):
         queryset = super().get_queryset()
+        if self.action in ('replies', 'voters'):
+            return ForumComment.objects.all()
         thread_id = self.request.query_params.get('thread_id')
         thread_slug = self.request.query_params.get('thread_slug')
 
@@ -340,14 +459,54 @@ class ForumCommentViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    @action(detail=True, methods=['post', 'put', 'delete'], permission_classes=[permissions.IsAuthenticated])
     def upvote(self, request, pk=None):
+        # POST toggles; PUT and DELETE set the vote and can be retried safely.
+        return upvote_response(self.get_object(), request)
+
+    @action(detail=True, methods=['get'])
+    def replies(self, request, pk=None):
         comment = self.get_object()
-        user = request.user
-        if user in comment.upvoted_by.all():
-            comment.upvoted_by.remove(user)
-            upvoted = False
-        else:
-            comment.upvoted_by.add(user)
-            upvoted = True
-        return Response({'status': 'vote processed', 'upvoted': upvoted, 'count': comment.upvote_count})
\ No newline at end of file
+        queryset = self.tree_queryset()
+        paginator = ReplyPagination()
+        page = paginator.paginate_queryset(queryset.filter(parent_comment=comment), request, view=self)
+        max_depth, replies_limit = tree_options(request.query_params)
+        loaded = load_reply_trees(queryset, page, max_depth, replies_limit)
+        serializer = ForumCommentSerializer(page, many=True, context={'request': request})
+        serializer.child.prime_viewer_flags(page + loaded)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def voters(self, request, pk=None):
+        return voters_response(self.get_object(), 'upvoted_by', request, self)
+
+
+class AutocompleteView(APIView):
+    # Anonymous and unauthenticated on purpose: it runs on every keystroke.
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        term = request.query_params.get('q', '').strip()
+        try:
+            limit = int(request.query_params.get('limit', settings.AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            limit = settings.AUTOCOMPLETE_LIMIT
+        limit = max(1, min(limit, settings.AUTOCOMPLETE_MAX_LIMIT))
+        if not term:
+            return Response({"query": term, "techniques": [], "categories": [], "regions": [], "tags": []})
+        return Response(autocomplete(term, limit))
+
+
+class SyncView(APIView):
+    """Incremental changes feed for offline clients, see jalwiki_app.sync."""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        try:
+            limit = int(request.query_params.get('limit', settings.SYNC_PAGE_SIZE))
+        except ValueError:
+            limit = settings.SYNC_PAGE_SIZE
+        limit = max(1, min(limit, settings.SYNC_MAX_PAGE_SIZE))
+        return Response(sync.changes_since(sync.decode_token(since) if since else None, limit, request))
@@ -0,0 +1,131 @@
+"""
+Likes and upvotes as single statements on the M2M through table.
+
+``user in technique.likes.all()`` followed by ``add``/``remove`` and a
+``refresh_from_db`` loads every voter and races with concurrent clicks. Here
+each change is one ``INSERT ... ON CONFLICT DO NOTHING`` or ``DELETE ...
+RETURNING`` whose result feeds an UPDATE of the denormalized counter in the
+same statement (PostgreSQL data-modifying CTEs), returning the new count.
+Other databases run the equivalent queries in a transaction.
+
+These writes bypass ``m2m_changed``: the counter is adjusted here and
+``vote_changed`` is sent for everything else that reacts to votes.
+"""
+from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
+from django.dispatch import Signal
+
+from . import counters
+
+# Sent after a vote was really added or removed. Arguments: sender (the
+# voted-on model class), instance, field_name, user, voted, count.
+vote_changed = Signal()
+
+_TOGGLE = {
+    # Toggle: delete the vote, and insert it only if there was nothing to delete.
+    None: """
+        WITH removed AS (
+            DELETE FROM {through} WHERE {owner} = %(owner)s AND {target} = %(target)s RETURNING 1
+        ), added AS (
+            INSERT INTO {through} ({owner}, {target}) SELECT %(owner)s, %(target)s
+            WHERE NOT EXISTS (SELECT 1 FROM removed) ON CONFLICT DO NOTHING RETURNING 1
+        )""",
+    True: """
+        WITH removed AS (SELECT 1 WHERE false), added AS (
+            INSERT INTO {through} ({owner}, {target}) VALUES (%(owner)s, %(target)s) ON CONFLICT DO NOTHING RETURNING 1
+        )""",
+    False: """
+        WITH removed AS (
+            DELETE FROM {through} WHERE {owner} = %(owner)s AND {target} = %(target)s RETURNING 1
+        ), added AS (SELECT 1 WHERE false)""",
+}
+_UPDATE_COUNTER = """
+    UPDATE {table} SET {counter} = GREATEST({counter} + (SELECT count(*) FROM added) - (SELECT count(*) FROM removed), 0)
+    WHERE {pk} = %(owner)s
+    RETURNING {counter}, (SELECT count(*) FROM added), (SELECT count(*) FROM removed)
+"""
+
+
+def _write_postgresql(using, model, field_name, counter, owner_pk, user_pk, voted):
+    through, owner_fk, target_fk = counters.m2m_columns(model, field_name)
+    quote = connections[using].ops.quote_name
+    sql = (_TOGGLE[voted] + _UPDATE_COUNTER).format(
+        through=quote(through._meta.db_table),
+        owner=quote(through._meta.get_field(owner_fk).column),
+        target=quote(through._meta.get_field(target_fk).column),
+        table=quote(model._meta.db_table), pk=quote(model._meta.pk.column), counter=quote(counter),
+    )
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, {'owner': owner_pk, 'target': user_pk})
+        row = cursor.fetchone()
+    if row is None:
+        raise model.DoesNotExist(f"{model._meta.object_name} {owner_pk} does not exist.")
+    count, added, removed = row
+    return bool(added), bool(added or removed), count
+
+
+def _write_generic(using, model, field_name, counter, owner_pk, user_pk, voted):
+    through, owner_fk, target_fk = counters.m2m_columns(model, field_name)
+    with transaction.atomic(using=using):
+        # Serializes votes on the same row where the database supports row locks.
+        if not model._default_manager.using(using).select_for_update().filter(pk=owner_pk).exists():
+            raise model.DoesNotExist(f"{model._meta.object_name} {owner_pk} does not exist.")
+        columns = {
+            through._meta.get_field(owner_fk).attname: owner_pk,
+            through._meta.get_field(target_fk).attname: user_pk,
+        }
+        rows = through.objects.using(using).filter(**columns)
+        removed = rows.delete()[0] if voted is not True else 0
+        added = 0
+        if voted is True or (voted is None and not removed):
+            try:
+                with transaction.atomic(using=using):
+                    through.objects.using(using).create(**columns)
+                added = 1
+            except IntegrityError:
+                pass
+        counters.adjust(model, counter, added - removed, pk=owner_pk)
+        count = model._default_manager.using(using).filter(pk=owner_pk).values_list(counter, flat=True).get()
+    return bool(added), bool(added or removed), count
+
+
+def _write(obj, field_name, user, voted):
+    model = type(obj)
+    counter = counters.m2m_counter(model, field_name)
+    if counter is None:
+        raise ValueError(f"{model._meta.label}.{field_name} has no denormalized counter.")
+    using = router.db_for_write(model, instance=obj)
+    write = _write_postgresql if connections[using].vendor == 'postgresql' else _write_generic
+    added, changed, count = write(using, model, field_name, counter, obj.pk, user.pk, voted)
+    now_voted = added if voted is None else voted
+    setattr(obj, counter, count)
+    if changed:
+        vote_changed.send(sender=model, instance=obj, field_name=field_name, user=user, voted=now_voted, count=count)
+    return now_voted, changed, count
+
+
+def toggle(obj, field_name, user):
+    """Flip ``user``'s vote on ``obj``. Returns (voted, count)."""
+    voted, _, count = _write(obj, field_name, user, None)
+    return voted, count
+
+
+def set_vote(obj, field_name, user, voted):
+    """Idempotently add (``voted=True``) or remove ``user``'s vote. Returns (changed, count)."""
+    _, changed, count = _write(obj, field_name, user, bool(voted))
+    return changed, count
+
+
+def voter_rows(obj, field_name):
+    """
+    ``obj``'s votes as through-table rows with the user joined in, and the name
+    of the row's user field. Rows are keyed by the through table's id, so the
+    newest votes come first when ordering by ``-id``.
+    """
+    through, owner_fk, target_fk = counters.m2m_columns(type(obj), field_name)
+    return through.objects.filter(**{owner_fk: obj.pk}).select_related(target_fk), target_fk
+
+
+def with_voters(queryset, field_name):
+    """Prefetch the voter ID arrays that payloads only carry with VOTER_ARRAYS_COMPAT."""
+    return queryset.prefetch_related(field_name) if settings.VOTER_ARRAYS_COMPAT else queryset
@@ -3,14 +3,32 @@ ASGI config for jalwiki_pro project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Server-Sent Event streams (jalwiki_app.events) are answered here, before
+Django, so an idle stream costs no thread or middleware; everything else goes
+to Django.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
 
 import os
+import re
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'jalwiki_pro.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Needs the app registry that get_asgi_application() set up.
+from jalwiki_app.events import forum_thread_events  # noqa: E402
+
+FORUM_EVENTS_PATH = re.compile(r'^/api/events/forum-threads/(?P<slug>[-\w]+)/$')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        match = FORUM_EVENTS_PATH.match(scope['path'])
+        if match:
+            return await forum_thread_events(scope, receive, send, match['slug'])
+    return await django_application(scope, receive, send)
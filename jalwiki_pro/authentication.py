@@ -0,0 +1,139 @@
+"""
+JWT authentication that trusts claims instead of loading the user.
+
+Access tokens from ClaimsRefreshToken (UserViewSet.login,
+get_tokens_for_user and token refresh) carry the user's ``is_staff`` and
+``is_active`` next to the user ID. ClaimsJWTAuthentication turns those into a ClaimsUser, which
+answers ``pk``, ``is_staff``, ``is_active`` and ``is_authenticated`` without a
+query. Anything else (saving it as a foreign key, comparing it with a model
+instance, reading its e-mail) loads the full User through ``user_cache``, a
+bounded per-process LRU with a TTL that signals clear on User save/delete.
+
+Only access tokens carry the claims. They are read from the User whenever
+an access token is minted, at login and by ClaimsTokenRefreshSerializer on
+``/api/token/refresh/``, and never copied from the refresh token. A change to
+is_staff or is_active therefore applies at the latest once the current
+access token expires (ACCESS_TOKEN_LIFETIME). Tokens without the claims are
+authenticated with a user lookup as before.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject
+from rest_framework import exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+USER_CLAIMS = ('is_staff', 'is_active')
+
+
+class UserCache:
+    """Thread-safe LRU of User objects, each kept at most ``ttl`` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pk):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(pk)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(pk)
+                # A copy, so a view changing its request.user cannot touch other requests'.
+                return copy.copy(entry[1])
+        try:
+            user = get_user_model()._default_manager.get(pk=pk)
+        except get_user_model().DoesNotExist:
+            raise exceptions.AuthenticationFailed("User not found", code="user_not_found")
+        with self._lock:
+            self._entries[pk] = (now + self.ttl, user)
+            self._entries.move_to_end(pk)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return copy.copy(user)
+
+    def invalidate(self, pk):
+        with self._lock:
+            self._entries.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(settings.JWT_USER_CACHE_SIZE, settings.JWT_USER_CACHE_TTL)
+
+
+class ClaimsUser(SimpleLazyObject):
+    """request.user from token claims; the User is loaded on first use of anything else."""
+
+    def __init__(self, pk, is_staff, is_active):
+        super().__init__(lambda: user_cache.get(pk))
+        self.__dict__['_claims'] = {
+            'pk': pk, 'id': pk, 'is_staff': is_staff, 'is_active': is_active,
+            'is_authenticated': True, 'is_anonymous': False,
+        }
+
+    def __getattr__(self, name):
+        claims = self.__dict__['_claims']
+        if name in claims:
+            return claims[name]
+        return super().__getattr__(name)
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh tokens whose access tokens carry USER_CLAIMS, as the User has them now."""
+
+    # Older refresh tokens may still hold the claims; never pass those on.
+    no_copy_claims = RefreshToken.no_copy_claims + USER_CLAIMS
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.user = user
+        return token
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        user = getattr(self, 'user', None)
+        if user is None:
+            try:
+                user = get_user_model()._default_manager.get(
+                    **{jwt_settings.USER_ID_FIELD: self.payload.get(jwt_settings.USER_ID_CLAIM)}
+                )
+            except get_user_model().DoesNotExist:
+                raise exceptions.AuthenticationFailed("User not found", code="user_not_found")
+        for claim in USER_CLAIMS:
+            access[claim] = getattr(user, claim)
+        return access
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """``/api/token/refresh/``: new access tokens get fresh claims (see SIMPLE_JWT)."""
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication returning a ClaimsUser for tokens issued by ClaimsRefreshToken."""
+
+    def get_user(self, validated_token):
+        if not all(claim in validated_token for claim in USER_CLAIMS):
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+        if not validated_token['is_active']:
+            raise exceptions.AuthenticationFailed("User is inactive", code="user_inactive")
+        return ClaimsUser(user_id, is_staff=validated_token['is_staff'], is_active=True)
@@ -0,0 +1,110 @@
+import heapq
+import itertools
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('jalwiki.sql')
+
+
+class QueryRecorder:
+    """Database execute wrapper that counts and times every statement."""
+
+    def __init__(self, keep_slowest):
+        self.count = 0
+        self.duration = 0.0
+        self.keep_slowest = keep_slowest
+        self._slowest = []
+        self._order = itertools.count()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if self.keep_slowest:
+                entry = (elapsed, next(self._order), sql)
+                if len(self._slowest) < self.keep_slowest:
+                    heapq.heappush(self._slowest, entry)
+                else:
+                    heapq.heappushpop(self._slowest, entry)
+
+    def slowest(self):
+        return [
+            {'ms': round(elapsed * 1000, 2), 'sql': sql}
+            for elapsed, _, sql in sorted(self._slowest, reverse=True)
+        ]
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records the query count, total database time and slowest statements of
+    each request. They are returned in a ``Server-Timing`` header and logged
+    as one JSON line on the ``jalwiki.sql`` logger. Enabled by the
+    SQL_INSTRUMENTATION setting.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _record(stack, recorder):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder(settings.SQL_INSTRUMENTATION_SLOWEST)
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            self._record(stack, recorder)
+            response = self.get_response(request)
+        return self._report(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder(settings.SQL_INSTRUMENTATION_SLOWEST)
+        start = time.perf_counter()
+        stack = ExitStack()
+        # Under ASGI the request's queries run in its thread-sensitive executor
+        # thread, which has its own connections: hook those, not the loop's.
+        await sync_to_async(self._record)(stack, recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self._report(request, response, recorder, start)
+
+    def _report(self, request, response, recorder, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = recorder.duration * 1000
+
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries", app;dur={total_ms:.1f}'
+        )
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_ms': round(db_ms, 2),
+            'total_ms': round(total_ms, 2),
+            'slowest': recorder.slowest(),
+        }))
+        return response
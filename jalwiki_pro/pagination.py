@@ -1,7 +1,175 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError as BadRequest
+from rest_framework.pagination import BasePagination, LimitOffsetPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimated_count(queryset):
+    """Row estimate from the PostgreSQL planner instead of an exact COUNT(*)."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count()
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a unique ordering key such as ('-created_on', '-id').
+
+    Pages are selected with a row comparison against the last key seen, so deep
+    pages cost the same as the first one and rows inserted meanwhile never shift
+    or duplicate results. The last ordering field must be unique. No COUNT(*) is
+    run unless ?count=exact or ?count=approximate is passed.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def __init__(self, ordering, page_size):
+        self.ordering = tuple(ordering)
+        self.page_size = page_size
+
+    @classmethod
+    def requested(cls, request):
+        return cls.cursor_query_param in request.query_params or request.query_params.get('pagination') == 'cursor'
+
+    def _fields(self):
+        return [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def _encode(self, obj, reverse):
+        position = [str(getattr(obj, name)) for name, _ in self._fields()]
+        raw = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def _decode(self, queryset, encoded):
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            position = [
+                queryset.model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self._fields(), data['p'], strict=True)
+            ]
+            return position, bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound('Invalid cursor')
+
+    def _beyond(self, position, reverse):
+        # (a, b) > (x, y)  ==  a >= x AND (a > x OR (a = x AND b > y)), per
+        # field direction. The a >= x conjunct is implied by the OR chain, but
+        # planners do not derive it, and it is what bounds the index scan.
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self._fields(), position):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        (name, descending), value = self._fields()[0], position[0]
+        return Q(**{f"{name}__{'lte' if descending != reverse else 'gte'}": value}) & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_queryset = queryset
+        encoded = request.query_params.get(self.cursor_query_param)
+        reverse = False
+        ordering = self.ordering
+        if encoded:
+            position, reverse = self._decode(queryset, encoded)
+            if reverse:
+                ordering = tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+            queryset = queryset.filter(self._beyond(position, reverse))
+
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, bool(encoded)
+        self.page = rows
+        return rows
+
+    def _link(self, obj, reverse):
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, self._encode(obj, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        count_mode = self.request.query_params.get(self.count_query_param)
+        if count_mode == 'exact':
+            payload['count'] = self.base_queryset.count()
+        elif count_mode in ('approx', 'approximate'):
+            payload['count'] = estimated_count(self.base_queryset)
+            payload['count_is_approximate'] = connections[self.base_queryset.db].vendor == 'postgresql'
+        payload['results'] = data
+        return Response(payload)
 
 
 class DefaultPagination(PageNumberPagination):
     page_size = 12
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Views declaring ``keyset_ordering`` can opt into cursor pagination
+        # with ?pagination=cursor (or by following a ?cursor= link). Cursor
+        # pages always follow keyset_ordering, so the parameters in the view's
+        # ``keyset_exclusive_params`` (other orderings) are refused with them.
+        ordering = getattr(view, 'keyset_ordering', None)
+        self.keyset = None
+        if ordering and KeysetPagination.requested(request):
+            for param in getattr(view, 'keyset_exclusive_params', ()):
+                if request.query_params.get(param):
+                    raise BadRequest({param: [
+                        f"Cannot be combined with cursor pagination, which is ordered by {', '.join(ordering)}."
+                    ]})
+            self.keyset = KeysetPagination(ordering, self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if getattr(self, 'keyset', None) is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class ReplyPagination(LimitOffsetPagination):
+    """Pages through the direct replies of one comment ("load more replies")."""
+    default_limit = 20
+    max_limit = 100
+
+
+class VoterPagination(KeysetPagination):
+    """Cursor pages of a likers/voters list (through-table rows), newest vote first."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def __init__(self):
+        super().__init__(('-id',), self.page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        try:
+            self.page_size = min(max(int(request.query_params[self.page_size_query_param]), 1), self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return super().paginate_queryset(queryset, request, view)
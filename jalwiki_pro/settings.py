@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'jalwiki_app',
     'drf_yasg',
     'rest_framework',
@@ -49,7 +50,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'jalwiki_pro.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'jalwiki_pro.pagination.DefaultPagination',
 }
@@ -62,9 +63,11 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=24),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'TOKEN_REFRESH_SERIALIZER': 'jalwiki_pro.authentication.ClaimsTokenRefreshSerializer',
 }
 
 MIDDLEWARE = [
+    'jalwiki_pro.middleware.QueryInstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -100,7 +103,7 @@ CORS_ALLOW_HEADERS = [
 ]
 
 CORS_PREFLIGHT_MAX_AGE = 86400  # 24 hours
-CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken']
+CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken', 'ETag', 'Server-Timing']
 
 
 ROOT_URLCONF = 'jalwiki_pro.urls'
@@ -194,4 +197,158 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Media files
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'jalwiki_app/media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'jalwiki_app/media'
+
+# Forum comment trees
+# Deepest reply level returned by thread-comments, and how many replies are
+# included per comment (None = all). Clients may ask for less via
+# ?max_depth= / ?replies_limit= and load the rest from /forum-comments/<id>/replies/.
+FORUM_COMMENT_MAX_DEPTH = 10
+FORUM_COMMENT_REPLIES_LIMIT = None
+
+
+# Full-text search
+# PostgreSQL text search configuration used for the technique search vector.
+TECHNIQUE_SEARCH_CONFIG = 'english'
+
+
+# Autocomplete (/api/autocomplete/)
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_MAX_LIMIT = 20
+AUTOCOMPLETE_MIN_TECHNIQUE_QUERY_LENGTH = 2
+# Seconds a worker keeps its in-memory copy of categories/regions/tags when no
+# change signal reaches it (changes made by other processes).
+AUTOCOMPLETE_LOOKUP_TTL = 300
+# Per-process LRU of technique title lookups.
+AUTOCOMPLETE_CACHE_SIZE = 1024
+AUTOCOMPLETE_CACHE_TTL = 30
+
+
+# Caches
+# 'responses' backs the anonymous API response cache (jalwiki_app.cache). Use a
+# shared backend when running several workers, e.g. the file-based one:
+#     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#     'LOCATION': BASE_DIR / 'cache/responses',
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'jalwiki-responses',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_TIMEOUT = 300
+# Absolute URLs re-rendered by a 'cache.warm' job shortly after cached data
+# changes, e.g. ['https://api.example.org/api/techniques/'].
+RESPONSE_CACHE_WARM_URLS = []
+RESPONSE_CACHE_WARM_DELAY = 5
+
+
+# Per-request SQL instrumentation (jalwiki_pro.middleware)
+# Adds a Server-Timing header and logs one JSON line per request on the
+# 'jalwiki.sql' logger with the query count, DB time and slowest statements.
+SQL_INSTRUMENTATION = DEBUG
+SQL_INSTRUMENTATION_SLOWEST = 3
+
+
+# Responsive image variants (jalwiki_app.images)
+# Uploaded technique, gallery and profile images are resized to these widths
+# (never upscaled) in each format by an 'images.build_variants' job.
+IMAGE_VARIANT_WIDTHS = [320, 640, 1280]
+IMAGE_VARIANT_FORMATS = ['webp', 'jpeg']
+IMAGE_VARIANT_QUALITY = 80
+
+
+# Background jobs (jalwiki_app.jobs, run by `manage.py run_workers`)
+# With JOB_QUEUE_EAGER jobs run inline when they are enqueued, so no worker is
+# needed (tests, quick local setups).
+JOB_QUEUE_EAGER = False
+JOB_WORKER_THREADS = 4
+JOB_POLL_INTERVAL = 1.0
+JOB_MAX_ATTEMPTS = 5
+# Retry n waits JOB_RETRY_BACKOFF * 2**(n-1) seconds, at most JOB_RETRY_BACKOFF_MAX.
+JOB_RETRY_BACKOFF = 10
+JOB_RETRY_BACKOFF_MAX = 3600
+# A worker refreshes the heartbeat of each job it runs this often (seconds).
+JOB_HEARTBEAT_INTERVAL = 60
+# Running jobs without a heartbeat for this long are assumed lost with their
+# worker and requeued.
+JOB_STALE_AFTER = 600
+# Finished jobs are kept this long for the latency metrics.
+JOB_RETENTION = 24 * 3600
+# Jobs queued by the workers themselves: {name: interval in seconds}.
+JOB_PERIODIC = {
+    'counters.reconcile': 3600,
+    'related.rebuild': 24 * 3600,  # co-likes change with every vote
+    'forum.decay_hot_scores': 15 * 60,
+    'sync.purge_tombstones': 24 * 3600,
+}
+
+
+# Precomputed technique documents (jalwiki_app.documents)
+# Technique list and detail responses are assembled from stored JSON
+# snapshots instead of serializing the model and its relations per request.
+TECHNIQUE_DOCUMENTS_ENABLED = True
+
+
+# Related techniques (jalwiki_app.related, `manage.py build_related_index`)
+# Neighbours are ranked by a weighted sum of TF-IDF text similarity (title,
+# summary, steps), category/region overlap, same impact and co-likes.
+RELATED_TECHNIQUES_COUNT = 10
+RELATED_TECHNIQUES_WEIGHTS = {
+    'text': 0.5,
+    'categories': 0.2,
+    'regions': 0.1,
+    'impact': 0.05,
+    'colikes': 0.15,
+}
+RELATED_TECHNIQUES_MAX_FEATURES = 5000
+# Users with more likes than this say little about which techniques go together.
+RELATED_TECHNIQUES_MAX_USER_LIKES = 200
+
+
+# Forum "hot" ranking (jalwiki_app.hotness, ?ordering=hot on forum threads)
+# (upvotes + FORUM_HOT_COMMENT_WEIGHT * comments + 1) / (age in hours + 2) ** FORUM_HOT_GRAVITY
+FORUM_HOT_GRAVITY = 1.8
+FORUM_HOT_COMMENT_WEIGHT = 2
+FORUM_HOT_WINDOW_DAYS = 30
+
+
+# Claims-based JWT authentication (jalwiki_pro.authentication)
+# Per-process LRU of users loaded for views that need more than the claims.
+JWT_USER_CACHE_SIZE = 1024
+JWT_USER_CACHE_TTL = 60  # seconds; saves and deletes in this process clear entries at once
+
+
+# Voter lists (likers/voters endpoints)
+# True brings back the full ``likes``/``upvoted_by`` ID arrays in technique,
+# thread and comment payloads for clients that have not moved to the counts,
+# ``is_liked_by_user`` and the paginated endpoints yet.
+VOTER_ARRAYS_COMPAT = False
+
+
+# Incremental sync feed (jalwiki_app.sync, /api/sync/)
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 2000
+# Changes younger than this wait for the next request, so rows committed late
+# by slower transactions are not skipped.
+SYNC_SETTLE_SECONDS = 5
+SYNC_TOMBSTONE_RETENTION = timedelta(days=30)  # older tokens get a full resync
+
+
+# Live forum events (jalwiki_app.events, SSE at /api/events/forum-threads/<slug>/, ASGI only)
+# LocalBroker only reaches clients connected to the publishing process; use
+# 'jalwiki_app.events.PostgresBroker' (LISTEN/NOTIFY) with several workers.
+FORUM_EVENTS_BACKEND = 'jalwiki_app.events.LocalBroker'
+FORUM_EVENTS_HEARTBEAT = 15  # seconds between keep-alive comments on a quiet stream
+FORUM_EVENTS_QUEUE_SIZE = 100  # events a connection may fall behind before it gets 'resync'
+
+
+# Streamed list responses (jalwiki_app.streaming, ?stream=1)
+STREAMING_CHUNK_SIZE = 500  # rows fetched, prefetched and serialized at a time
+STREAMING_GZIP = True  # gzip the stream for clients sending Accept-Encoding: gzip
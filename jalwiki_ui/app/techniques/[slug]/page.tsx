@@ -34,7 +34,8 @@ interface Technique {
   id: number; title: string; slug: string; added_by: number; impact: ImpactLevel;
   region: Region[]; categories: Category[]; summary: string; detailed_content: string;
   benefits: string[]; materials: string[]; steps: string[]; main_image: string;
-  created_on: string; updated_on: string; is_published: boolean; likes: number[];
+  created_on: string; updated_on: string; is_published: boolean;
+  likes?: number[]; // Only with VOTER_ARRAYS_COMPAT; see the /likers/ endpoint
   images: TechniqueImage[];
 }
 
@@ -63,7 +63,7 @@ export interface ApiThread {
   updated_at: string;
   last_activity_at: string;
   upvote_count: number;
-  upvoted_by: number[];
+  upvoted_by?: number[]; // Only with VOTER_ARRAYS_COMPAT; see the /voters/ endpoint
   comment_count: number;
   is_liked_by_user?: boolean; // Optional, depends on your serializer context
 }
@@ -77,7 +77,7 @@ export interface ApiComment {
   created_at: string;
   updated_at: string;
   upvote_count: number;
-  upvoted_by: number[];
+  upvoted_by?: number[]; // Only with VOTER_ARRAYS_COMPAT; see the /voters/ endpoint
   replies: ApiComment[];
   is_liked_by_user?: boolean; // Optional
 }